@@ -1,10 +1,17 @@
+from functools import partial
+
 from django.contrib import admin
+from django.contrib.auth.models import User
+
+from psymetrics.busqueda import BusquedaTextoAdminMixin
+
 from .models import (
     TipoConsulta,
     Psicologo,
     Consulta,
     DisponibilidadPsicologo,
-    MensajeConsulta
+    MensajeConsulta,
+    ContadorNoLeidos
 )
 
 
@@ -24,6 +31,40 @@ class MensajeConsultaInline(admin.StackedInline):
     fields = ['remitente', 'mensaje', 'leido', 'fecha_envio']
     readonly_fields = ['fecha_envio']
     ordering = ['fecha_envio']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'consulta__cliente', 'consulta__psicologo__usuario', 'remitente',
+        )
+    
+    def get_formset(self, request, obj=None, **kwargs):
+        kwargs['formfield_callback'] = partial(self._campo_formulario, request=request, consulta=obj)
+        return super().get_formset(request, obj, **kwargs)
+    
+    def _campo_formulario(self, db_field, request, consulta=None, **kwargs):
+        """El remitente solo puede ser el cliente o el psicólogo; las opciones se calculan una vez"""
+        formfield = self.formfield_for_dbfield(db_field, request, **kwargs)
+        if db_field.name == 'remitente' and consulta is not None:
+            formfield.queryset = User.objects.filter(
+                pk__in=[consulta.cliente_id, consulta.psicologo.usuario_id],
+            )
+            formfield.choices = list(formfield.choices)
+        return formfield
+
+
+class PsicologoListFilter(admin.RelatedFieldListFilter):
+    """Filtro por psicólogo que obtiene los nombres en una sola consulta"""
+    
+    def field_choices(self, field, request, model_admin):
+        psicologos = Psicologo.objects.select_related('usuario').order_by('usuario__first_name', 'usuario__last_name')
+        return [(psicologo.pk, str(psicologo)) for psicologo in psicologos]
+
+
+def _psicologos_con_usuario(db_field, kwargs):
+    """Queryset de los selects de psicólogo sin una consulta por opción para el nombre"""
+    if db_field.name == 'psicologo':
+        kwargs['queryset'] = Psicologo.objects.select_related('usuario')
+    return kwargs
 
 
 # Admin para Tipos de Consulta
@@ -48,6 +89,7 @@ class TipoConsultaAdmin(admin.ModelAdmin):
 class PsicologoAdmin(admin.ModelAdmin):
     list_display = ['get_nombre_completo', 'especialidad', 'experiencia_anos', 'tarifa_hora', 'disponible']
     list_filter = ['especialidad', 'disponible', 'experiencia_anos']
+    list_select_related = ['usuario']
     search_fields = ['usuario__username', 'usuario__first_name', 'usuario__last_name', 'descripcion']
     inlines = [DisponibilidadPsicologoInline]
     
@@ -72,9 +114,10 @@ class PsicologoAdmin(admin.ModelAdmin):
 
 # Admin para Consultas
 @admin.register(Consulta)
-class ConsultaAdmin(admin.ModelAdmin):
+class ConsultaAdmin(BusquedaTextoAdminMixin, admin.ModelAdmin):
     list_display = ['get_cliente_nombre', 'get_psicologo_nombre', 'tipo_consulta', 'estado', 'fecha_agendada', 'calificacion']
     list_filter = ['estado', 'fecha_solicitud', 'fecha_agendada', 'tipo_consulta']
+    list_select_related = ['cliente', 'psicologo__usuario', 'tipo_consulta']
     search_fields = ['cliente__username', 'cliente__first_name', 'psicologo__usuario__first_name', 'motivo_consulta']
     readonly_fields = ['fecha_solicitud']
     inlines = [MensajeConsultaInline]
@@ -106,6 +149,9 @@ class ConsultaAdmin(admin.ModelAdmin):
     get_cliente_nombre.short_description = 'Cliente'
     get_cliente_nombre.admin_order_field = 'cliente__first_name'
     
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        return super().formfield_for_foreignkey(db_field, request, **_psicologos_con_usuario(db_field, kwargs))
+    
     def get_psicologo_nombre(self, obj):
         """Muestra el nombre del psicólogo"""
         return obj.psicologo.usuario.get_full_name() or obj.psicologo.usuario.username
@@ -117,7 +163,8 @@ class ConsultaAdmin(admin.ModelAdmin):
 @admin.register(DisponibilidadPsicologo)
 class DisponibilidadPsicologoAdmin(admin.ModelAdmin):
     list_display = ['psicologo', 'get_dia_nombre', 'hora_inicio', 'hora_fin', 'activo']
-    list_filter = ['dia_semana', 'activo', 'psicologo']
+    list_filter = ['dia_semana', 'activo', ('psicologo', PsicologoListFilter)]
+    list_select_related = ['psicologo__usuario']
     search_fields = ['psicologo__usuario__username', 'psicologo__usuario__first_name']
     ordering = ['psicologo', 'dia_semana', 'hora_inicio']
     
@@ -133,13 +180,17 @@ class DisponibilidadPsicologoAdmin(admin.ModelAdmin):
         return dias[obj.dia_semana]
     get_dia_nombre.short_description = 'Día'
     get_dia_nombre.admin_order_field = 'dia_semana'
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        return super().formfield_for_foreignkey(db_field, request, **_psicologos_con_usuario(db_field, kwargs))
 
 
 # Admin para Mensajes de Consulta
 @admin.register(MensajeConsulta)
-class MensajeConsultaAdmin(admin.ModelAdmin):
+class MensajeConsultaAdmin(BusquedaTextoAdminMixin, admin.ModelAdmin):
     list_display = ['consulta', 'remitente', 'get_mensaje_corto', 'leido', 'fecha_envio']
     list_filter = ['leido', 'fecha_envio']
+    list_select_related = ['consulta__cliente', 'consulta__psicologo__usuario', 'remitente']
     search_fields = ['mensaje', 'remitente__username', 'consulta__cliente__username']
     readonly_fields = ['fecha_envio']
     date_hierarchy = 'fecha_envio'
@@ -157,3 +208,23 @@ class MensajeConsultaAdmin(admin.ModelAdmin):
         """Muestra una versión corta del mensaje"""
         return obj.mensaje[:50] + '...' if len(obj.mensaje) > 50 else obj.mensaje
     get_mensaje_corto.short_description = 'Mensaje'
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'consulta':
+            kwargs['queryset'] = Consulta.objects.select_related('cliente', 'psicologo__usuario')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+# Admin para Contadores de No Leídos (solo lectura, se mantienen automáticamente)
+@admin.register(ContadorNoLeidos)
+class ContadorNoLeidosAdmin(admin.ModelAdmin):
+    list_display = ['usuario', 'consulta', 'no_leidos']
+    list_filter = [('consulta__psicologo', PsicologoListFilter)]
+    list_select_related = ['usuario', 'consulta__cliente', 'consulta__psicologo__usuario']
+    search_fields = ['usuario__username', 'consulta__cliente__username']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
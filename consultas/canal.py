@@ -0,0 +1,211 @@
+"""
+Entrega en tiempo real de MensajeConsulta.
+
+Cada proceso ASGI registra a sus suscriptores locales (un asyncio.Event por conexión
+SSE abierta). Al guardarse un mensaje se publica solo el id de la consulta; el backend
+lo transporta entre procesos y cada suscriptor despertado lee de la base los mensajes
+nuevos. Una conexión inactiva es una corrutina en espera y no consume CPU ni workers.
+
+Backends disponibles (setting CONSULTAS_CANAL_BACKEND):
+- ``consultas.canal.BackendMemoria``: un solo proceso; desarrollo y pruebas.
+- ``consultas.canal.BackendPostgres``: LISTEN/NOTIFY sobre la base de datos.
+- ``consultas.canal.BackendRedis``: pub/sub de Redis.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from .models import MensajeConsulta
+
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'consultas_mensajes'
+
+BACKEND_PREDETERMINADO = 'consultas.canal.BackendMemoria'
+
+# Comentario SSE periódico para que proxies y navegadores no cierren la conexión
+SEGUNDOS_LATIDO = 20
+
+SEGUNDOS_RECONEXION = 2
+
+CAMPOS_MENSAJE = ['id', 'remitente_id', 'mensaje', 'fecha_envio', 'leido']
+
+
+class BackendMemoria:
+    """Entrega directa a los suscriptores del propio proceso"""
+
+    def __init__(self, entregar, **opciones):
+        self.entregar = entregar
+
+    def publicar(self, consulta_id):
+        self.entregar(consulta_id)
+
+    def iniciar(self):
+        pass
+
+
+class _BackendEscucha:
+    """Base de los backends con una tarea de escucha por bucle de eventos"""
+
+    def __init__(self, entregar, **opciones):
+        self.entregar = entregar
+        self.opciones = opciones
+        self._tarea = None
+
+    def iniciar(self):
+        if self._tarea is None or self._tarea.done() or self._tarea.get_loop() is not asyncio.get_running_loop():
+            self._tarea = asyncio.get_running_loop().create_task(self._escuchar_siempre())
+
+    async def _escuchar_siempre(self):
+        while True:
+            try:
+                await self.escuchar()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Se perdió la escucha del canal %s; reintentando', CANAL)
+            await asyncio.sleep(SEGUNDOS_RECONEXION)
+
+    def _recibir(self, datos):
+        try:
+            self.entregar(int(datos))
+        except (TypeError, ValueError):
+            logger.warning('Aviso inválido en el canal %s: %r', CANAL, datos)
+
+
+class BackendPostgres(_BackendEscucha):
+    """LISTEN/NOTIFY de PostgreSQL; requiere psycopg 3 para la escucha asíncrona"""
+
+    def publicar(self, consulta_id):
+        alias = self.opciones.get('alias', 'default')
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CANAL, str(consulta_id)])
+
+    async def escuchar(self):
+        import psycopg
+
+        base = settings.DATABASES[self.opciones.get('alias', 'default')]
+        parametros = {
+            'dbname': base['NAME'],
+            'user': base.get('USER') or None,
+            'password': base.get('PASSWORD') or None,
+            'host': base.get('HOST') or None,
+            'port': base.get('PORT') or None,
+        }
+        conexion = await psycopg.AsyncConnection.connect(
+            autocommit=True, **{clave: valor for clave, valor in parametros.items() if valor is not None}
+        )
+        async with conexion:
+            await conexion.execute(f'LISTEN {CANAL}')
+            async for aviso in conexion.notifies():
+                self._recibir(aviso.payload)
+
+
+class BackendRedis(_BackendEscucha):
+    """Pub/sub de Redis (``url`` en CONSULTAS_CANAL_OPCIONES o la variable REDIS_URL)"""
+
+    def _url(self):
+        return self.opciones.get('url') or os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+    def publicar(self, consulta_id):
+        import redis
+
+        if not hasattr(self, '_cliente'):
+            self._cliente = redis.Redis.from_url(self._url())
+        self._cliente.publish(CANAL, str(consulta_id))
+
+    async def escuchar(self):
+        import redis.asyncio
+
+        cliente = redis.asyncio.Redis.from_url(self._url())
+        async with cliente.pubsub() as pubsub:
+            await pubsub.subscribe(CANAL)
+            async for mensaje in pubsub.listen():
+                if mensaje['type'] == 'message':
+                    self._recibir(mensaje['data'])
+
+
+class Canal:
+    """Suscriptores locales por consulta más el backend que comunica a los procesos"""
+
+    def __init__(self, backend, **opciones):
+        self._suscriptores = {}
+        self._candado = threading.Lock()
+        self.backend = import_string(backend)(self.entregar, **opciones)
+
+    def publicar(self, consulta_id):
+        """Avisa que la consulta tiene mensajes nuevos (se llama desde código síncrono)"""
+        self.backend.publicar(consulta_id)
+
+    def entregar(self, consulta_id):
+        """Despierta a los suscriptores locales de la consulta; seguro desde cualquier hilo"""
+        with self._candado:
+            destinos = list(self._suscriptores.get(consulta_id, {}).items())
+        for aviso, bucle in destinos:
+            bucle.call_soon_threadsafe(aviso.set)
+
+    @asynccontextmanager
+    async def suscribir(self, consulta_id):
+        self.backend.iniciar()
+        aviso = asyncio.Event()
+        with self._candado:
+            self._suscriptores.setdefault(consulta_id, {})[aviso] = asyncio.get_running_loop()
+        try:
+            yield aviso
+        finally:
+            with self._candado:
+                locales = self._suscriptores.get(consulta_id, {})
+                locales.pop(aviso, None)
+                if not locales:
+                    self._suscriptores.pop(consulta_id, None)
+
+    def conexiones(self):
+        with self._candado:
+            return sum(len(locales) for locales in self._suscriptores.values())
+
+
+@lru_cache(maxsize=None)
+def obtener_canal():
+    return Canal(
+        getattr(settings, 'CONSULTAS_CANAL_BACKEND', BACKEND_PREDETERMINADO),
+        **getattr(settings, 'CONSULTAS_CANAL_OPCIONES', {}),
+    )
+
+
+def _evento_sse(mensaje):
+    datos = json.dumps(mensaje, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"id: {mensaje['id']}\nevent: mensaje\ndata: {datos}\n\n"
+
+
+async def eventos_mensajes(consulta_id, ultimo=0, latido=SEGUNDOS_LATIDO):
+    """
+    Generador SSE con los mensajes de la consulta posteriores a ``ultimo``.
+
+    Primero envía los pendientes y después espera avisos del canal. ``ultimo`` se
+    toma del encabezado Last-Event-ID para que el navegador retome tras reconectar.
+    """
+    async with obtener_canal().suscribir(consulta_id) as aviso:
+        while True:
+            # Se limpia antes de leer para no perder avisos que lleguen durante la consulta
+            aviso.clear()
+            async for mensaje in (
+                MensajeConsulta.objects.filter(consulta_id=consulta_id, pk__gt=ultimo)
+                .order_by('pk')
+                .values(*CAMPOS_MENSAJE)
+            ):
+                ultimo = mensaje['id']
+                yield _evento_sse(mensaje)
+            try:
+                await asyncio.wait_for(aviso.wait(), latido)
+            except asyncio.TimeoutError:
+                yield ': latido\n\n'
@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+
+from .no_leidos import total_no_leidos
+
+
+def _total_no_leidos(request):
+    """Se calcula una sola vez por petición aunque se rendericen varias plantillas"""
+    if not hasattr(request, '_mensajes_no_leidos'):
+        usuario = request.user
+        request._mensajes_no_leidos = total_no_leidos(usuario) if usuario.is_authenticated else 0
+    return request._mensajes_no_leidos
+
+
+def mensajes_no_leidos(request):
+    """Total de mensajes sin leer del usuario; solo consulta la base si la plantilla lo usa"""
+    return {'mensajes_no_leidos': SimpleLazyObject(lambda: _total_no_leidos(request))}
@@ -0,0 +1,164 @@
+"""
+Cálculo de horarios disponibles para agendar consultas.
+
+Las ventanas semanales de DisponibilidadPsicologo se expanden a intervalos concretos
+en el rango pedido y se les restan las consultas agendadas con un barrido ordenado
+(dos punteros sobre listas ordenadas). El número de consultas a la base de datos es
+fijo sin importar cuántos psicólogos o días abarque el rango.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Consulta, DisponibilidadPsicologo, Psicologo
+
+
+DURACION_PREDETERMINADA = 60
+
+# La vista es pública: turnos más cortos multiplican el tamaño de la respuesta
+DURACION_MINIMA = 15
+
+# Ninguna consulta dura más que esto; acota la búsqueda de traslapes hacia atrás
+DURACION_MAXIMA = timedelta(hours=24)
+
+# Consultas en estos estados no ocupan el horario
+ESTADOS_LIBERADOS = ['cancelada']
+
+MAX_DIAS = 62
+
+
+def _fusionar(intervalos):
+    """Une intervalos (inicio, fin) ordenados que se traslapan o se tocan"""
+    fusionados = []
+    for inicio, fin in intervalos:
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1][1] = fin
+        else:
+            fusionados.append([inicio, fin])
+    return fusionados
+
+
+def ventanas_en_dias(por_dia, dias, instante):
+    """
+    Ventanas semanales ({dia_semana: [(hora_inicio, hora_fin), ...]}) expandidas a ``dias``
+    como intervalos ordenados y fusionados; ``instante(dia, hora)`` da cada extremo.
+    """
+    libres = []
+    for dia in dias:
+        for hora_inicio, hora_fin in por_dia.get(dia.weekday(), ()):
+            if hora_fin > hora_inicio:
+                libres.append((instante(dia, hora_inicio), instante(dia, hora_fin)))
+    libres.sort()
+    return _fusionar(libres)
+
+
+def restar_intervalos(libres, ocupados):
+    """
+    Resta ``ocupados`` de ``libres`` con un barrido lineal.
+
+    Ambas listas deben estar ordenadas por inicio; ``libres`` sin traslapes.
+    """
+    resultado = []
+    j = 0
+    for inicio, fin in libres:
+        # Las ocupaciones que terminan antes de este intervalo ya no afectan a los siguientes
+        while j < len(ocupados) and ocupados[j][1] <= inicio:
+            j += 1
+        cursor = inicio
+        k = j
+        while k < len(ocupados) and ocupados[k][0] < fin:
+            if ocupados[k][0] > cursor:
+                resultado.append((cursor, ocupados[k][0]))
+            cursor = max(cursor, ocupados[k][1])
+            k += 1
+        if cursor < fin:
+            resultado.append((cursor, fin))
+    return resultado
+
+
+def _partir(intervalos, duracion, paso, minimo):
+    """Corta los intervalos libres en turnos de ``duracion`` segundos cada ``paso`` segundos"""
+    turnos = []
+    for inicio, fin in intervalos:
+        if inicio < minimo:
+            # Alinear al siguiente múltiplo del paso desde el inicio del intervalo
+            inicio += -(-(minimo - inicio) // paso) * paso
+        while inicio + duracion <= fin:
+            turnos.append(inicio)
+            inicio += paso
+    return turnos
+
+
+def calcular_disponibilidad(desde, hasta, especialidad=None, duracion=DURACION_PREDETERMINADA, paso=None,
+                            psicologos=None):
+    """
+    Turnos libres por psicólogo entre las fechas ``desde`` y ``hasta`` (inclusive).
+
+    Devuelve {psicologo_id: [inicio, ...]} con datetimes en la zona horaria actual.
+    ``duracion`` y ``paso`` se expresan en minutos; por omisión el paso es la duración y
+    nunca es menor que DURACION_MINIMA.
+    """
+    zona = timezone.get_current_timezone()
+    duracion_s = int(duracion) * 60
+    paso_s = max(int(paso or duracion), DURACION_MINIMA) * 60
+    minimo = timezone.now().timestamp()
+
+    filtros = {'disponible': True}
+    if especialidad:
+        filtros['especialidad'] = especialidad
+    seleccion = Psicologo.objects.filter(**filtros)
+    if psicologos is not None:
+        seleccion = seleccion.filter(pk__in=psicologos)
+
+    ventanas = defaultdict(lambda: defaultdict(list))
+    for psicologo_id, dia_semana, hora_inicio, hora_fin in (
+        DisponibilidadPsicologo.objects
+        .filter(activo=True, psicologo__in=seleccion.values('pk'))
+        .values_list('psicologo_id', 'dia_semana', 'hora_inicio', 'hora_fin')
+    ):
+        ventanas[psicologo_id][dia_semana].append((hora_inicio, hora_fin))
+
+    if not ventanas:
+        return {}
+
+    inicio_rango = timezone.make_aware(datetime.combine(desde, time.min), zona)
+    fin_rango = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min), zona)
+
+    # Una consulta que empezó antes del rango puede seguir ocupando su inicio
+    ocupados = defaultdict(list)
+    for psicologo_id, fecha, minutos in (
+        Consulta.objects
+        .filter(
+            psicologo_id__in=list(ventanas),
+            fecha_agendada__gt=inicio_rango - DURACION_MAXIMA,
+            fecha_agendada__lt=fin_rango,
+        )
+        .exclude(estado__in=ESTADOS_LIBERADOS)
+        .order_by()
+        .values_list('psicologo_id', 'fecha_agendada', 'duracion_minutos')
+    ):
+        inicio = fecha.timestamp()
+        ocupados[psicologo_id].append((inicio, inicio + minutos * 60))
+
+    dias = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+    # Los psicólogos suelen compartir horarios: cada (día, hora) se convierte una sola vez
+    instantes = {}
+
+    def instante(dia, hora):
+        clave = (dia, hora)
+        if clave not in instantes:
+            instantes[clave] = timezone.make_aware(datetime.combine(dia, hora), zona).timestamp()
+        return instantes[clave]
+
+    disponibilidad = {}
+    for psicologo_id, por_dia in ventanas.items():
+        libres = ventanas_en_dias(por_dia, dias, instante)
+        restantes = restar_intervalos(libres, sorted(ocupados.get(psicologo_id, ())))
+        disponibilidad[psicologo_id] = [
+            datetime.fromtimestamp(turno, zona)
+            for turno in _partir(restantes, duracion_s, paso_s, minimo)
+        ]
+    return disponibilidad
+
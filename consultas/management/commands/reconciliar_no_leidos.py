@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from consultas.no_leidos import reconciliar_no_leidos
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los contadores de mensajes sin leer a partir de MensajeConsulta'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Contadores por inserción')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        filas = reconciliar_no_leidos(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{filas} contadores reconstruidos en {time.perf_counter() - inicio:.2f} s'
+        ))
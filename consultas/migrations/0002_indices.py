@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 09:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['-fecha_solicitud'], name='consulta_fecha_solicitud_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['estado', '-fecha_solicitud'], name='consulta_estado_solicitud_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['fecha_agendada'], name='consulta_fecha_agendada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['psicologo', 'fecha_agendada'], name='consulta_psicologo_agenda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensajeconsulta',
+            index=models.Index(fields=['consulta', 'fecha_envio'], name='mensaje_consulta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensajeconsulta',
+            index=models.Index(fields=['fecha_envio'], name='mensaje_fecha_envio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensajeconsulta',
+            index=models.Index(condition=models.Q(('leido', False)), fields=['consulta'], name='mensaje_no_leido_idx'),
+        ),
+    ]
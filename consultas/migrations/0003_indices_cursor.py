@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 09:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0002_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='mensajeconsulta',
+            name='mensaje_consulta_fecha_idx',
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['cliente', '-fecha_solicitud', '-id'], name='consulta_cliente_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['psicologo', '-fecha_solicitud', '-id'], name='consulta_psicologo_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensajeconsulta',
+            index=models.Index(fields=['consulta', 'fecha_envio', 'id'], name='mensaje_consulta_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0003_indices_cursor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorNoLeidos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('no_leidos', models.IntegerField(default=0)),
+                ('consulta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contadores_no_leidos', to='consultas.consulta')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contadores_no_leidos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Contador de No Leídos',
+                'verbose_name_plural': 'Contadores de No Leídos',
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'consulta'), name='contador_unico_por_consulta')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 10:06
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from psymetrics.busqueda import indice_busqueda
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0004_contador_no_leidos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mensajeconsulta',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        indice_busqueda('consultas', 'consulta', 'motivo_consulta'),
+        indice_busqueda('consultas', 'mensajeconsulta', 'mensaje'),
+    ]
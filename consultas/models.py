@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -64,11 +65,22 @@ class Consulta(models.Model):
     notas_psicologo = models.TextField(null=True, blank=True)
     calificacion = models.IntegerField(null=True, blank=True, help_text="Calificación del 1 al 5")
     comentarios_finales = models.TextField(null=True, blank=True)
+    busqueda = SearchVectorField(null=True, editable=False)
     
     class Meta:
         verbose_name = "Consulta"
         verbose_name_plural = "Consultas"
         ordering = ['-fecha_solicitud']
+        indexes = [
+            models.Index(fields=['-fecha_solicitud'], name='consulta_fecha_solicitud_idx'),
+            models.Index(fields=['estado', '-fecha_solicitud'], name='consulta_estado_solicitud_idx'),
+            models.Index(fields=['fecha_agendada'], name='consulta_fecha_agendada_idx'),
+            # Agenda del psicólogo: disponibilidad y detección de traslapes
+            models.Index(fields=['psicologo', 'fecha_agendada'], name='consulta_psicologo_agenda_idx'),
+            # Paginación por cursor de "mis consultas"
+            models.Index(fields=['cliente', '-fecha_solicitud', '-id'], name='consulta_cliente_cursor_idx'),
+            models.Index(fields=['psicologo', '-fecha_solicitud', '-id'], name='consulta_psicologo_cursor_idx'),
+        ]
     
     def __str__(self):
         return f"{self.cliente.get_full_name()} - {self.psicologo.usuario.get_full_name()}"
@@ -105,11 +117,40 @@ class MensajeConsulta(models.Model):
     mensaje = models.TextField()
     fecha_envio = models.DateTimeField(auto_now_add=True)
     leido = models.BooleanField(default=False)
+    busqueda = SearchVectorField(null=True, editable=False)
     
     class Meta:
         verbose_name = "Mensaje de Consulta"
         verbose_name_plural = "Mensajes de Consulta"
         ordering = ['fecha_envio']
+        indexes = [
+            # Hilo de la consulta y su paginación por cursor
+            models.Index(fields=['consulta', 'fecha_envio', 'id'], name='mensaje_consulta_cursor_idx'),
+            models.Index(fields=['fecha_envio'], name='mensaje_fecha_envio_idx'),
+            models.Index(fields=['consulta'], condition=models.Q(leido=False), name='mensaje_no_leido_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.consulta} - {self.remitente.get_full_name()}"
\ No newline at end of file
+        return f"{self.consulta} - {self.remitente.get_full_name()}"
+
+
+class ContadorNoLeidos(models.Model):
+    """Mensajes sin leer de cada participante en una consulta.
+
+    Se mantiene al crear mensajes y al marcarlos como leídos; puede reconstruirse desde
+    MensajeConsulta con ``manage.py reconciliar_no_leidos``.
+    """
+    consulta = models.ForeignKey(Consulta, on_delete=models.CASCADE, related_name='contadores_no_leidos')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='contadores_no_leidos')
+    no_leidos = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Contador de No Leídos"
+        verbose_name_plural = "Contadores de No Leídos"
+        constraints = [
+            # También sirve de índice para el total del usuario
+            models.UniqueConstraint(fields=['usuario', 'consulta'], name='contador_unico_por_consulta'),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario} - consulta {self.consulta_id}: {self.no_leidos}"
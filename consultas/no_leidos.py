@@ -0,0 +1,98 @@
+"""
+Contadores de mensajes sin leer por consulta y participante.
+
+El total que se muestra en la navegación sería un COUNT sobre los mensajes de todas
+las consultas del usuario en cada página; en su lugar ContadorNoLeidos guarda el número
+por (consulta, usuario) y se actualiza con expresiones F() al crear mensajes y al
+marcarlos como leídos. Los cambios hechos por fuera (admin, bulk_create) se corrigen con
+``manage.py reconciliar_no_leidos``.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest
+
+from .models import Consulta, ContadorNoLeidos, MensajeConsulta
+
+
+TAMANO_LOTE = 1000
+
+
+def sumar_mensaje(consulta_id, remitente_id):
+    """Suma un mensaje sin leer a los participantes de la consulta distintos del remitente"""
+    participantes = Consulta.objects.filter(pk=consulta_id).values_list('cliente_id', 'psicologo__usuario_id').first()
+    destinatarios = set(participantes or ()) - {remitente_id}
+    if not destinatarios:
+        return
+    with transaction.atomic():
+        ContadorNoLeidos.objects.bulk_create(
+            [ContadorNoLeidos(consulta_id=consulta_id, usuario_id=usuario_id) for usuario_id in destinatarios],
+            ignore_conflicts=True,
+        )
+        ContadorNoLeidos.objects.filter(consulta_id=consulta_id, usuario_id__in=destinatarios).update(
+            no_leidos=F('no_leidos') + 1,
+        )
+
+
+def descontar_leidos(consulta_id, usuario_id, cantidad):
+    """Resta los mensajes que el usuario acaba de marcar como leídos"""
+    if cantidad:
+        ContadorNoLeidos.objects.filter(consulta_id=consulta_id, usuario_id=usuario_id).update(
+            no_leidos=Greatest(F('no_leidos') - cantidad, Value(0)),
+        )
+
+
+def marcar_hilo_leido(consulta_id, usuario_id, hasta=None):
+    """
+    Marca como leídos los mensajes recibidos por el usuario (hasta el id ``hasta`` si se
+    indica) y ajusta su contador. Devuelve cuántos mensajes se marcaron.
+    """
+    mensajes = MensajeConsulta.objects.filter(consulta_id=consulta_id, leido=False).exclude(remitente_id=usuario_id)
+    with transaction.atomic():
+        if hasta is None:
+            marcados = mensajes.update(leido=True)
+            ContadorNoLeidos.objects.filter(consulta_id=consulta_id, usuario_id=usuario_id).update(no_leidos=0)
+        else:
+            marcados = mensajes.filter(pk__lte=hasta).update(leido=True)
+            descontar_leidos(consulta_id, usuario_id, marcados)
+    return marcados
+
+
+def total_no_leidos(usuario):
+    """Total del usuario en todas sus consultas (una consulta sobre el índice del contador)"""
+    total = ContadorNoLeidos.objects.filter(usuario=usuario, no_leidos__gt=0).aggregate(total=Sum('no_leidos'))
+    return total['total'] or 0
+
+
+def no_leidos_por_consulta(usuario):
+    return dict(
+        ContadorNoLeidos.objects.filter(usuario=usuario, no_leidos__gt=0).values_list('consulta_id', 'no_leidos')
+    )
+
+
+def reconciliar_no_leidos(tamano_lote=TAMANO_LOTE):
+    """Reconstruye todos los contadores a partir de los mensajes sin leer"""
+    sin_leer = MensajeConsulta.objects.filter(leido=False)
+    conteos = Counter()
+    for destinatario, remitente in (('consulta__cliente_id', 'consulta__cliente'),
+                                    ('consulta__psicologo__usuario_id', 'consulta__psicologo__usuario')):
+        filas = (
+            sin_leer.exclude(remitente=F(remitente))
+            .values_list('consulta_id', destinatario)
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        for consulta_id, usuario_id, total in filas:
+            conteos[consulta_id, usuario_id] += total
+
+    with transaction.atomic():
+        ContadorNoLeidos.objects.all().delete()
+        ContadorNoLeidos.objects.bulk_create(
+            [
+                ContadorNoLeidos(consulta_id=consulta_id, usuario_id=usuario_id, no_leidos=total)
+                for (consulta_id, usuario_id), total in conteos.items()
+            ],
+            batch_size=tamano_lote,
+        )
+    return len(conteos)
@@ -0,0 +1,76 @@
+"""
+Paginación por cursor (keyset) sobre (fecha, id).
+
+En lugar de OFFSET, cada página filtra a partir de la última fila de la anterior, de
+modo que con un índice compuesto que coincida con el orden la página N cuesta lo mismo
+que la primera. El cursor es opaco y va firmado con SECRET_KEY para que el cliente no
+pueda fabricarlo.
+"""
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+SAL = 'consultas.paginacion'
+
+TAMANO_PAGINA = 20
+TAMANO_MAXIMO = 100
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(valor, pk):
+    return signing.dumps([valor.isoformat(), pk], salt=SAL, compress=True)
+
+
+def decodificar_cursor(cursor):
+    try:
+        valor, pk = signing.loads(cursor, salt=SAL)
+        fecha = parse_datetime(valor)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise CursorInvalido('Cursor inválido')
+    if fecha is None or not isinstance(pk, int):
+        raise CursorInvalido('Cursor inválido')
+    return fecha, pk
+
+
+def tamano_pagina(valor, predeterminado=TAMANO_PAGINA):
+    try:
+        return min(max(int(valor), 1), TAMANO_MAXIMO)
+    except (TypeError, ValueError):
+        return predeterminado
+
+
+def paginar(queryset, campo, cursor=None, tamano=TAMANO_PAGINA, descendente=True):
+    """
+    Devuelve (filas, siguiente_cursor) ordenando por (``campo``, pk).
+
+    ``queryset`` puede ser de instancias o de ``values()``; en ese caso debe incluir
+    ``campo`` y ``id``. ``siguiente_cursor`` es None en la última página.
+    """
+    if descendente:
+        orden = [f'-{campo}', '-pk']
+        comparacion = 'lt'
+    else:
+        orden = [campo, 'pk']
+        comparacion = 'gt'
+
+    if cursor:
+        valor, pk = decodificar_cursor(cursor)
+        # La condición redundante sobre ``campo`` da al planificador el límite del rango del índice
+        queryset = queryset.filter(
+            Q(**{f'{campo}__{comparacion}e': valor}),
+            Q(**{f'{campo}__{comparacion}': valor}) | Q(**{campo: valor, f'pk__{comparacion}': pk}),
+        )
+
+    # Una fila de más indica si existe otra página sin contar el total
+    filas = list(queryset.order_by(*orden)[:tamano + 1])
+    if len(filas) <= tamano:
+        return filas, None
+    filas = filas[:tamano]
+    ultima = filas[-1]
+    if isinstance(ultima, dict):
+        return filas, codificar_cursor(ultima[campo], ultima['id'])
+    return filas, codificar_cursor(getattr(ultima, campo), ultima.pk)
@@ -0,0 +1,133 @@
+"""
+Reserva de consultas sin dobles agendas.
+
+La comprobación de traslapes y la inserción se hacen dentro de una transacción que
+primero bloquea la fila del psicólogo (SELECT ... FOR UPDATE). En motores sin bloqueo
+por fila, como SQLite, una escritura sobre esa misma fila toma el candado de escritura
+de la base y serializa igualmente las reservas concurrentes; si el candado está
+ocupado la transacción se reintenta tras una breve espera.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .disponibilidad import DURACION_MAXIMA, ESTADOS_LIBERADOS, ventanas_en_dias
+from .models import Consulta, DisponibilidadPsicologo, Psicologo
+
+
+# Solo SQLite: reintentos cuando otra conexión tiene el candado de escritura
+REINTENTOS_BLOQUEO = 50
+ESPERA_BLOQUEO = 0.005
+
+
+class ConflictoReserva(Exception):
+    """El horario pedido se traslapa con una consulta ya agendada"""
+
+    def __init__(self, inicio, fin, consulta_id=None):
+        self.inicio = inicio
+        self.fin = fin
+        self.consulta_id = consulta_id
+        super().__init__(f'El horario se traslapa con la consulta de {inicio:%Y-%m-%d %H:%M} a {fin:%H:%M}')
+
+    def como_dict(self):
+        return {
+            'inicio': self.inicio.isoformat(),
+            'fin': self.fin.isoformat(),
+            'consulta': self.consulta_id,
+        }
+
+
+def _bloquear_psicologo(psicologo_id, alias):
+    """Bloquea la fila del psicólogo hasta el final de la transacción"""
+    if connections[alias].features.has_select_for_update:
+        bloqueados = Psicologo.objects.using(alias).select_for_update().filter(pk=psicologo_id, disponible=True)
+        return bool(list(bloqueados.values_list('pk', flat=True)))
+    return bool(
+        Psicologo.objects.using(alias).filter(pk=psicologo_id, disponible=True).update(disponible=F('disponible'))
+    )
+
+
+def buscar_conflicto(psicologo_id, inicio, fin, using=None):
+    """Primera consulta activa del psicólogo que se traslapa con [inicio, fin), o None"""
+    candidatas = (
+        Consulta.objects.using(using)
+        .filter(psicologo_id=psicologo_id, fecha_agendada__lt=fin, fecha_agendada__gt=inicio - DURACION_MAXIMA)
+        .exclude(estado__in=ESTADOS_LIBERADOS)
+        .order_by('fecha_agendada')
+        .values_list('pk', 'fecha_agendada', 'duracion_minutos')
+    )
+    for consulta_id, fecha, minutos in candidatas:
+        termino = fecha + timedelta(minutes=minutos)
+        if termino > inicio:
+            return ConflictoReserva(timezone.localtime(fecha), timezone.localtime(termino), consulta_id)
+    return None
+
+
+def dentro_de_horario(psicologo_id, inicio, fin, using=None):
+    """
+    Indica si [inicio, fin) cabe en las ventanas activas de DisponibilidadPsicologo, unidas
+    como en calcular_disponibilidad (09-10 y 10-11 admiten un turno de 09:30 a 10:30)
+    """
+    zona = timezone.get_current_timezone()
+    dia = timezone.localtime(inicio, zona).date()
+    if timezone.localtime(fin, zona).date() != dia:
+        return False
+    horas = DisponibilidadPsicologo.objects.using(using).filter(
+        psicologo_id=psicologo_id, activo=True, dia_semana=dia.weekday(),
+    ).values_list('hora_inicio', 'hora_fin')
+    ventanas = ventanas_en_dias(
+        {dia.weekday(): list(horas)}, [dia],
+        lambda dia, hora: timezone.make_aware(datetime.combine(dia, hora), zona).timestamp(),
+    )
+    return any(desde <= inicio.timestamp() and fin.timestamp() <= hasta for desde, hasta in ventanas)
+
+
+def reservar_consulta(cliente, psicologo_id, tipo_consulta, fecha_agendada, motivo_consulta,
+                      notas_cliente=None, validar_horario=True):
+    """
+    Agenda una consulta si el horario está libre.
+
+    Lanza ConflictoReserva con el horario en conflicto si otra consulta lo ocupa, y
+    ValidationError si el psicólogo no está disponible o el horario no es válido.
+    """
+    if timezone.is_naive(fecha_agendada):
+        fecha_agendada = timezone.make_aware(fecha_agendada)
+    if fecha_agendada <= timezone.now():
+        raise ValidationError('La fecha de la consulta debe ser futura')
+    fin = fecha_agendada + timedelta(minutes=tipo_consulta.duracion_minutos)
+
+    alias = router.db_for_write(Consulta)
+    reintentar = connections[alias].vendor == 'sqlite'
+    for intento in range(REINTENTOS_BLOQUEO):
+        try:
+            return _reservar(cliente, psicologo_id, tipo_consulta, fecha_agendada, fin, motivo_consulta,
+                             notas_cliente, validar_horario, alias)
+        except OperationalError as error:
+            if not reintentar or 'locked' not in str(error) or intento == REINTENTOS_BLOQUEO - 1:
+                raise
+            time.sleep(ESPERA_BLOQUEO * (intento + 1))
+
+
+def _reservar(cliente, psicologo_id, tipo_consulta, fecha_agendada, fin, motivo_consulta, notas_cliente,
+              validar_horario, alias):
+    with transaction.atomic(using=alias):
+        if not _bloquear_psicologo(psicologo_id, alias):
+            raise ValidationError('El psicólogo no está disponible')
+        if validar_horario and not dentro_de_horario(psicologo_id, fecha_agendada, fin, using=alias):
+            raise ValidationError('El horario está fuera de la disponibilidad del psicólogo')
+        conflicto = buscar_conflicto(psicologo_id, fecha_agendada, fin, using=alias)
+        if conflicto is not None:
+            raise conflicto
+        return Consulta.objects.using(alias).create(
+            cliente=cliente,
+            psicologo_id=psicologo_id,
+            tipo_consulta=tipo_consulta,
+            fecha_agendada=fecha_agendada,
+            duracion_minutos=tipo_consulta.duracion_minutos,
+            motivo_consulta=motivo_consulta,
+            notas_cliente=notas_cliente or None,
+        )
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from psymetrics.busqueda import registrar
+
+from .canal import obtener_canal
+from .models import Consulta, MensajeConsulta
+from .no_leidos import sumar_mensaje
+
+
+registrar(Consulta, 'motivo_consulta')
+registrar(MensajeConsulta, 'mensaje')
+
+
+@receiver(post_save, sender=MensajeConsulta)
+def publicar_mensaje(sender, instance, created, **kwargs):
+    """Avisa a los participantes conectados cuando el mensaje ya es visible en la base"""
+    if created:
+        consulta_id = instance.consulta_id
+        transaction.on_commit(lambda: obtener_canal().publicar(consulta_id))
+
+
+@receiver(post_save, sender=MensajeConsulta)
+def contar_no_leido(sender, instance, created, **kwargs):
+    """Suma el mensaje al contador del destinatario en la misma transacción que lo guarda"""
+    if created and not instance.leido:
+        sumar_mensaje(instance.consulta_id, instance.remitente_id)
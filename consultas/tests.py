@@ -1,3 +1,486 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time as reloj
+from datetime import datetime, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from psymetrics.busqueda import buscar
+
+from .canal import Canal, eventos_mensajes, obtener_canal
+from .disponibilidad import DURACION_MINIMA, _fusionar, _partir, calcular_disponibilidad, restar_intervalos
+from .models import Consulta, ContadorNoLeidos, DisponibilidadPsicologo, MensajeConsulta, Psicologo, TipoConsulta
+from .no_leidos import reconciliar_no_leidos, total_no_leidos
+from .paginacion import SAL, CursorInvalido, codificar_cursor, decodificar_cursor, paginar
+from .reservas import ConflictoReserva, reservar_consulta
+
+
+class ReservaConcurrenteTests(TransactionTestCase):
+    """Varias reservas simultáneas del mismo horario: solo una debe quedar agendada"""
+
+    HILOS = 8
+
+    def setUp(self):
+        self.tipo = TipoConsulta.objects.create(nombre='Video', descripcion='', duracion_minutos=60, precio=100)
+        usuario = User.objects.create(username='psicologo')
+        self.psicologo = Psicologo.objects.create(
+            usuario=usuario, especialidad='clinica', experiencia_anos=5, descripcion='', tarifa_hora=100,
+        )
+        self.clientes = [User.objects.create(username=f'cliente{n}') for n in range(self.HILOS)]
+        self.dia = timezone.localdate() + timedelta(days=7)
+        DisponibilidadPsicologo.objects.create(
+            psicologo=self.psicologo, dia_semana=self.dia.weekday(), hora_inicio=time(8), hora_fin=time(20),
+        )
+
+    def _en_paralelo(self, inicios):
+        """Lanza una reserva por hilo a la vez y devuelve (ganadas, conflictos, errores, segundos)"""
+        barrera = threading.Barrier(len(inicios))
+        resultados = []
+
+        def reservar(cliente, inicio):
+            try:
+                barrera.wait()
+                reservar_consulta(cliente, self.psicologo.pk, self.tipo, inicio, 'motivo')
+                resultados.append('ganada')
+            except ConflictoReserva:
+                resultados.append('conflicto')
+            except Exception as error:
+                resultados.append(error)
+            finally:
+                close_old_connections()
+
+        hilos = [
+            threading.Thread(target=reservar, args=(cliente, inicio))
+            for cliente, inicio in zip(self.clientes, inicios)
+        ]
+        comienzo = reloj.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        segundos = reloj.perf_counter() - comienzo
+        errores = [r for r in resultados if not isinstance(r, str)]
+        return resultados.count('ganada'), resultados.count('conflicto'), errores, segundos
+
+    def _inicio(self, hora, minuto=0):
+        return timezone.make_aware(datetime.combine(self.dia, time(hora, minuto)))
+
+    def test_mismo_horario_una_sola_reserva(self):
+        ganadas, conflictos, errores, _ = self._en_paralelo([self._inicio(10)] * self.HILOS)
+        self.assertEqual(errores, [])
+        self.assertEqual(ganadas, 1)
+        self.assertEqual(conflictos, self.HILOS - 1)
+        self.assertEqual(Consulta.objects.filter(psicologo=self.psicologo).count(), 1)
+
+    def test_horarios_traslapados(self):
+        # Inicios cada 15 minutos con duración de 60: a lo sumo una por hora
+        inicios = [self._inicio(10 + n // 4, 15 * (n % 4)) for n in range(self.HILOS)]
+        ganadas, _, errores, _ = self._en_paralelo(inicios)
+        self.assertEqual(errores, [])
+        consultas = list(Consulta.objects.order_by('fecha_agendada').values_list('fecha_agendada', flat=True))
+        self.assertEqual(len(consultas), ganadas)
+        for anterior, siguiente in zip(consultas, consultas[1:]):
+            self.assertGreaterEqual(siguiente - anterior, timedelta(minutes=60))
+
+    def test_conflicto_informa_horario(self):
+        reservar_consulta(self.clientes[0], self.psicologo.pk, self.tipo, self._inicio(10), 'motivo')
+        with self.assertRaises(ConflictoReserva) as contexto:
+            reservar_consulta(self.clientes[1], self.psicologo.pk, self.tipo, self._inicio(10, 30), 'motivo')
+        self.assertEqual(contexto.exception.inicio, self._inicio(10))
+        self.assertEqual(contexto.exception.fin, self._inicio(11))
+
+    def test_rendimiento(self):
+        """Reservas por segundo con todos los hilos compitiendo por el mismo psicólogo"""
+        rondas = 10
+        segundos = 0
+        for ronda in range(rondas):
+            inicios = [self._inicio(8 + ronda, 0)] * self.HILOS
+            ganadas, _, errores, duracion = self._en_paralelo(inicios)
+            self.assertEqual(errores, [])
+            self.assertEqual(ganadas, 1)
+            segundos += duracion
+        self.assertEqual(Consulta.objects.count(), rondas)
+        # Holgado: solo detecta reservas que se quedan esperando el candado
+        self.assertLess(segundos / rondas, 2)
+
+
+class DisponibilidadTests(TestCase):
+    def setUp(self):
+        self.tipo = TipoConsulta.objects.create(nombre='Video', descripcion='', duracion_minutos=60, precio=100)
+        self.psicologo = Psicologo.objects.create(
+            usuario=User.objects.create(username='psicologo'),
+            especialidad='clinica', experiencia_anos=5, descripcion='', tarifa_hora=100,
+        )
+        self.cliente = User.objects.create(username='cliente')
+        self.dia = timezone.localdate() + timedelta(days=7)
+        DisponibilidadPsicologo.objects.create(
+            psicologo=self.psicologo, dia_semana=self.dia.weekday(), hora_inicio=time(8), hora_fin=time(12),
+        )
+
+    def _a_las(self, hora, dia=None):
+        return timezone.make_aware(datetime.combine(dia or self.dia, time(hora)))
+
+    def _agendar(self, inicio, minutos, estado='confirmada'):
+        Consulta.objects.create(
+            cliente=self.cliente, psicologo=self.psicologo, tipo_consulta=self.tipo, fecha_agendada=inicio,
+            duracion_minutos=minutos, estado=estado, motivo_consulta='motivo',
+        )
+
+    def _turnos(self, **kwargs):
+        return [
+            turno.hour + turno.minute / 60
+            for turno in calcular_disponibilidad(self.dia, self.dia, **kwargs).get(self.psicologo.pk, [])
+        ]
+
+    def test_barrido(self):
+        self.assertEqual(_fusionar([(0, 5), (5, 7), (6, 8), (10, 12)]), [[0, 8], [10, 12]])
+        self.assertEqual(
+            restar_intervalos([(0, 10), (20, 30)], [(-5, 2), (4, 6), (8, 22), (25, 26)]),
+            [(2, 4), (6, 8), (22, 25), (26, 30)],
+        )
+        self.assertEqual(restar_intervalos([(0, 10)], [(0, 10)]), [])
+        # Los turnos ya pasados se descartan alineando al paso desde el inicio de la ventana
+        self.assertEqual(_partir([(0, 100)], 30, 15, 20), [30, 45, 60])
+
+    def test_resta_consultas_agendadas(self):
+        self._agendar(self._a_las(9), 60)
+        self._agendar(self._a_las(11), 60, estado='cancelada')
+        self.assertEqual(self._turnos(), [8, 10, 11])
+        self.assertEqual(self._turnos(duracion=30), [8, 8.5, 10, 10.5, 11, 11.5])
+
+    def test_consulta_que_empieza_el_dia_anterior(self):
+        self._agendar(self._a_las(23, self.dia - timedelta(days=1)), 10 * 60)
+        self.assertEqual(self._turnos(), [9, 10, 11])
+
+    def test_reserva_entre_ventanas_contiguas(self):
+        DisponibilidadPsicologo.objects.create(
+            psicologo=self.psicologo, dia_semana=self.dia.weekday(), hora_inicio=time(12), hora_fin=time(14),
+        )
+        inicio = self._a_las(11) + timedelta(minutes=30)
+        self.assertIn(11.5, self._turnos(paso=30))
+        consulta = reservar_consulta(self.cliente, self.psicologo.pk, self.tipo, inicio, 'motivo')
+        self.assertEqual(consulta.fecha_agendada, inicio)
+        # Pasa del final de la última ventana
+        with self.assertRaises(ValidationError):
+            reservar_consulta(self.cliente, self.psicologo.pk, self.tipo, inicio + timedelta(hours=2), 'motivo')
+
+    def test_paso_minimo(self):
+        self.assertEqual(len(self._turnos(duracion=60, paso=1)), 13)
+        self.assertEqual(self._turnos(duracion=60, paso=DURACION_MINIMA)[:2], [8, 8.25])
+
+    def test_parametros_invalidos(self):
+        url = reverse('consultas:disponibilidad')
+        for parametros in ({'tipo': 'abc'}, {'duracion': '1'}, {'duracion': 'x'}, {'psicologo': '1;'}):
+            self.assertEqual(self.client.get(url, parametros).status_code, 400, parametros)
+        self.assertEqual(self.client.get(url, {'tipo': '999'}).status_code, 404)
+        respuesta = self.client.get(url, {'tipo': self.tipo.pk, 'desde': self.dia.isoformat(), 'dias': 1}).json()
+        self.assertEqual(
+            respuesta['psicologos'][0]['turnos'], [self._a_las(hora).isoformat() for hora in (8, 9, 10, 11)],
+        )
+
+
+class CanalMensajesTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create(username='cliente')
+        psicologo = Psicologo.objects.create(
+            usuario=User.objects.create(username='psicologo'),
+            especialidad='clinica', experiencia_anos=1, descripcion='', tarifa_hora=100,
+        )
+        self.consulta = Consulta.objects.create(
+            cliente=self.cliente, psicologo=psicologo, duracion_minutos=60,
+            tipo_consulta=TipoConsulta.objects.create(nombre='Video', descripcion='', duracion_minutos=60, precio=100),
+            fecha_agendada=timezone.now() + timedelta(days=1), motivo_consulta='motivo',
+        )
+
+    def test_backend_memoria(self):
+        canal = Canal('consultas.canal.BackendMemoria')
+
+        async def escuchar():
+            async with canal.suscribir(7) as aviso, canal.suscribir(8) as otro:
+                self.assertEqual(canal.conexiones(), 2)
+                canal.publicar(7)
+                await asyncio.wait_for(aviso.wait(), 1)
+                self.assertFalse(otro.is_set())
+            self.assertEqual(canal.conexiones(), 0)
+
+        asyncio.run(escuchar())
+
+    async def test_flujo_sse(self):
+        primero = await MensajeConsulta.objects.acreate(consulta=self.consulta, remitente=self.cliente, mensaje='Hola')
+        flujo = eventos_mensajes(self.consulta.pk, latido=0.05)
+        evento = await anext(flujo)
+        encabezado, datos = evento.split('data: ')
+        self.assertEqual(encabezado, f'id: {primero.pk}\nevent: mensaje\n')
+        self.assertTrue(datos.endswith('\n\n'))
+        self.assertEqual(json.loads(datos)['mensaje'], 'Hola')
+        self.assertEqual(await anext(flujo), ': latido\n\n')
+        await flujo.aclose()
+
+        # Un aviso del canal despierta al suscriptor antes del latido
+        flujo = eventos_mensajes(self.consulta.pk, ultimo=primero.pk, latido=30)
+        siguiente = asyncio.ensure_future(anext(flujo))
+        await asyncio.sleep(0.05)
+        segundo = await MensajeConsulta.objects.acreate(consulta=self.consulta, remitente=self.cliente, mensaje='Otro')
+        obtener_canal().publicar(self.consulta.pk)
+        self.assertTrue((await asyncio.wait_for(siguiente, 1)).startswith(f'id: {segundo.pk}\n'))
+        await flujo.aclose()
+        self.assertEqual(obtener_canal().conexiones(), 0)
+
+    async def test_vista(self):
+        url = reverse('consultas:eventos_consulta', args=[self.consulta.pk])
+        self.assertEqual((await self.async_client.get(url)).status_code, 401)
+        await self.async_client.aforce_login(await User.objects.acreate(username='ajeno'))
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+        await self.async_client.aforce_login(self.cliente)
+        respuesta = await self.async_client.get(url)
+        self.assertTrue(respuesta.streaming)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        self.assertEqual(respuesta['Cache-Control'], 'no-cache')
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create(username='cliente')
+        psicologo = Psicologo.objects.create(
+            usuario=User.objects.create(username='psicologo'),
+            especialidad='clinica', experiencia_anos=1, descripcion='', tarifa_hora=100,
+        )
+        tipo = TipoConsulta.objects.create(nombre='Video', descripcion='', duracion_minutos=60, precio=100)
+        Consulta.objects.bulk_create([
+            Consulta(cliente=self.cliente, psicologo=psicologo, tipo_consulta=tipo, duracion_minutos=60,
+                     fecha_agendada=timezone.now(), motivo_consulta='motivo')
+            for _ in range(7)
+        ])
+        # Tres fechas repetidas: el desempate por id debe evitar saltos y duplicados entre páginas
+        base = timezone.now().replace(microsecond=0)
+        for n, pk in enumerate(Consulta.objects.order_by('pk').values_list('pk', flat=True)):
+            Consulta.objects.filter(pk=pk).update(fecha_solicitud=base - timedelta(hours=n // 3))
+
+    def _recorrer(self, **kwargs):
+        vistas, cursor = [], None
+        while True:
+            filas, cursor = paginar(Consulta.objects.all(), 'fecha_solicitud', cursor=cursor, tamano=2, **kwargs)
+            vistas.append([consulta.pk for consulta in filas])
+            if cursor is None:
+                return vistas
+
+    def test_empates_sin_saltos_ni_duplicados(self):
+        esperadas = list(Consulta.objects.order_by('-fecha_solicitud', '-pk').values_list('pk', flat=True))
+        paginas = self._recorrer()
+        self.assertEqual([len(pagina) for pagina in paginas], [2, 2, 2, 1])
+        self.assertEqual(sum(paginas, []), esperadas)
+        self.assertEqual(sum(self._recorrer(descendente=False), []), esperadas[::-1])
+
+    def test_cursor_firmado(self):
+        fecha = timezone.now()
+        self.assertEqual(decodificar_cursor(codificar_cursor(fecha, 42)), (fecha, 42))
+        cursor = codificar_cursor(fecha, 42)
+        alterados = [
+            cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B'),
+            'basura',
+            signing.dumps([fecha.isoformat(), 42], salt='otra'),
+            signing.dumps([fecha.isoformat(), '42'], salt=SAL),
+            signing.dumps(['ayer', 42], salt=SAL),
+        ]
+        for alterado in alterados:
+            with self.assertRaises(CursorInvalido, msg=alterado):
+                decodificar_cursor(alterado)
+
+    def test_vista(self):
+        self.client.force_login(self.cliente)
+        url = reverse('consultas:lista_consultas')
+        self.assertEqual(self.client.get(url, {'cursor': 'basura'}).status_code, 400)
+        vistas, parametros = [], {'tamano': 3, 'rol': 'cliente'}
+        while True:
+            respuesta = self.client.get(url, parametros).json()
+            vistas += [consulta['id'] for consulta in respuesta['consultas']]
+            if not respuesta['siguiente']:
+                break
+            parametros['cursor'] = respuesta['siguiente']
+        esperadas = Consulta.objects.order_by('-fecha_solicitud', '-pk').values_list('pk', flat=True)
+        self.assertEqual(vistas, list(esperadas))
+
+
+class AdminConsultasConstantesTests(TestCase):
+    """El número de consultas de cada changelist no debe depender del número de filas"""
+
+    MODELOS = ['tipoconsulta', 'psicologo', 'consulta', 'disponibilidadpsicologo', 'mensajeconsulta', 'contadornoleidos']
+
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        self.creadas = 0
+
+    def _crear(self, total):
+        """Lleva cada modelo a ``total`` filas"""
+        nuevas = range(self.creadas, total)
+        self.creadas = total
+        usuarios = User.objects.bulk_create([User(username=f'usuario{n}', first_name='U') for n in nuevas])
+        tipos = TipoConsulta.objects.bulk_create([
+            TipoConsulta(nombre=f'T{n}', descripcion='', duracion_minutos=60, precio=100) for n in nuevas
+        ])
+        psicologos = Psicologo.objects.bulk_create([
+            Psicologo(usuario=usuario, especialidad='clinica', experiencia_anos=1, descripcion='', tarifa_hora=100)
+            for usuario in usuarios
+        ])
+        consultas = Consulta.objects.bulk_create([
+            Consulta(
+                cliente=self.admin, psicologo=psicologo, tipo_consulta=tipo, duracion_minutos=60,
+                fecha_agendada=timezone.now() + timedelta(days=1), motivo_consulta='motivo',
+            )
+            for psicologo, tipo in zip(psicologos, tipos)
+        ])
+        DisponibilidadPsicologo.objects.bulk_create([
+            DisponibilidadPsicologo(psicologo=psicologo, dia_semana=0, hora_inicio=time(9), hora_fin=time(13))
+            for psicologo in psicologos
+        ])
+        MensajeConsulta.objects.bulk_create([
+            MensajeConsulta(consulta=consulta, remitente=self.admin, mensaje='Hola') for consulta in consultas
+        ])
+        ContadorNoLeidos.objects.bulk_create([
+            ContadorNoLeidos(consulta=consulta, usuario=psicologo.usuario, no_leidos=1)
+            for consulta, psicologo in zip(consultas, psicologos)
+        ])
+
+    def _consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def test_changelists(self):
+        urls = {modelo: reverse(f'admin:consultas_{modelo}_changelist') for modelo in self.MODELOS}
+        self._crear(10)
+        self.client.get(reverse('admin:index'))  # Calienta la caché del usuario de la sesión
+        con_10 = {modelo: self._consultas(url) for modelo, url in urls.items()}
+        self._crear(500)
+        for modelo, url in urls.items():
+            with self.subTest(modelo=modelo):
+                self.assertEqual(self._consultas(url), con_10[modelo])
+
+    def test_inline_de_mensajes(self):
+        self._crear(1)
+        consulta = Consulta.objects.get()
+        url = reverse('admin:consultas_consulta_change', args=[consulta.pk])
+        self.client.get(url)  # Calienta la caché de ContentType
+        con_1 = self._consultas(url)
+        MensajeConsulta.objects.bulk_create([
+            MensajeConsulta(consulta=consulta, remitente=consulta.cliente, mensaje='Hola') for _ in range(50)
+        ])
+        self.assertEqual(self._consultas(url), con_1)
+
+
+class ContadorNoLeidosTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create(username='cliente')
+        tipo = TipoConsulta.objects.create(nombre='Individual', descripcion='', duracion_minutos=60, precio=100)
+        self.consultas = []
+        for n in range(3):
+            psicologo = Psicologo.objects.create(
+                usuario=User.objects.create(username=f'psicologo{n}'),
+                especialidad='clinica', experiencia_anos=1, descripcion='', tarifa_hora=100,
+            )
+            self.consultas.append(Consulta.objects.create(
+                cliente=self.cliente, psicologo=psicologo, tipo_consulta=tipo, duracion_minutos=60,
+                fecha_agendada=timezone.now() + timedelta(days=1), motivo_consulta='motivo',
+            ))
+
+    def _escribir(self, consulta, remitente, cantidad):
+        return [
+            MensajeConsulta.objects.create(consulta=consulta, remitente=remitente, mensaje='Hola').pk
+            for _ in range(cantidad)
+        ]
+
+    def test_contadores_por_participante(self):
+        primera, segunda, _ = self.consultas
+        psicologo = primera.psicologo.usuario
+        ids = self._escribir(primera, psicologo, 4)
+        self._escribir(segunda, segunda.psicologo.usuario, 2)
+        self._escribir(primera, self.cliente, 3)
+        self.assertEqual(total_no_leidos(self.cliente), 6)
+        self.assertEqual(total_no_leidos(psicologo), 3)
+
+        self.client.force_login(self.cliente)
+        url = reverse('consultas:marcar_leidos', args=[primera.pk])
+        self.assertEqual(self.client.post(url, {'hasta': ids[1]}).json()['marcados'], 2)
+        respuesta = self.client.get(reverse('consultas:mensajes_no_leidos')).json()
+        self.assertEqual(respuesta['total'], 4)
+        self.assertEqual(respuesta['consultas'], {str(primera.pk): 2, str(segunda.pk): 2})
+
+        self.assertEqual(self.client.post(url).json()['marcados'], 2)
+        self.assertEqual(total_no_leidos(self.cliente), 2)
+        self.assertEqual(total_no_leidos(psicologo), 3)
+
+    def test_reconciliar(self):
+        for consulta in self.consultas:
+            self._escribir(consulta, consulta.psicologo.usuario, 2)
+            self._escribir(consulta, self.cliente, 1)
+        MensajeConsulta.objects.filter(consulta=self.consultas[0], remitente=self.cliente).update(leido=True)
+        ContadorNoLeidos.objects.update(no_leidos=99)
+
+        reconciliar_no_leidos()
+        self.assertEqual(total_no_leidos(self.cliente), 6)
+        self.assertEqual(total_no_leidos(self.consultas[0].psicologo.usuario), 0)
+        self.assertEqual(total_no_leidos(self.consultas[1].psicologo.usuario), 1)
+
+    def test_insignia_una_consulta_por_peticion(self):
+        for consulta in self.consultas:
+            self._escribir(consulta, consulta.psicologo.usuario, 5)
+        self.client.force_login(self.cliente)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('evaluaciones:home'))
+        self.assertContains(respuesta, '>15</span>')
+        self.assertEqual(sum('consultas_contadornoleidos' in consulta['sql'] for consulta in consultas), 1)
+
+
+class BusquedaTextoTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        tipo = TipoConsulta.objects.create(nombre='Individual', descripcion='', duracion_minutos=60, precio=100)
+        psicologo = Psicologo.objects.create(
+            usuario=User.objects.create(username='psicologo'),
+            especialidad='clinica', experiencia_anos=1, descripcion='', tarifa_hora=100,
+        )
+        self.consulta = Consulta.objects.create(
+            cliente=User.objects.create(username='cliente'), psicologo=psicologo, tipo_consulta=tipo,
+            duracion_minutos=60, fecha_agendada=timezone.now() + timedelta(days=1), motivo_consulta='Estrés laboral',
+        )
+
+    def _mensaje(self, texto):
+        return MensajeConsulta.objects.create(consulta=self.consulta, remitente=self.admin, mensaje=texto)
+
+    def test_sin_acentos_y_por_prefijo(self):
+        mensaje = self._mensaje('Reprogramamos la sesión del miércoles')
+        self._mensaje('Gracias')
+        for termino in ['sesion', 'MIERCOLES', 'reprogram']:
+            with self.subTest(termino=termino):
+                self.assertEqual(list(buscar(MensajeConsulta.objects.all(), termino)), [mensaje])
+
+    def test_indice_al_guardar_y_borrar(self):
+        mensaje = self._mensaje('Primera versión')
+        mensaje.mensaje = 'Texto corregido'
+        mensaje.save()
+        self.assertFalse(buscar(MensajeConsulta.objects.all(), 'primera').exists())
+        self.assertTrue(buscar(MensajeConsulta.objects.all(), 'corregido').exists())
+        mensaje.delete()
+        self.assertFalse(buscar(MensajeConsulta.objects.all(), 'corregido').exists())
+
+    def test_admin(self):
+        mensaje = self._mensaje('Tengo ansiedad antes de la sesión')
+        self._mensaje('Hola')
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(reverse('admin:consultas_mensajeconsulta_changelist'), {'q': 'ansiedad sesion'})
+        self.assertEqual(list(respuesta.context['cl'].result_list), [mensaje])
+        respuesta = self.client.get(reverse('admin:consultas_mensajeconsulta_changelist'), {'q': 'cliente'})
+        self.assertEqual(respuesta.context['cl'].result_count, 2)
+        respuesta = self.client.get(reverse('admin:consultas_consulta_changelist'), {'q': 'estres'})
+        self.assertEqual(list(respuesta.context['cl'].result_list), [self.consulta])
@@ -6,5 +6,12 @@ app_name = 'consultas'
 urlpatterns = [
     path('', views.ConsultasView.as_view(), name='consultas'),
     path('mis-consultas/', views.MisConsultasView.as_view(), name='mis_consultas'),
+    path('mis-consultas/lista/', views.lista_consultas, name='lista_consultas'),
+    path('mensajes/no-leidos/', views.mensajes_no_leidos, name='mensajes_no_leidos'),
+    path('disponibilidad/', views.disponibilidad, name='disponibilidad'),
     path('solicitar-consulta/', views.solicitar_consulta, name='solicitar_consulta'),
+    path('<int:consulta_id>/mensajes/', views.historial_mensajes, name='historial_mensajes'),
+    path('<int:consulta_id>/mensajes/enviar/', views.enviar_mensaje, name='enviar_mensaje'),
+    path('<int:consulta_id>/mensajes/eventos/', views.eventos_consulta, name='eventos_consulta'),
+    path('<int:consulta_id>/mensajes/leidos/', views.marcar_leidos, name='marcar_leidos'),
 ]
@@ -1,8 +1,25 @@
+import json
+from datetime import date, timedelta
+
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.generic import TemplateView
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_GET, require_POST
+
+from .canal import CAMPOS_MENSAJE, eventos_mensajes
+from .disponibilidad import (
+    DURACION_MAXIMA, DURACION_MINIMA, DURACION_PREDETERMINADA, MAX_DIAS, calcular_disponibilidad,
+)
+from .models import Consulta, MensajeConsulta, Psicologo, TipoConsulta
+from .no_leidos import marcar_hilo_leido, no_leidos_por_consulta
+from .paginacion import CursorInvalido, paginar, tamano_pagina
+from .reservas import ConflictoReserva, reservar_consulta
 
 
 class ConsultasView(TemplateView):
@@ -14,8 +31,222 @@ class MisConsultasView(TemplateView):
     template_name = 'consultas/mis_consultas.html'
 
 
+@login_required
 def solicitar_consulta(request):
-    if request.method == 'POST':
-        return JsonResponse({'success': True, 'message': 'Consulta solicitada correctamente'})
-    
-    return JsonResponse({'success': False, 'message': 'Método no permitido'})
\ No newline at end of file
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Método no permitido'})
+
+    psicologo_id = request.POST.get('psicologo_id', '')
+    tipo_id = request.POST.get('tipo_consulta_id', '')
+    try:
+        fecha_agendada = parse_datetime(request.POST.get('fecha_agendada', ''))
+    except ValueError:
+        fecha_agendada = None
+    motivo = request.POST.get('motivo_consulta', '').strip()
+    if not psicologo_id.isdigit() or not tipo_id.isdigit() or fecha_agendada is None or not motivo:
+        return JsonResponse({'success': False, 'message': 'Completa todos los campos de la solicitud'}, status=400)
+
+    tipo = TipoConsulta.objects.filter(pk=tipo_id, activo=True).first()
+    if tipo is None:
+        return JsonResponse({'success': False, 'message': 'Tipo de consulta no encontrado'}, status=404)
+
+    try:
+        consulta = reservar_consulta(
+            request.user, int(psicologo_id), tipo, fecha_agendada, motivo,
+            notas_cliente=request.POST.get('notas_cliente'),
+        )
+    except ConflictoReserva as conflicto:
+        return JsonResponse({
+            'success': False,
+            'message': 'El horario ya no está disponible',
+            'conflicto': conflicto.como_dict(),
+        }, status=409)
+    except ValidationError as error:
+        return JsonResponse({'success': False, 'message': ' '.join(error.messages)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Consulta solicitada correctamente',
+        'consulta': consulta.pk,
+    })
+
+
+def disponibilidad(request):
+    """Turnos libres de todos los psicólogos en un rango de fechas (JSON)"""
+    try:
+        desde = date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else timezone.localdate()
+        dias = min(max(int(request.GET.get('dias', 28)), 1), MAX_DIAS)
+        duracion = int(request.GET.get('duracion', DURACION_PREDETERMINADA))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Parámetros inválidos'}, status=400)
+
+    tipo_id = request.GET.get('tipo')
+    if tipo_id and not tipo_id.isdigit():
+        return JsonResponse({'success': False, 'message': 'Parámetros inválidos'}, status=400)
+    if tipo_id:
+        tipo = TipoConsulta.objects.filter(pk=tipo_id, activo=True).values_list('duracion_minutos', flat=True).first()
+        if tipo is None:
+            return JsonResponse({'success': False, 'message': 'Tipo de consulta no encontrado'}, status=404)
+        duracion = tipo
+    maxima = int(DURACION_MAXIMA.total_seconds() // 60)
+    if not DURACION_MINIMA <= duracion <= maxima:
+        return JsonResponse({
+            'success': False,
+            'message': f'La duración debe estar entre {DURACION_MINIMA} y {maxima} minutos',
+        }, status=400)
+
+    especialidad = request.GET.get('especialidad') or None
+    psicologo_id = request.GET.get('psicologo')
+    if psicologo_id and not psicologo_id.isdigit():
+        return JsonResponse({'success': False, 'message': 'Parámetros inválidos'}, status=400)
+    hasta = desde + timedelta(days=dias - 1)
+    turnos = calcular_disponibilidad(
+        desde, hasta, especialidad=especialidad, duracion=duracion,
+        psicologos=[int(psicologo_id)] if psicologo_id else None,
+    )
+
+    psicologos = (
+        Psicologo.objects.filter(pk__in=list(turnos))
+        .select_related('usuario')
+        .order_by('usuario__last_name', 'usuario__first_name')
+    )
+    return JsonResponse({
+        'success': True,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'duracion_minutos': duracion,
+        'psicologos': [
+            {
+                'id': psicologo.pk,
+                'nombre': str(psicologo),
+                'especialidad': psicologo.especialidad,
+                'especialidad_display': psicologo.get_especialidad_display(),
+                'turnos': [inicio.isoformat() for inicio in turnos[psicologo.pk]],
+            }
+            for psicologo in psicologos
+        ],
+    })
+
+
+def _consultas_del_usuario(usuario):
+    """Consultas en las que el usuario participa como cliente o como psicólogo"""
+    return Consulta.objects.filter(Q(cliente=usuario) | Q(psicologo__usuario=usuario))
+
+
+@login_required
+@require_GET
+def lista_consultas(request):
+    """Consultas del usuario, más recientes primero, paginadas por cursor"""
+    # Un psicólogo ve las consultas que atiende salvo que pida las suyas como cliente
+    if request.GET.get('rol') != 'cliente' and Psicologo.objects.filter(usuario=request.user).exists():
+        consultas = Consulta.objects.filter(psicologo__usuario=request.user)
+    else:
+        consultas = Consulta.objects.filter(cliente=request.user)
+    if request.GET.get('estado'):
+        consultas = consultas.filter(estado=request.GET['estado'])
+
+    try:
+        pagina, siguiente = paginar(
+            consultas.select_related('cliente', 'psicologo__usuario', 'tipo_consulta'),
+            'fecha_solicitud',
+            cursor=request.GET.get('cursor'),
+            tamano=tamano_pagina(request.GET.get('tamano')),
+        )
+    except CursorInvalido as error:
+        return JsonResponse({'success': False, 'message': str(error)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'consultas': [
+            {
+                'id': consulta.pk,
+                'tipo_consulta': consulta.tipo_consulta_id,
+                'tipo_consulta_nombre': consulta.tipo_consulta.nombre,
+                'psicologo_nombre': consulta.psicologo.usuario.get_full_name() or consulta.psicologo.usuario.username,
+                'cliente_nombre': consulta.cliente.get_full_name() or consulta.cliente.username,
+                'fecha_solicitud': consulta.fecha_solicitud,
+                'fecha_agendada': consulta.fecha_agendada,
+                'duracion_minutos': consulta.duracion_minutos,
+                'estado': consulta.estado,
+                'motivo_consulta': consulta.motivo_consulta,
+                'notas_cliente': consulta.notas_cliente,
+            }
+            for consulta in pagina
+        ],
+        'siguiente': siguiente,
+    })
+
+
+@login_required
+@require_GET
+def historial_mensajes(request, consulta_id):
+    """Mensajes de la consulta del más reciente al más antiguo, paginados por cursor"""
+    if not _consultas_del_usuario(request.user).filter(pk=consulta_id).exists():
+        return JsonResponse({'success': False, 'message': 'Consulta no encontrada'}, status=404)
+    try:
+        mensajes, siguiente = paginar(
+            MensajeConsulta.objects.filter(consulta_id=consulta_id).values(*CAMPOS_MENSAJE),
+            'fecha_envio',
+            cursor=request.GET.get('cursor'),
+            tamano=tamano_pagina(request.GET.get('tamano')),
+        )
+    except CursorInvalido as error:
+        return JsonResponse({'success': False, 'message': str(error)}, status=400)
+    return JsonResponse({'success': True, 'mensajes': mensajes, 'siguiente': siguiente})
+
+
+async def eventos_consulta(request, consulta_id):
+    """Server-Sent Events con los mensajes nuevos de la consulta (requiere servidor ASGI)"""
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return JsonResponse({'success': False, 'message': 'Autenticación requerida'}, status=401)
+    if not await _consultas_del_usuario(usuario).filter(pk=consulta_id).aexists():
+        return JsonResponse({'success': False, 'message': 'Consulta no encontrada'}, status=404)
+
+    ultimo = request.headers.get('Last-Event-ID') or request.GET.get('desde') or '0'
+    response = StreamingHttpResponse(
+        eventos_mensajes(consulta_id, int(ultimo) if ultimo.isdigit() else 0),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Nginx no debe acumular el flujo
+    return response
+
+
+@login_required
+@require_POST
+def enviar_mensaje(request, consulta_id):
+    """Guarda un mensaje; los participantes conectados lo reciben por el canal de eventos"""
+    consulta = _consultas_del_usuario(request.user).filter(pk=consulta_id).first()
+    if consulta is None:
+        return JsonResponse({'success': False, 'message': 'Consulta no encontrada'}, status=404)
+    texto = request.POST.get('mensaje', '').strip()
+    if not texto:
+        return JsonResponse({'success': False, 'message': 'El mensaje está vacío'}, status=400)
+    mensaje = MensajeConsulta.objects.create(consulta=consulta, remitente=request.user, mensaje=texto)
+    return JsonResponse({'success': True, 'mensaje': mensaje.pk})
+
+
+@login_required
+@require_POST
+def marcar_leidos(request, consulta_id):
+    """Marca como leídos los mensajes recibidos hasta el id confirmado, o todo el hilo si no se indica"""
+    try:
+        datos = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+        hasta = datos.get('hasta')
+        hasta = int(hasta) if hasta not in (None, '') else None
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'El id del último mensaje recibido no es válido'}, status=400)
+
+    if not _consultas_del_usuario(request.user).filter(pk=consulta_id).exists():
+        return JsonResponse({'success': False, 'message': 'Consulta no encontrada'}, status=404)
+    marcados = marcar_hilo_leido(consulta_id, request.user.pk, hasta)
+    return JsonResponse({'success': True, 'marcados': marcados})
+
+
+@login_required
+@require_GET
+def mensajes_no_leidos(request):
+    """Total de mensajes sin leer del usuario y su desglose por consulta"""
+    por_consulta = no_leidos_por_consulta(request.user)
+    return JsonResponse({'success': True, 'total': sum(por_consulta.values()), 'consultas': por_consulta})
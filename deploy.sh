@@ -29,6 +29,18 @@ python manage.py migrate
 # Recopilar archivos estáticos
 echo "📁 Recopilando archivos estáticos..."
 python manage.py collectstatic --noinput
+# Los estáticos llevan hash y caché inmutable: falla si alguna plantilla no los enlaza bien
+python manage.py check --deploy --tag staticfiles || exit 1
+
+# Versión estática de las páginas públicas (nginx/CDN las sirven sin Django)
+echo "📄 Generando páginas públicas estáticas..."
+export VERSION_DESPLIEGUE="${VERSION_DESPLIEGUE:-$(git rev-parse --short HEAD 2>/dev/null || echo dev)}"
+python manage.py prerender_public
+if [ -n "$PAGINAS_DESTINO" ]; then
+    # Primero los archivos y al final el manifiesto, para no anunciar páginas incompletas
+    rsync -a --exclude manifest.json staticfiles/paginas/ "$PAGINAS_DESTINO"
+    rsync -a staticfiles/paginas/manifest.json "$PAGINAS_DESTINO"
+fi
 
 # Crear superusuario si no existe
 echo "👤 Creando superusuario..."
@@ -0,0 +1,74 @@
+"""
+Tokens de acceso de los evaluados.
+
+Los empleados dados de alta en bloque (``evaluaciones.alta_masiva``) no tienen
+contraseña: entran con un token firmado (HMAC con SECRET_KEY) que liga a un usuario con
+una evaluación. El token caduca a los ACCESO_VIGENCIA segundos y sirve solo mientras esa
+evaluación siga abierta; comprobarlo no requiere consultar la base de datos.
+
+El enlace ``/acceso/<token>/`` guarda el token en la cookie ``acceso_evaluacion``, que
+reemplaza a la sesión en los endpoints de la evaluación marcados con
+``evaluado_requerido``: no hay inicio de sesión, ni hash de contraseña, ni fila en
+``django_session``, y el resto del sitio lo trata como anónimo.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core import signing
+
+
+SAL = 'evaluaciones.acceso'
+
+COOKIE = 'acceso_evaluacion'
+
+# 30 días, lo que suele durar una campaña de aplicación de la NOM-035
+VIGENCIA_PREDETERMINADA = 60 * 60 * 24 * 30
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+def vigencia():
+    return getattr(settings, 'ACCESO_VIGENCIA', VIGENCIA_PREDETERMINADA)
+
+
+def _firmante():
+    return signing.TimestampSigner(salt=SAL)
+
+
+def generar_token(evaluacion_id, usuario_id):
+    return _firmante().sign_object([evaluacion_id, usuario_id], compress=False)
+
+
+def leer_token(token):
+    """(evaluacion_id, usuario_id) del token; TokenInvalido si está alterado o vencido"""
+    try:
+        evaluacion_id, usuario_id = _firmante().unsign_object(token, max_age=vigencia())
+    except (signing.BadSignature, TypeError, ValueError):
+        raise TokenInvalido('El enlace de acceso no es válido o ya venció')
+    return evaluacion_id, usuario_id
+
+
+def evaluado_requerido(vista):
+    """
+    ``login_required`` de los endpoints de la evaluación que acepta también el acceso por
+    enlace. Deja en ``request.evaluado_id`` el usuario evaluado y en
+    ``request.evaluacion_acceso`` la única evaluación permitida (None con sesión normal).
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            request.evaluado_id, request.evaluacion_acceso = request.user.pk, None
+            return vista(request, *args, **kwargs)
+        token = request.COOKIES.get(COOKIE)
+        if token:
+            try:
+                request.evaluacion_acceso, request.evaluado_id = leer_token(token)
+            except TokenInvalido:
+                pass
+            else:
+                return vista(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+    return envoltura
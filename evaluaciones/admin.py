@@ -1,4 +1,17 @@
-from django.contrib import admin
+import io
+from functools import partial
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import path
+
+from psymetrics.busqueda import BusquedaTextoAdminMixin
+from psymetrics.replicas import ReplicaAdminMixin
+
 from .models import (
     CuestionarioNOM035,
     DominioNOM035,
@@ -7,8 +20,15 @@ from .models import (
     Evaluacion,
     RespuestaEvaluacion,
     TipoEvaluacion,
-    EvaluacionPersonalizada
+    EvaluacionPersonalizada,
+    AgregadoDominio
 )
+from .agregados import resumen_cuestionario
+from .alta_masiva import dar_de_alta, escribir_accesos
+from .analitica import analisis_cuestionario
+from .correos import encolar_correos
+from .exportacion import respuesta_exportacion
+from .puntuacion import NIVELES_ETIQUETAS, finalizar_evaluacion, retirar_evaluacion
 
 
 # Inlines para estructura jerárquica
@@ -45,11 +65,40 @@ class RespuestaEvaluacionInline(admin.TabularInline):
     fields = ['pregunta', 'opcion_seleccionada', 'respuesta_texto', 'puntuacion', 'fecha_respuesta']
     readonly_fields = ['fecha_respuesta']
     can_delete = False
+    
+    def get_queryset(self, request):
+        # __str__ de cada fila recorre evaluacion -> evaluado/cuestionario y pregunta -> dominio
+        return super().get_queryset(request).select_related(
+            'evaluacion__evaluado', 'evaluacion__cuestionario', 'pregunta__dominio',
+        )
+    
+    def get_formset(self, request, obj=None, **kwargs):
+        kwargs['formfield_callback'] = partial(self._campo_formulario, request=request, evaluacion=obj)
+        return super().get_formset(request, obj, **kwargs)
+    
+    def _campo_formulario(self, db_field, request, evaluacion=None, **kwargs):
+        """Limita los selects al cuestionario de la evaluación y calcula sus opciones una sola vez"""
+        formfield = self.formfield_for_dbfield(db_field, request, **kwargs)
+        if db_field.name == 'pregunta':
+            queryset = PreguntaNOM035.objects.select_related('dominio').order_by('dominio__orden', 'orden')
+            if evaluacion is not None:
+                queryset = queryset.filter(dominio__cuestionario_id=evaluacion.cuestionario_id)
+        elif db_field.name == 'opcion_seleccionada':
+            queryset = OpcionRespuesta.objects.select_related('pregunta__dominio').order_by('pregunta__orden', 'orden')
+            if evaluacion is not None:
+                queryset = queryset.filter(pregunta__dominio__cuestionario_id=evaluacion.cuestionario_id)
+        else:
+            return formfield
+        formfield.queryset = queryset
+        # Con choices fijas cada formulario del formset reutiliza la lista en lugar de consultar de nuevo
+        formfield.choices = list(formfield.choices)
+        return formfield
 
 
 # Admin para Cuestionarios
 @admin.register(CuestionarioNOM035)
 class CuestionarioNOM035Admin(admin.ModelAdmin):
+    change_form_template = 'admin/evaluaciones/cuestionarionom035/change_form.html'
     list_display = ['nombre', 'version', 'estado', 'creado_por', 'fecha_creacion']
     list_filter = ['estado', 'fecha_creacion']
     search_fields = ['nombre', 'descripcion', 'version']
@@ -70,6 +119,28 @@ class CuestionarioNOM035Admin(admin.ModelAdmin):
         if not change:  # Si es un nuevo objeto
             obj.creado_por = request.user
         super().save_model(request, obj, form, change)
+    
+    def get_urls(self):
+        return [
+            path('<int:object_id>/analisis/', self.admin_site.admin_view(self.analisis_view),
+                 name='evaluaciones_cuestionarionom035_analisis'),
+        ] + super().get_urls()
+    
+    def analisis_view(self, request, object_id):
+        """Confiabilidad por dominio y correlaciones entre dominios de las evaluaciones completadas"""
+        cuestionario = get_object_or_404(CuestionarioNOM035, pk=object_id)
+        if not self.has_view_permission(request, cuestionario):
+            raise PermissionDenied
+        analisis = analisis_cuestionario(cuestionario.pk)
+        correlaciones = analisis['correlaciones']
+        return render(request, 'admin/evaluaciones/cuestionarionom035/analisis.html', {
+            **self.admin_site.each_context(request),
+            'title': f'Análisis psicométrico: {cuestionario}',
+            'opts': self.model._meta,
+            'original': cuestionario,
+            'analisis': analisis,
+            'filas_correlacion': list(zip(correlaciones['dominios'], correlaciones['matriz'])),
+        })
 
 
 # Admin para Dominios
@@ -77,6 +148,7 @@ class CuestionarioNOM035Admin(admin.ModelAdmin):
 class DominioNOM035Admin(admin.ModelAdmin):
     list_display = ['nombre', 'cuestionario', 'orden', 'get_num_preguntas']
     list_filter = ['cuestionario']
+    list_select_related = ['cuestionario']
     search_fields = ['nombre', 'descripcion']
     inlines = [PreguntaNOM035Inline]
     ordering = ['cuestionario', 'orden']
@@ -87,17 +159,22 @@ class DominioNOM035Admin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_preguntas=Count('preguntanom035'))
+    
     def get_num_preguntas(self, obj):
         """Muestra el número de preguntas en el dominio"""
-        return obj.preguntanom035_set.count()
+        return obj.num_preguntas
     get_num_preguntas.short_description = 'Nº Preguntas'
+    get_num_preguntas.admin_order_field = 'num_preguntas'
 
 
 # Admin para Preguntas
 @admin.register(PreguntaNOM035)
-class PreguntaNOM035Admin(admin.ModelAdmin):
+class PreguntaNOM035Admin(BusquedaTextoAdminMixin, admin.ModelAdmin):
     list_display = ['get_pregunta_corta', 'dominio', 'tipo', 'orden', 'obligatoria', 'get_num_opciones']
     list_filter = ['tipo', 'obligatoria', 'dominio__cuestionario']
+    list_select_related = ['dominio__cuestionario']
     search_fields = ['texto']
     inlines = [OpcionRespuestaInline]
     ordering = ['dominio', 'orden']
@@ -113,17 +190,27 @@ class PreguntaNOM035Admin(admin.ModelAdmin):
         return obj.texto[:50] + '...' if len(obj.texto) > 50 else obj.texto
     get_pregunta_corta.short_description = 'Pregunta'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_opciones=Count('opcionrespuesta'))
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'dominio':
+            kwargs['queryset'] = DominioNOM035.objects.select_related('cuestionario')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+    
     def get_num_opciones(self, obj):
         """Muestra el número de opciones de respuesta"""
-        return obj.opcionrespuesta_set.count()
+        return obj.num_opciones
     get_num_opciones.short_description = 'Nº Opciones'
+    get_num_opciones.admin_order_field = 'num_opciones'
 
 
 # Admin para Opciones de Respuesta
 @admin.register(OpcionRespuesta)
-class OpcionRespuestaAdmin(admin.ModelAdmin):
+class OpcionRespuestaAdmin(BusquedaTextoAdminMixin, admin.ModelAdmin):
     list_display = ['texto', 'pregunta', 'valor', 'orden']
     list_filter = ['pregunta__dominio__cuestionario']
+    list_select_related = ['pregunta__dominio']
     search_fields = ['texto', 'pregunta__texto']
     ordering = ['pregunta', 'orden']
     
@@ -132,16 +219,29 @@ class OpcionRespuestaAdmin(admin.ModelAdmin):
             'fields': ('pregunta', 'texto', 'valor', 'orden')
         }),
     )
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'pregunta':
+            kwargs['queryset'] = PreguntaNOM035.objects.select_related('dominio')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class AltaMasivaForm(forms.Form):
+    archivo = forms.FileField(help_text='CSV con columnas usuario, email, nombre, apellidos')
+    cuestionario = forms.ModelChoiceField(queryset=CuestionarioNOM035.objects.filter(estado='activo'))
 
 
 # Admin para Evaluaciones
 @admin.register(Evaluacion)
-class EvaluacionAdmin(admin.ModelAdmin):
+class EvaluacionAdmin(ReplicaAdminMixin, admin.ModelAdmin):
+    change_list_template = 'admin/evaluaciones/evaluacion/change_list.html'
     list_display = ['get_evaluado_nombre', 'cuestionario', 'estado', 'fecha_inicio', 'puntuacion_total']
     list_filter = ['estado', 'fecha_inicio', 'cuestionario']
+    list_select_related = ['evaluado', 'cuestionario']
     search_fields = ['evaluado__username', 'evaluado__first_name', 'evaluado__last_name']
     readonly_fields = ['fecha_inicio', 'fecha_completado']
     inlines = [RespuestaEvaluacionInline]
+    actions = ['exportar_respuestas_csv', 'exportar_respuestas_xlsx', 'enviar_invitacion', 'enviar_recordatorio']
     
     fieldsets = (
         ('Información de la Evaluación', {
@@ -157,13 +257,109 @@ class EvaluacionAdmin(admin.ModelAdmin):
         return obj.evaluado.get_full_name() or obj.evaluado.username
     get_evaluado_nombre.short_description = 'Evaluado'
     get_evaluado_nombre.admin_order_field = 'evaluado__first_name'
+    
+    def _exportar(self, request, queryset, formato):
+        cuestionarios = list(queryset.order_by().values_list('cuestionario_id', flat=True).distinct()[:2])
+        if len(cuestionarios) != 1:
+            self.message_user(request, 'Selecciona evaluaciones de un solo cuestionario para exportar.', messages.ERROR)
+            return None
+        return respuesta_exportacion(queryset, cuestionarios[0], formato)
+    
+    @admin.action(description='Exportar respuestas (CSV)')
+    def exportar_respuestas_csv(self, request, queryset):
+        return self._exportar(request, queryset, 'csv')
+    
+    @admin.action(description='Exportar respuestas (XLSX)')
+    def exportar_respuestas_xlsx(self, request, queryset):
+        return self._exportar(request, queryset, 'xlsx')
+    
+    def _encolar(self, request, queryset, tipo):
+        encolados = encolar_correos(tipo, queryset)
+        self.message_user(request, f'{encolados} correos agregados a la bandeja de salida (manage.py enviar_correos).')
+    
+    @admin.action(description='Enviar invitación por correo')
+    def enviar_invitacion(self, request, queryset):
+        self._encolar(request, queryset, 'invitacion')
+    
+    @admin.action(description='Enviar recordatorio por correo')
+    def enviar_recordatorio(self, request, queryset):
+        self._encolar(request, queryset, 'recordatorio')
+    
+    def changelist_view(self, request, extra_context=None):
+        """Filtrado por un cuestionario, resume sus resultados leyendo solo AgregadoDominio"""
+        cuestionario_id = request.GET.get('cuestionario__id__exact', '')
+        if request.method == 'GET' and cuestionario_id.isdigit():
+            extra_context = {
+                **(extra_context or {}),
+                'resumen_agregados': resumen_cuestionario(int(cuestionario_id)),
+                'niveles': NIVELES_ETIQUETAS.values(),
+            }
+        return super().changelist_view(request, extra_context)
+    
+    def get_urls(self):
+        return [
+            path('alta-masiva/', self.admin_site.admin_view(self.alta_masiva_view), name='evaluaciones_alta_masiva'),
+        ] + super().get_urls()
+
+    def alta_masiva_view(self, request):
+        """Sube el CSV de empleados y descarga sus tokens de acceso"""
+        if not (self.has_add_permission(request) and request.user.has_perm('auth.add_user')):
+            raise PermissionDenied
+        form = AltaMasivaForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            archivo = io.TextIOWrapper(form.cleaned_data['archivo'].file, encoding='utf-8-sig', newline='')
+            try:
+                resumen = dar_de_alta(archivo, form.cleaned_data['cuestionario'], request.user)
+            except (ValueError, UnicodeDecodeError) as error:
+                form.add_error('archivo', str(error))
+            else:
+                self.message_user(request, (
+                    f'{resumen.creadas} empleados dados de alta; {resumen.existentes} ya existían, '
+                    f'{resumen.repetidas} repetidos en el archivo y {resumen.invalidas} inválidos.'
+                ), messages.SUCCESS if resumen.creadas else messages.WARNING)
+                for error in resumen.errores:
+                    self.message_user(request, error, messages.WARNING)
+                response = HttpResponse(content_type='text/csv; charset=utf-8')
+                response['Content-Disposition'] = 'attachment; filename="accesos.csv"'
+                escribir_accesos(resumen, response, request.build_absolute_uri('/'))
+                return response
+        return render(request, 'admin/evaluaciones/evaluacion/alta_masiva.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Alta masiva de empleados',
+            'opts': self.model._meta,
+            'form': form,
+        })
+
+    def save_model(self, request, obj, form, change):
+        """
+        Al marcarla como completada la califica y la suma a los agregados; al sacarla de
+        'completada' la resta. El cambio de estado lo hacen esas funciones, no el formulario.
+        """
+        estado, anterior = obj.estado, form.initial.get('estado', 'iniciada')
+        transicion = 'estado' in form.changed_data and 'completada' in (estado, anterior)
+        if transicion:
+            obj.estado = anterior
+        super().save_model(request, obj, form, change)
+        if not transicion:
+            return
+        if estado != 'completada':
+            retirar_evaluacion(obj, estado)
+            return
+        finalizar_evaluacion(obj)
+        if obj.estado != 'completada':
+            self.message_user(
+                request, 'Solo se pueden completar evaluaciones iniciadas o en progreso.', messages.WARNING,
+            )
 
 
 # Admin para Respuestas de Evaluación
 @admin.register(RespuestaEvaluacion)
-class RespuestaEvaluacionAdmin(admin.ModelAdmin):
+class RespuestaEvaluacionAdmin(ReplicaAdminMixin, BusquedaTextoAdminMixin, admin.ModelAdmin):
     list_display = ['evaluacion', 'pregunta', 'opcion_seleccionada', 'puntuacion', 'fecha_respuesta']
     list_filter = ['evaluacion__estado', 'fecha_respuesta']
+    list_select_related = [
+        'evaluacion__evaluado', 'evaluacion__cuestionario', 'pregunta__dominio', 'opcion_seleccionada__pregunta__dominio',
+    ]
     search_fields = ['evaluacion__evaluado__username', 'pregunta__texto']
     readonly_fields = ['fecha_respuesta']
     
@@ -175,6 +371,16 @@ class RespuestaEvaluacionAdmin(admin.ModelAdmin):
             'fields': ('opcion_seleccionada', 'respuesta_texto', 'puntuacion', 'fecha_respuesta')
         }),
     )
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        relacionados = {
+            'evaluacion': Evaluacion.objects.select_related('evaluado', 'cuestionario'),
+            'pregunta': PreguntaNOM035.objects.select_related('dominio'),
+            'opcion_seleccionada': OpcionRespuesta.objects.select_related('pregunta__dominio'),
+        }
+        if db_field.name in relacionados:
+            kwargs['queryset'] = relacionados[db_field.name]
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 # Admin para Tipos de Evaluación
@@ -199,6 +405,7 @@ class TipoEvaluacionAdmin(admin.ModelAdmin):
 class EvaluacionPersonalizadaAdmin(admin.ModelAdmin):
     list_display = ['nombre_proyecto', 'cliente', 'tipo_evaluacion', 'estado', 'fecha_solicitud', 'fecha_entrega_estimada']
     list_filter = ['estado', 'fecha_solicitud', 'tipo_evaluacion']
+    list_select_related = ['cliente', 'tipo_evaluacion']
     search_fields = ['nombre_proyecto', 'descripcion', 'cliente__username']
     readonly_fields = ['fecha_solicitud']
     
@@ -213,3 +420,34 @@ class EvaluacionPersonalizadaAdmin(admin.ModelAdmin):
             'fields': ('fecha_solicitud', 'fecha_entrega_estimada')
         }),
     )
+
+
+# Admin para Agregados por Dominio (solo lectura, se mantienen automáticamente)
+@admin.register(AgregadoDominio)
+class AgregadoDominioAdmin(ReplicaAdminMixin, admin.ModelAdmin):
+    list_display = ['cuestionario', 'get_dominio_nombre', 'periodo', 'conteo', 'get_media', 'get_desviacion',
+                    'nivel_nulo', 'nivel_bajo', 'nivel_medio', 'nivel_alto', 'nivel_muy_alto']
+    list_filter = ['cuestionario', 'periodo']
+    list_select_related = ['cuestionario', 'dominio']
+    date_hierarchy = 'periodo'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_dominio_nombre(self, obj):
+        """Muestra el dominio o 'Total' para la calificación final"""
+        return obj.dominio.nombre if obj.dominio else 'Total'
+    get_dominio_nombre.short_description = 'Dominio'
+    
+    def get_media(self, obj):
+        """Muestra la calificación media"""
+        return round(obj.media, 2) if obj.media is not None else '-'
+    get_media.short_description = 'Media'
+    
+    def get_desviacion(self, obj):
+        """Muestra la desviación estándar"""
+        return round(obj.desviacion, 2) if obj.desviacion is not None else '-'
+    get_desviacion.short_description = 'Desviación'
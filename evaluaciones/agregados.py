@@ -0,0 +1,174 @@
+"""
+Agregados materializados de resultados NOM-035.
+
+AgregadoDominio guarda, por cuestionario, dominio y mes, el conteo, la suma, la suma
+de cuadrados y el histograma de niveles de riesgo. Se actualiza de forma incremental
+al completar cada evaluación (y se descuenta al reabrirla o borrarla) y puede
+reconstruirse desde cero con ``manage.py reconstruir_agregados``. El listado de
+Evaluaciones del admin, filtrado por cuestionario, se resume con ``resumen_cuestionario``.
+"""
+from datetime import date
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from psymetrics.replicas import usar_replica
+
+from .models import AgregadoDominio, Evaluacion
+from .puntuacion import NIVELES, puntuar
+
+
+CAMPOS_NIVEL = [f'nivel_{nivel}' for nivel in NIVELES]
+
+TAMANO_LOTE = 5000
+
+
+def periodo_de(fecha):
+    """Primer día del mes (hora local) al que se asigna una evaluación"""
+    return timezone.localdate(fecha).replace(day=1)
+
+
+def _celdas(resultados, fila):
+    """(dominio_id o None para el total, calificación, nivel) de una evaluación"""
+    cuestionario_id = resultados.cuestionarios[fila]
+    columnas = np.flatnonzero(resultados.dominio_cuestionarios == cuestionario_id)
+    celdas = [
+        (int(resultados.dominios[c]), float(resultados.sumas_dominio[fila, c]), int(resultados.nivel_dominio[fila, c]))
+        for c in columnas
+    ]
+    celdas.append((None, float(resultados.total[fila]), int(resultados.nivel_total[fila])))
+    return celdas
+
+
+def _segun_dominio(dominio_id, valor):
+    if dominio_id is None:
+        return When(dominio__isnull=True, then=Value(valor))
+    return When(dominio_id=dominio_id, then=Value(valor))
+
+
+def acumular_evaluacion(resultados, evaluacion_id, periodo, signo=1):
+    """
+    Suma una evaluación recién completada a los agregados (dos sentencias); con
+    ``signo=-1`` la descuenta
+    """
+    fila = resultados.indice(evaluacion_id)
+    cuestionario_id = int(resultados.cuestionarios[fila])
+    celdas = _celdas(resultados, fila)
+    dominio_ids = [dominio_id for dominio_id, _, _ in celdas if dominio_id is not None]
+
+    incrementos = {
+        'conteo': F('conteo') + signo,
+        'suma': F('suma') + Case(
+            *[_segun_dominio(d, signo * valor) for d, valor, _ in celdas], default=Value(0.0), output_field=FloatField()
+        ),
+        'suma_cuadrados': F('suma_cuadrados') + Case(
+            *[_segun_dominio(d, signo * valor * valor) for d, valor, _ in celdas],
+            default=Value(0.0), output_field=FloatField(),
+        ),
+    }
+    for indice, campo in enumerate(CAMPOS_NIVEL):
+        casos = [_segun_dominio(d, signo) for d, _, nivel in celdas if nivel == indice]
+        if casos:
+            incrementos[campo] = F(campo) + Case(*casos, default=Value(0), output_field=IntegerField())
+
+    with transaction.atomic():
+        AgregadoDominio.objects.bulk_create(
+            [AgregadoDominio(cuestionario_id=cuestionario_id, dominio_id=d, periodo=periodo) for d, _, _ in celdas],
+            ignore_conflicts=True,
+        )
+        AgregadoDominio.objects.filter(
+            Q(dominio_id__in=dominio_ids) | Q(dominio__isnull=True),
+            cuestionario_id=cuestionario_id,
+            periodo=periodo,
+        ).update(**incrementos)
+
+
+def reconstruir_agregados(tamano_lote=TAMANO_LOTE, cuestionario_id=None):
+    """Recalcula los agregados (todos o los de un cuestionario) a partir de las evaluaciones completadas"""
+    evaluaciones = Evaluacion.objects.filter(estado='completada')
+    agregados = AgregadoDominio.objects.all()
+    if cuestionario_id is not None:
+        evaluaciones = evaluaciones.filter(cuestionario_id=cuestionario_id)
+        agregados = agregados.filter(cuestionario_id=cuestionario_id)
+    completadas = list(
+        evaluaciones
+        .order_by('pk')
+        .values_list('pk', 'fecha_completado', 'fecha_inicio')
+    )
+    acumulados = {}
+    for inicio in range(0, len(completadas), tamano_lote):
+        lote = completadas[inicio:inicio + tamano_lote]
+        periodos = {pk: periodo_de(completado or iniciado) for pk, completado, iniciado in lote}
+        resultados = puntuar(list(periodos))
+        if not len(resultados):
+            continue
+
+        periodo_fila = np.array([periodos[pk].toordinal() for pk in resultados.evaluaciones.tolist()])
+        valores = np.column_stack([resultados.sumas_dominio, resultados.total])
+        niveles = np.column_stack([resultados.nivel_dominio, resultados.nivel_total])
+        columna_cuestionario = np.append(resultados.dominio_cuestionarios, -1)
+
+        grupos = np.unique(np.column_stack([resultados.cuestionarios, periodo_fila]), axis=0)
+        for cuestionario_id, ordinal in grupos.tolist():
+            filas = (resultados.cuestionarios == cuestionario_id) & (periodo_fila == ordinal)
+            columnas = np.flatnonzero((columna_cuestionario == cuestionario_id) | (columna_cuestionario == -1))
+            bloque = valores[filas][:, columnas]
+            histograma = (niveles[filas][:, columnas, None] == np.arange(len(NIVELES))).sum(axis=0)
+            sumas = bloque.sum(axis=0)
+            cuadrados = (bloque ** 2).sum(axis=0)
+            for posicion, columna in enumerate(columnas.tolist()):
+                dominio_id = int(resultados.dominios[columna]) if columna < len(resultados.dominios) else None
+                clave = (cuestionario_id, dominio_id, ordinal)
+                previo = acumulados.setdefault(clave, np.zeros(3 + len(NIVELES)))
+                previo += np.concatenate([[filas.sum(), sumas[posicion], cuadrados[posicion]], histograma[posicion]])
+
+    filas = []
+    for (cuestionario_id, dominio_id, ordinal), datos in acumulados.items():
+        filas.append(AgregadoDominio(
+            cuestionario_id=cuestionario_id,
+            dominio_id=dominio_id,
+            periodo=date.fromordinal(ordinal),
+            conteo=int(datos[0]),
+            suma=float(datos[1]),
+            suma_cuadrados=float(datos[2]),
+            **{campo: int(datos[3 + i]) for i, campo in enumerate(CAMPOS_NIVEL)},
+        ))
+    with transaction.atomic():
+        agregados.delete()
+        AgregadoDominio.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def resumen_cuestionario(cuestionario_id, desde=None, hasta=None):
+    """Media, desviación e histograma por dominio (y total) leyendo solo los agregados"""
+    agregados = AgregadoDominio.objects.filter(cuestionario_id=cuestionario_id)
+    if desde:
+        agregados = agregados.filter(periodo__gte=desde.replace(day=1))
+    if hasta:
+        agregados = agregados.filter(periodo__lte=hasta)
+
+    por_dominio = {}
+    with usar_replica():
+        filas = list(agregados.select_related('dominio'))
+    for agregado in filas:
+        combinado = por_dominio.setdefault(agregado.dominio_id, AgregadoDominio(
+            cuestionario_id=cuestionario_id, dominio=agregado.dominio, periodo=agregado.periodo,
+        ))
+        combinado.conteo += agregado.conteo
+        combinado.suma += agregado.suma
+        combinado.suma_cuadrados += agregado.suma_cuadrados
+        for campo in CAMPOS_NIVEL:
+            setattr(combinado, campo, getattr(combinado, campo) + getattr(agregado, campo))
+
+    return [
+        {
+            'dominio': agregado.dominio.nombre if agregado.dominio else 'Total',
+            'conteo': agregado.conteo,
+            'media': agregado.media,
+            'desviacion': agregado.desviacion,
+            'histograma': agregado.histograma,
+        }
+        for agregado in sorted(por_dominio.values(), key=lambda a: (a.dominio is None, a.dominio.orden if a.dominio else 0))
+    ]
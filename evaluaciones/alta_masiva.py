@@ -0,0 +1,192 @@
+"""
+Alta masiva de empleados desde un CSV.
+
+Cada fila crea un ``User`` sin contraseña utilizable y su ``Evaluacion`` del cuestionario
+elegido; el acceso es un token firmado (``evaluaciones.acceso``), así que no se calcula
+ningún hash PBKDF2. El archivo se lee en streaming y se procesa por lotes: los
+duplicados se descartan con una consulta ``__in`` por lote (usuario y correo) y cada
+lote se inserta con ``bulk_create`` dentro de una sola transacción.
+
+Columnas reconocidas (la primera fila es el encabezado): ``usuario``, ``email``,
+``nombre`` y ``apellidos`` (o sus equivalentes ``username``, ``first_name`` y
+``last_name``). Si falta el usuario se usa el correo.
+"""
+import csv
+import secrets
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.urls import reverse
+
+from .acceso import generar_token
+from .models import Evaluacion
+
+
+TAMANO_LOTE = 1000
+
+COLUMNAS = {
+    'username': ('usuario', 'username'),
+    'email': ('email', 'correo'),
+    'first_name': ('nombre', 'first_name'),
+    'last_name': ('apellidos', 'apellido', 'last_name'),
+}
+
+# Motivos de descarte que se reportan con su número de línea
+MAX_ERRORES_REPORTADOS = 50
+
+
+class Resumen:
+    def __init__(self):
+        self.procesadas = 0
+        self.creadas = 0
+        self.existentes = 0
+        self.repetidas = 0
+        self.invalidas = 0
+        self.errores = []
+        self.accesos = []
+
+    def descartar(self, linea, motivo):
+        self.invalidas += 1
+        if len(self.errores) < MAX_ERRORES_REPORTADOS:
+            self.errores.append(f'Línea {linea}: {motivo}')
+
+
+def _columnas(encabezado):
+    normalizado = {nombre.strip().lower(): nombre for nombre in encabezado or []}
+    columnas = {}
+    for campo, alias in COLUMNAS.items():
+        columnas[campo] = next((normalizado[nombre] for nombre in alias if nombre in normalizado), None)
+    if columnas['username'] is None and columnas['email'] is None:
+        raise ValueError('El archivo debe tener una columna "usuario" o "email"')
+    return columnas
+
+
+def leer_empleados(archivo):
+    """Genera (línea, datos) por cada fila de ``archivo`` (texto) con los campos de User"""
+    lector = csv.DictReader(archivo)
+    columnas = _columnas(lector.fieldnames)
+    for fila in lector:
+        datos = {campo: (fila.get(columna) or '').strip() if columna else '' for campo, columna in columnas.items()}
+        datos['email'] = datos['email'].lower()
+        datos['username'] = datos['username'] or datos['email']
+        yield lector.line_num, datos
+
+
+def _validar(datos):
+    if not datos['username']:
+        return 'sin usuario ni correo'
+    campo_usuario = User._meta.get_field('username')
+    try:
+        campo_usuario.run_validators(datos['username'])
+    except ValidationError as error:
+        return f"usuario '{datos['username']}' inválido: {' '.join(error.messages)}"
+    if datos['email']:
+        try:
+            validate_email(datos['email'])
+        except ValidationError:
+            return f"correo '{datos['email']}' inválido"
+    return None
+
+
+def _filtrar_existentes(lote, resumen):
+    usuarios = {datos['username'] for _, datos in lote}
+    correos = {datos['email'] for _, datos in lote if datos['email']}
+    tomados = set(User.objects.filter(username__in=usuarios).values_list('username', flat=True))
+    # Los correos del archivo ya vienen en minúsculas; los guardados pueden no estarlo
+    correos_tomados = set(
+        User.objects.annotate(email_minusculas=Lower('email')).filter(email_minusculas__in=correos)
+        .values_list('email_minusculas', flat=True)
+    ) if correos else set()
+    nuevos = [
+        (linea, datos) for linea, datos in lote
+        if datos['username'] not in tomados and datos['email'] not in correos_tomados
+    ]
+    resumen.existentes += len(lote) - len(nuevos)
+    return nuevos
+
+
+def _insertar(lote, cuestionario, evaluador):
+    with transaction.atomic():
+        usuarios = User.objects.bulk_create([
+            User(
+                username=datos['username'],
+                email=datos['email'],
+                first_name=datos['first_name'][:150],
+                last_name=datos['last_name'][:150],
+                # Contraseña no utilizable, como make_password(None) pero con una sola
+                # lectura de os.urandom en lugar de un carácter aleatorio a la vez
+                password=UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(30),
+            )
+            for _, datos in lote
+        ])
+        evaluaciones = Evaluacion.objects.bulk_create([
+            Evaluacion(cuestionario=cuestionario, evaluado=usuario, evaluador=evaluador, estado='iniciada')
+            for usuario in usuarios
+        ])
+    return list(zip(usuarios, evaluaciones))
+
+
+def _procesar_lote(lote, cuestionario, evaluador, resumen):
+    nuevos = _filtrar_existentes(lote, resumen)
+    if not nuevos:
+        return
+    try:
+        creados = _insertar(nuevos, cuestionario, evaluador)
+    except IntegrityError:
+        # Alguien se registró con uno de estos usuarios mientras se procesaba el lote
+        nuevos = _filtrar_existentes(nuevos, resumen)
+        creados = _insertar(nuevos, cuestionario, evaluador) if nuevos else []
+    resumen.creadas += len(creados)
+    resumen.accesos.extend(
+        (usuario.username, usuario.email, evaluacion.pk, generar_token(evaluacion.pk, usuario.pk))
+        for usuario, evaluacion in creados
+    )
+
+
+def dar_de_alta(archivo, cuestionario, evaluador, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Crea los usuarios y evaluaciones de ``archivo`` (CSV en modo texto) y devuelve el
+    ``Resumen``; ``progreso(resumen)`` se llama después de cada lote.
+    """
+    resumen = Resumen()
+    vistos_usuarios, vistos_correos = set(), set()
+    lote = []
+    for linea, datos in leer_empleados(archivo):
+        resumen.procesadas += 1
+        motivo = _validar(datos)
+        if motivo:
+            resumen.descartar(linea, motivo)
+            continue
+        if datos['username'] in vistos_usuarios or (datos['email'] and datos['email'] in vistos_correos):
+            resumen.repetidas += 1
+            continue
+        vistos_usuarios.add(datos['username'])
+        if datos['email']:
+            vistos_correos.add(datos['email'])
+
+        lote.append((linea, datos))
+        if len(lote) >= tamano_lote:
+            _procesar_lote(lote, cuestionario, evaluador, resumen)
+            lote = []
+            if progreso:
+                progreso(resumen)
+    if lote:
+        _procesar_lote(lote, cuestionario, evaluador, resumen)
+    if progreso:
+        progreso(resumen)
+    return resumen
+
+
+def escribir_accesos(resumen, destino, url_base=''):
+    """CSV con el token y el enlace de acceso de cada empleado creado"""
+    url_base = url_base.rstrip('/')
+    escritor = csv.writer(destino)
+    escritor.writerow(['usuario', 'email', 'evaluacion', 'token', 'enlace'])
+    escritor.writerows(
+        (*acceso, url_base + reverse('evaluaciones:acceso', args=[acceso[3]]))
+        for acceso in resumen.accesos
+    )
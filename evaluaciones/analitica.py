@@ -0,0 +1,208 @@
+"""
+Análisis psicométrico de los cuestionarios NOM-035.
+
+Las respuestas de las evaluaciones completadas de un cuestionario se cargan en una
+matriz densa evaluaciones × preguntas de enteros compactos (int8 para los valores
+0-4 de la NOM-035), con máscara donde falta la respuesta. Sobre ella se calculan de
+forma vectorizada, por DominioNOM035:
+
+- el alfa de Cronbach,
+- la correlación ítem-total corregida de cada pregunta (contra la suma de las demás),
+
+y la matriz de correlaciones entre las sumas por dominio. Cada estadístico usa las
+evaluaciones que respondieron todas las preguntas que le corresponden.
+
+El resultado se guarda en la caché con la revisión del cuestionario compilado y la
+fecha de la última evaluación completada; se recalcula solo cuando cambia alguna.
+"""
+from itertools import chain
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+
+from psymetrics.replicas import usar_replica
+
+from .cuestionarios import obtener_cuestionario
+from .models import Evaluacion, RespuestaEvaluacion
+
+
+TAMANO_LOTE = 20000
+
+TIEMPO_CACHE = 60 * 60 * 24
+
+
+class MatrizRespuestas:
+    """Valores de opción por evaluación (filas) y pregunta (columnas, en el orden del cuestionario)"""
+
+    def __init__(self, evaluaciones, preguntas, valores):
+        self.evaluaciones = evaluaciones
+        self.preguntas = preguntas
+        # np.ma.MaskedArray de enteros; la máscara marca las respuestas faltantes
+        self.valores = valores
+
+    def __len__(self):
+        return len(self.evaluaciones)
+
+
+def _tipo_entero(minimo, maximo):
+    for tipo in (np.int8, np.int16, np.int32):
+        if np.iinfo(tipo).min <= minimo and maximo <= np.iinfo(tipo).max:
+            return tipo
+    return np.int64
+
+
+def cargar_matriz(cuestionario_id, compilado=None):
+    """Matriz de respuestas de las evaluaciones completadas del cuestionario"""
+    compilado = compilado or obtener_cuestionario(cuestionario_id)
+    # Las preguntas abiertas no tienen valor numérico
+    preguntas = np.array(
+        [pregunta['id'] for pregunta in compilado.datos['preguntas'] if pregunta['opciones']], dtype=np.int64,
+    )
+
+    # Tabla opción -> (columna, valor) ordenada por id, como en puntuacion.puntuar
+    opcion_ids, opcion_columna, opcion_valor = [], [], []
+    for columna, pregunta_id in enumerate(preguntas.tolist()):
+        for opcion_id, valor in compilado.opciones[pregunta_id].items():
+            opcion_ids.append(opcion_id)
+            opcion_columna.append(columna)
+            opcion_valor.append(valor)
+    opcion_ids = np.array(opcion_ids, dtype=np.int64)
+    orden = np.argsort(opcion_ids)
+    opcion_ids = opcion_ids[orden]
+    opcion_columna = np.array(opcion_columna, dtype=np.int64)[orden]
+    opcion_valor = np.array(opcion_valor, dtype=np.int64)[orden]
+
+    with usar_replica():
+        evaluaciones = np.fromiter(
+            Evaluacion.objects.filter(cuestionario_id=cuestionario_id, estado='completada')
+            .order_by('pk').values_list('pk', flat=True).iterator(chunk_size=TAMANO_LOTE),
+            dtype=np.int64,
+        )
+        filas = (
+            RespuestaEvaluacion.objects
+            .filter(evaluacion__cuestionario_id=cuestionario_id, evaluacion__estado='completada',
+                    opcion_seleccionada__isnull=False)
+            .values_list('evaluacion_id', 'opcion_seleccionada_id')
+            .iterator(chunk_size=TAMANO_LOTE)
+        )
+        respuestas = np.fromiter(chain.from_iterable(filas), dtype=np.int64).reshape(-1, 2)
+
+    tipo = _tipo_entero(min(opcion_valor.min(initial=0), -1), opcion_valor.max(initial=0))
+    datos = np.full((len(evaluaciones), len(preguntas)), -1, dtype=tipo)
+    if len(respuestas) and len(opcion_ids) and len(evaluaciones):
+        posicion = np.minimum(np.searchsorted(opcion_ids, respuestas[:, 1]), len(opcion_ids) - 1)
+        validas = opcion_ids[posicion] == respuestas[:, 1]
+        # Las dos consultas no comparten instantánea: se descartan las respuestas de
+        # evaluaciones completadas después de leer la lista de evaluaciones
+        filas = np.minimum(np.searchsorted(evaluaciones, respuestas[:, 0]), len(evaluaciones) - 1)
+        validas &= evaluaciones[filas] == respuestas[:, 0]
+        datos[filas[validas], opcion_columna[posicion[validas]]] = opcion_valor[posicion[validas]]
+    return MatrizRespuestas(evaluaciones, preguntas, np.ma.MaskedArray(datos, mask=datos < 0))
+
+
+def covarianzas(columnas):
+    """Matriz de covarianzas (muestral) entre columnas, con un producto matricial"""
+    filas, k = columnas.shape
+    if filas < 2:
+        return np.full((k, k), np.nan)
+    suma = columnas.sum(axis=0)
+    return (columnas.T @ columnas - np.outer(suma, suma) / filas) / (filas - 1)
+
+
+def alfa_cronbach(cov):
+    """Alfa de Cronbach a partir de las covarianzas de los ítems; nan con menos de 2 ítems"""
+    k = len(cov)
+    total = cov.sum()
+    if k < 2 or not total > 0:
+        return np.nan
+    return k / (k - 1) * (1 - np.trace(cov) / total)
+
+
+def correlaciones_item_total(cov):
+    """Correlación de cada ítem con la suma de los demás ítems (corregida)"""
+    varianzas = np.diag(cov)
+    con_resto = cov.sum(axis=1) - varianzas
+    varianza_resto = cov.sum() - 2 * cov.sum(axis=1) + varianzas
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return con_resto / np.sqrt(varianzas * varianza_resto)
+
+
+def matriz_correlaciones(cov):
+    """Correlaciones de Pearson a partir de las covarianzas; nan donde una columna no varía"""
+    desviaciones = np.sqrt(np.diag(cov))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return cov / np.outer(desviaciones, desviaciones)
+
+
+def _numero(valor):
+    valor = float(valor)
+    return None if np.isnan(valor) else round(valor, 4)
+
+
+def analizar(matriz, compilado):
+    """Estadísticos por dominio y correlaciones entre dominios de una MatrizRespuestas"""
+    columna_de = {pregunta_id: columna for columna, pregunta_id in enumerate(matriz.preguntas.tolist())}
+    datos, faltantes = np.ma.getdata(matriz.valores), np.ma.getmaskarray(matriz.valores)
+
+    dominios, sumas, completas_dominio = [], [], []
+    for dominio in compilado.datos['dominios']:
+        ids = [pregunta_id for pregunta_id in dominio['preguntas'] if pregunta_id in columna_de]
+        columnas = [columna_de[pregunta_id] for pregunta_id in ids]
+        completas = ~faltantes[:, columnas].any(axis=1)
+        cov = covarianzas(datos[np.ix_(completas, columnas)].astype(np.float64))
+        dominios.append({
+            'id': dominio['id'],
+            'nombre': dominio['nombre'],
+            'items': len(columnas),
+            'evaluaciones': int(completas.sum()),
+            'alfa': _numero(alfa_cronbach(cov)),
+            'preguntas': [
+                {
+                    'id': pregunta_id,
+                    'texto': compilado.preguntas[pregunta_id]['texto'],
+                    'correlacion_total': _numero(correlacion),
+                }
+                for pregunta_id, correlacion in zip(ids, correlaciones_item_total(cov).tolist())
+            ],
+        })
+        sumas.append(datos[:, columnas].sum(axis=1, dtype=np.int32))
+        completas_dominio.append(completas)
+
+    correlaciones, completas = [], 0
+    if dominios:
+        todas = np.logical_and.reduce(completas_dominio)
+        completas = int(todas.sum())
+        if completas > 1:
+            correlaciones = [
+                [_numero(valor) for valor in fila]
+                for fila in matriz_correlaciones(covarianzas(np.column_stack(sumas)[todas].astype(np.float64))).tolist()
+            ]
+    return {
+        'evaluaciones': len(matriz),
+        'dominios': dominios,
+        'correlaciones': {
+            'dominios': [dominio['nombre'] for dominio in dominios],
+            'evaluaciones': completas,
+            'matriz': correlaciones,
+        },
+    }
+
+
+def analisis_cuestionario(cuestionario_id):
+    """Análisis del cuestionario desde la caché, o recalculado si hubo evaluaciones nuevas"""
+    compilado = obtener_cuestionario(cuestionario_id)
+    with usar_replica():
+        ultima = Evaluacion.objects.filter(
+            cuestionario_id=cuestionario_id, estado='completada',
+        ).aggregate(ultima=Max('fecha_completado'))['ultima']
+    clave = f'analitica:{cuestionario_id}:{compilado.revision}:{ultima.timestamp() if ultima else 0}'
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = analizar(cargar_matriz(cuestionario_id, compilado), compilado)
+        resultado['cuestionario'] = compilado.datos['cuestionario']['nombre']
+        resultado['ultima_completada'] = ultima.isoformat() if ultima else None
+        resultado['calculado'] = timezone.now().isoformat()
+        cache.set(clave, resultado, TIEMPO_CACHE)
+    return resultado
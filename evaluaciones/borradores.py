@@ -0,0 +1,210 @@
+"""
+Borradores de las evaluaciones en curso.
+
+El guardado automático de evaluacion.html (``guardar_progreso``) no escribe en
+RespuestaEvaluacion en cada clic: las respuestas validadas se acumulan en la caché
+``default`` (Redis en producción, compartida por los workers y persistente entre
+reinicios) y se escriben juntas con un solo INSERT ... ON CONFLICT cuando el borrador
+acumula BORRADOR_MAX_RESPUESTAS respuestas sin escribir o su respuesta más antigua sin
+escribir tiene BORRADOR_MAX_SEGUNDOS. Lo que queda en borradores inactivos lo escribe
+``manage.py vaciar_borradores`` y, al finalizar, la propia evaluación.
+
+Cada borrador es ``{'respuestas': {pregunta: [opcion, texto, version]}, 'version': n,
+'desde': t}``; ``version`` cuenta las respuestas recibidas. Lo escrito se marca aparte,
+en ``borrador:<id>:escrito``, para que vaciar un borrador no pise las respuestas que
+llegan mientras tanto. Dos solicitudes de la misma evaluación en workers distintos
+agregan al borrador una tras otra: leerlo y volver a guardarlo, o escribirlo y marcarlo,
+ocurre bajo un candado (``cache.add``, atómico en Redis) para que ninguna pierda las
+respuestas de la otra ni una escritura lenta pise a una más reciente.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+from .cuestionarios import obtener_cuestionario
+from .models import Evaluacion, RespuestaEvaluacion
+from .respuestas import ESTADOS_EDITABLES, escribir_respuestas, preparar_respuestas
+
+
+# Más que cualquier periodo de aplicación; vaciar_borradores escribe mucho antes
+TIEMPO_CACHE = 60 * 60 * 24 * 14
+
+TAMANO_LOTE = 500
+
+# Vigencia del candado de un borrador: alcanza para escribirlo (unas decenas de filas)
+# y, si el worker que lo tiene muere, se libera solo
+SEGUNDOS_CANDADO = 10
+
+ESPERA_CANDADO = 0.01
+
+
+def _clave(evaluacion_id):
+    return f'borrador:{evaluacion_id}'
+
+
+def _clave_escrito(evaluacion_id):
+    return f'borrador:{evaluacion_id}:escrito'
+
+
+def _clave_candado(evaluacion_id):
+    return f'borrador:{evaluacion_id}:candado'
+
+
+@contextmanager
+def _candado(evaluacion_id):
+    """Exclusión mutua entre workers para leer, modificar y guardar un borrador"""
+    clave, propio = _clave_candado(evaluacion_id), uuid.uuid4().hex
+    while not cache.add(clave, propio, SEGUNDOS_CANDADO):
+        time.sleep(ESPERA_CANDADO)
+    try:
+        yield
+    finally:
+        # Si el candado ya venció y lo tomó otro worker, no se le quita
+        if cache.get(clave) == propio:
+            cache.delete(clave)
+
+
+def _limites():
+    return (
+        getattr(settings, 'BORRADOR_MAX_RESPUESTAS', 20),
+        getattr(settings, 'BORRADOR_MAX_SEGUNDOS', 60),
+    )
+
+
+def leer_borrador(evaluacion_id):
+    """Borrador de la evaluación; si no está en la caché se arma con lo guardado en la BD"""
+    borrador = cache.get(_clave(evaluacion_id))
+    if borrador is None:
+        respuestas = {
+            str(pregunta): [opcion, texto, 0]
+            for pregunta, opcion, texto in RespuestaEvaluacion.objects.filter(evaluacion_id=evaluacion_id)
+            .values_list('pregunta_id', 'opcion_seleccionada_id', 'respuesta_texto')
+        }
+        borrador = {'respuestas': respuestas, 'version': 0, 'desde': None}
+        cache.set_many({_clave(evaluacion_id): borrador, _clave_escrito(evaluacion_id): 0}, TIEMPO_CACHE)
+    return borrador
+
+
+def respuestas_borrador(evaluacion):
+    """{pregunta_id: valor} como lo espera evaluacion.html (el texto en las preguntas abiertas)"""
+    compilado = obtener_cuestionario(evaluacion.cuestionario_id)
+    respuestas = {}
+    for pregunta, (opcion, texto, _) in leer_borrador(evaluacion.pk)['respuestas'].items():
+        opciones = compilado.opciones.get(int(pregunta), {})
+        respuestas[pregunta] = opciones[opcion] if opcion in opciones else texto
+    return respuestas
+
+
+def preguntas_pendientes(evaluacion):
+    """Ids de las preguntas obligatorias sin respuesta en el borrador, en el orden del cuestionario"""
+    respondidas = leer_borrador(evaluacion.pk)['respuestas']
+    return [
+        pregunta['id'] for pregunta in obtener_cuestionario(evaluacion.cuestionario_id).datos['preguntas']
+        if pregunta['obligatoria'] and str(pregunta['id']) not in respondidas
+    ]
+
+
+def guardar_borrador(evaluacion, respuestas, escribir=False):
+    """
+    Valida un lote de respuestas (ver ``preparar_respuestas``) y lo agrega al borrador;
+    lo escribe en la BD si se alcanzó algún límite o con ``escribir``. Devuelve el número
+    de respuestas recibidas.
+    """
+    if evaluacion.estado not in ESTADOS_EDITABLES:
+        raise ValidationError('La evaluación ya no admite respuestas')
+    instancias = preparar_respuestas(evaluacion, obtener_cuestionario(evaluacion.cuestionario_id), respuestas)
+
+    if instancias:
+        with _candado(evaluacion.pk):
+            borrador = leer_borrador(evaluacion.pk)
+            escrito = cache.get(_clave_escrito(evaluacion.pk), 0)
+            if borrador['version'] <= escrito:
+                borrador['desde'] = time.time()
+            for instancia in instancias:
+                borrador['version'] += 1
+                borrador['respuestas'][str(instancia.pregunta_id)] = [
+                    instancia.opcion_seleccionada_id, instancia.respuesta_texto, borrador['version'],
+                ]
+            cache.set(_clave(evaluacion.pk), borrador, TIEMPO_CACHE)
+
+        max_respuestas, max_segundos = _limites()
+        escribir = (
+            escribir
+            or borrador['version'] - escrito >= max_respuestas
+            or time.time() - borrador['desde'] >= max_segundos
+        )
+    if escribir:
+        vaciar_borrador(evaluacion)
+    return len(instancias)
+
+
+def vaciar_borrador(evaluacion):
+    """Escribe en una sola operación las respuestas del borrador aún no escritas; devuelve cuántas"""
+    compilado = obtener_cuestionario(evaluacion.cuestionario_id)
+    with _candado(evaluacion.pk):
+        borrador = cache.get(_clave(evaluacion.pk))
+        escrito = cache.get(_clave_escrito(evaluacion.pk), 0)
+        if borrador is None or borrador['version'] <= escrito:
+            return 0
+
+        instancias = [
+            RespuestaEvaluacion(
+                evaluacion_id=evaluacion.pk,
+                pregunta_id=int(pregunta),
+                opcion_seleccionada_id=opcion,
+                respuesta_texto=texto,
+                puntuacion=compilado.opciones.get(int(pregunta), {}).get(opcion),
+            )
+            for pregunta, (opcion, texto, version) in borrador['respuestas'].items()
+            if version > escrito
+        ]
+        escribir_respuestas(instancias)
+        cache.set(_clave_escrito(evaluacion.pk), borrador['version'], TIEMPO_CACHE)
+    if evaluacion.estado == 'iniciada':
+        Evaluacion.objects.filter(pk=evaluacion.pk, estado='iniciada').update(estado='en_progreso')
+        evaluacion.estado = 'en_progreso'
+    return len(instancias)
+
+
+def descartar_borrador(evaluacion_id):
+    with _candado(evaluacion_id):
+        cache.delete_many([_clave(evaluacion_id), _clave_escrito(evaluacion_id)])
+
+
+def vaciar_pendientes(todos=False):
+    """
+    Escribe los borradores de las evaluaciones abiertas con respuestas sin escribir desde
+    hace BORRADOR_MAX_SEGUNDOS (o todos con ``todos``). Devuelve (borradores, respuestas).
+    """
+    _, max_segundos = _limites()
+    limite = time.time() - max_segundos
+    borradores = respuestas = 0
+    abiertas = Evaluacion.objects.filter(estado__in=ESTADOS_EDITABLES).only('pk', 'cuestionario_id', 'estado')
+    lote = []
+    for evaluacion in abiertas.iterator(chunk_size=TAMANO_LOTE):
+        lote.append(evaluacion)
+        if len(lote) < TAMANO_LOTE:
+            continue
+        b, r = _vaciar_lote(lote, limite, todos)
+        borradores, respuestas, lote = borradores + b, respuestas + r, []
+    if lote:
+        b, r = _vaciar_lote(lote, limite, todos)
+        borradores, respuestas = borradores + b, respuestas + r
+    return borradores, respuestas
+
+
+def _vaciar_lote(evaluaciones, limite, todos):
+    claves = cache.get_many([_clave(e.pk) for e in evaluaciones] + [_clave_escrito(e.pk) for e in evaluaciones])
+    borradores = respuestas = 0
+    for evaluacion in evaluaciones:
+        borrador = claves.get(_clave(evaluacion.pk))
+        if borrador is None or borrador['version'] <= claves.get(_clave_escrito(evaluacion.pk), 0):
+            continue
+        if todos or borrador['desde'] is None or borrador['desde'] <= limite:
+            respuestas += vaciar_borrador(evaluacion)
+            borradores += 1
+    return borradores, respuestas
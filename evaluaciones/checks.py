@@ -0,0 +1,75 @@
+"""
+Verificaciones de despliegue (``manage.py check --deploy``).
+
+Los estáticos se sirven con caché inmutable, así que una plantilla que enlaza una ruta
+fija ``/static/...`` en lugar de ``{% static %}`` quedaría apuntando a un archivo sin
+hash que el navegador no vuelve a pedir. Se revisa también que cada nombre usado con
+``{% static %}`` (y la hoja de Tailwind) exista en el manifiesto de collectstatic.
+"""
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.checks import Error, Tags, Warning, register
+
+
+_RUTA_FIJA = re.compile(r'''(?:src|href)\s*=\s*["']/static/|url\(\s*["']?/static/''')
+
+_ETIQUETA_STATIC = re.compile(r'''{%\s*static\s+["']([^"']+)["']''')
+
+
+def _plantillas():
+    """Plantillas del proyecto (templates/ y los de las apps propias)"""
+    raiz = Path(settings.BASE_DIR)
+    directorios = [Path(directorio) for opciones in settings.TEMPLATES for directorio in opciones.get('DIRS', [])]
+    directorios += [ruta for ruta in raiz.glob('*/templates') if ruta.is_dir()]
+    for directorio in directorios:
+        yield from directorio.rglob('*.html')
+
+
+def _hoja_tailwind():
+    try:
+        from tailwind import get_config
+    except ImportError:
+        return None
+    return get_config('TAILWIND_CSS_PATH')
+
+
+@register(Tags.staticfiles, deploy=True)
+def revisar_estaticos(app_configs, **kwargs):
+    errores = []
+    nombres = {}
+    for plantilla in _plantillas():
+        texto = plantilla.read_text(encoding='utf-8', errors='ignore')
+        if _RUTA_FIJA.search(texto):
+            errores.append(Error(
+                f'{plantilla.relative_to(settings.BASE_DIR)} enlaza una ruta fija /static/.',
+                hint="Usa {% static 'archivo' %} para que el enlace lleve el hash del contenido.",
+                id='evaluaciones.E001',
+            ))
+        for nombre in _ETIQUETA_STATIC.findall(texto):
+            nombres.setdefault(nombre, plantilla)
+        if '{% tailwind_css' in texto and (hoja := _hoja_tailwind()):
+            nombres.setdefault(hoja, plantilla)
+
+    if not isinstance(staticfiles_storage, ManifestFilesMixin):
+        if getattr(settings, 'SERVIR_ESTATICOS', False):
+            errores.append(Warning(
+                'SERVIR_ESTATICOS está activo pero el storage de estáticos no agrega hash a los nombres.',
+                hint="Usa 'psymetrics.estaticos.AlmacenEstaticos' en STORAGES['staticfiles'].",
+                id='evaluaciones.W002',
+            ))
+        return errores
+
+    # Sin manifiesto todavía (collectstatic no ha corrido): no hay nada que comparar
+    if not staticfiles_storage.hashed_files:
+        return errores
+    for nombre, plantilla in sorted(nombres.items()):
+        if staticfiles_storage.hashed_files.get(staticfiles_storage.clean_name(nombre)) is None:
+            errores.append(Error(
+                f"'{nombre}' (usado en {plantilla.relative_to(settings.BASE_DIR)}) no está en el manifiesto de estáticos.",
+                hint='Ejecuta collectstatic después de compilar los estáticos.',
+                id='evaluaciones.E003',
+            ))
+    return errores
@@ -0,0 +1,175 @@
+"""
+Invitaciones y recordatorios por correo.
+
+``encolar_correos`` agrega a la bandeja ``CorreoSaliente`` un correo por cada evaluación
+pendiente (iniciada o en progreso); un proceso aparte (``manage.py enviar_correos``) los
+envía por bloques. Cada bloque carga sus plantillas (``templates/correos/*.txt``) una vez y
+manda todos sus mensajes por una sola conexión SMTP, a lo más ``por_segundo`` mensajes por
+segundo. Un envío fallido se reintenta con espera exponencial hasta MAX_INTENTOS veces.
+
+Los correos llevan el enlace de acceso firmado de ``evaluaciones.acceso``, así que los
+empleados dados de alta en bloque entran sin contraseña.
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections
+from django.db.models import F
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+
+from .acceso import generar_token
+from .models import CorreoSaliente, Evaluacion
+
+
+logger = logging.getLogger(__name__)
+
+ASUNTOS = {
+    'invitacion': 'Te invitamos a responder el cuestionario {cuestionario}',
+    'recordatorio': 'Recordatorio: tienes pendiente el cuestionario {cuestionario}',
+}
+
+ESTADOS_PENDIENTES = ['iniciada', 'en_progreso']
+
+TAMANO_BLOQUE = 100
+
+MAX_INTENTOS = 5
+
+# Correos en 'enviando' más antiguos que esto son de un trabajador que murió
+MINUTOS_ABANDONO = 10
+
+
+def encolar_correos(tipo, evaluaciones=None):
+    """
+    Agrega un correo de ``tipo`` por cada evaluación pendiente de ``evaluaciones`` (todas
+    por omisión) cuyo evaluado tenga correo; omite las que ya lo tienen en la bandeja
+    (las invitaciones se envían una sola vez). Devuelve cuántos se agregaron.
+    """
+    if evaluaciones is None:
+        evaluaciones = Evaluacion.objects.all()
+    en_bandeja = CorreoSaliente.objects.filter(tipo=tipo, estado__in=['pendiente', 'enviando'])
+    if tipo == 'invitacion':
+        en_bandeja = CorreoSaliente.objects.filter(tipo=tipo).exclude(estado='cancelado')
+    pendientes = (
+        evaluaciones.filter(estado__in=ESTADOS_PENDIENTES)
+        .exclude(evaluado__email='')
+        .exclude(pk__in=en_bandeja.values('evaluacion_id'))
+        .values_list('pk', 'evaluado__email')
+    )
+    creados = CorreoSaliente.objects.bulk_create(
+        (CorreoSaliente(evaluacion_id=evaluacion_id, tipo=tipo, destinatario=email)
+         for evaluacion_id, email in pendientes.iterator()),
+        batch_size=500,
+    )
+    return len(creados)
+
+
+def reclamar_bloque(tamano=TAMANO_BLOQUE):
+    """
+    Toma hasta ``tamano`` correos vencidos con un UPDATE condicional marcado con el lote
+    del trabajador (seguro entre procesos) y los devuelve con su evaluación.
+    """
+    ahora = timezone.now()
+    candidatos = list(
+        CorreoSaliente.objects.filter(estado='pendiente', proximo_intento__lte=ahora)
+        .order_by('proximo_intento', 'pk')
+        .values_list('pk', flat=True)[:tamano]
+    )
+    if not candidatos:
+        return []
+    lote = uuid.uuid4().hex
+    CorreoSaliente.objects.filter(pk__in=candidatos, estado='pendiente').update(
+        estado='enviando', lote=lote, intentos=F('intentos') + 1,
+        # Mientras se envía, proximo_intento marca cuándo se da por abandonado
+        proximo_intento=ahora + timedelta(minutes=MINUTOS_ABANDONO),
+    )
+    return list(
+        CorreoSaliente.objects.filter(lote=lote, estado='enviando')
+        .select_related('evaluacion__evaluado', 'evaluacion__cuestionario')
+    )
+
+
+def _mensaje(correo, plantillas):
+    evaluacion = correo.evaluacion
+    token = generar_token(evaluacion.pk, evaluacion.evaluado_id)
+    contexto = {
+        'nombre': evaluacion.evaluado.first_name or evaluacion.evaluado.username,
+        'cuestionario': evaluacion.cuestionario.nombre,
+        'enlace': settings.SITIO_URL.rstrip('/') + reverse('evaluaciones:acceso', args=[token]),
+    }
+    return EmailMessage(
+        subject=ASUNTOS[correo.tipo].format(**contexto),
+        body=plantillas[correo.tipo].render(contexto),
+        to=[correo.destinatario],
+    )
+
+
+def _reprogramar(correo, error):
+    if correo.intentos >= MAX_INTENTOS:
+        cambios = {'estado': 'error'}
+    else:
+        cambios = {'estado': 'pendiente', 'proximo_intento': timezone.now() + timedelta(minutes=2 ** correo.intentos)}
+    CorreoSaliente.objects.filter(pk=correo.pk).update(error=str(error)[:1000], **cambios)
+
+
+def enviar_bloque(correos, por_segundo=0):
+    """Envía ``correos`` por una sola conexión y devuelve cuántos salieron"""
+    cerradas = [correo.pk for correo in correos if correo.evaluacion.estado not in ESTADOS_PENDIENTES]
+    CorreoSaliente.objects.filter(pk__in=cerradas).update(estado='cancelado')
+    correos = [correo for correo in correos if correo.pk not in cerradas]
+    if not correos:
+        return 0
+
+    plantillas = {tipo: get_template(f'correos/{tipo}.txt') for tipo in {correo.tipo for correo in correos}}
+    enviados = []
+    try:
+        with get_connection() as conexion:
+            inicio = time.monotonic()
+            for correo in correos:
+                if por_segundo:
+                    time.sleep(max(0, inicio + len(enviados) / por_segundo - time.monotonic()))
+                try:
+                    conexion.send_messages([_mensaje(correo, plantillas)])
+                except Exception as error:
+                    logger.warning('No se pudo enviar el correo %s: %s', correo.pk, error)
+                    _reprogramar(correo, error)
+                else:
+                    enviados.append(correo.pk)
+    except Exception as error:
+        # Falló la conexión: lo que no salió se reintenta
+        logger.exception('Error de conexión al enviar correos')
+        for correo in correos:
+            if correo.pk not in enviados:
+                _reprogramar(correo, error)
+
+    CorreoSaliente.objects.filter(pk__in=enviados).update(estado='enviado', error='', fecha_envio=timezone.now())
+    return len(enviados)
+
+
+def recuperar_abandonados():
+    """Devuelve a la cola los correos de un trabajador que murió a medio bloque"""
+    return CorreoSaliente.objects.filter(estado='enviando', proximo_intento__lt=timezone.now()).update(
+        estado='pendiente',
+    )
+
+
+def atender_bandeja(una_vez=False, espera=5.0, tamano=TAMANO_BLOQUE, por_segundo=0):
+    """Bucle del trabajador: envía bloques hasta vaciar la bandeja (una_vez) o indefinidamente"""
+    enviados = 0
+    while True:
+        recuperados = recuperar_abandonados()
+        if recuperados:
+            logger.warning('%s correos abandonados devueltos a la bandeja', recuperados)
+        correos = reclamar_bloque(tamano)
+        if correos:
+            enviados += enviar_bloque(correos, por_segundo)
+            continue
+        if una_vez:
+            return enviados
+        connections.close_all()
+        time.sleep(espera)
@@ -0,0 +1,168 @@
+"""
+Cuestionarios compilados NOM-035.
+
+Cada CuestionarioNOM035 se compila en una sola pasada (cuestionario → dominios →
+preguntas → opciones) a un snapshot inmutable que se guarda serializado en la caché
+de Django y, además, en una LRU por proceso. El snapshot se identifica por
+``id`` + ``version`` del cuestionario y por un número de revisión que las señales
+incrementan cada vez que cambia cualquiera de los cuatro modelos.
+"""
+import json
+import time
+from functools import lru_cache
+from types import MappingProxyType
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from .models import CuestionarioNOM035, DominioNOM035, PreguntaNOM035, OpcionRespuesta
+
+
+# Tamaño de la LRU por proceso (cuestionarios distintos en memoria)
+TAMANO_LRU = 32
+
+# Los snapshots son inmutables: la clave cambia con cada revisión
+TIEMPO_CACHE = 60 * 60 * 24
+
+
+def _clave_revision(cuestionario_id):
+    return f'nom035:cuestionario:{cuestionario_id}:revision'
+
+
+def _clave_snapshot(cuestionario_id, revision):
+    return f'nom035:cuestionario:{cuestionario_id}:r{revision}'
+
+
+def obtener_revision(cuestionario_id):
+    """Devuelve la revisión vigente del cuestionario según la caché compartida"""
+    clave = _clave_revision(cuestionario_id)
+    revision = cache.get(clave)
+    if revision is None:
+        # Se parte de una marca de tiempo para no reutilizar revisiones viejas
+        # si la caché perdió el contador
+        cache.add(clave, time.time_ns(), timeout=None)
+        revision = cache.get(clave)
+    return revision
+
+
+def invalidar_cuestionario(cuestionario_id):
+    """Incrementa la revisión del cuestionario; los snapshots previos quedan obsoletos"""
+    clave = _clave_revision(cuestionario_id)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), timeout=None)
+
+
+class CuestionarioCompilado:
+    """Snapshot de solo lectura de un cuestionario y su árbol de preguntas"""
+
+    __slots__ = ('id', 'version', 'revision', 'datos', 'json', 'opciones', 'preguntas')
+
+    def __init__(self, contenido):
+        datos = json.loads(contenido)
+        cuestionario = datos['cuestionario']
+        object.__setattr__(self, 'id', cuestionario['id'])
+        object.__setattr__(self, 'version', cuestionario['version'])
+        object.__setattr__(self, 'revision', cuestionario['revision'])
+        object.__setattr__(self, 'json', contenido)
+        object.__setattr__(self, 'datos', datos)
+        # Índices para validar respuestas sin tocar la base de datos:
+        # pregunta_id -> datos de la pregunta; pregunta_id -> {opcion_id: valor}
+        object.__setattr__(self, 'preguntas', MappingProxyType(
+            {pregunta['id']: pregunta for pregunta in datos['preguntas']}
+        ))
+        object.__setattr__(self, 'opciones', MappingProxyType({
+            pregunta['id']: MappingProxyType(
+                {opcion['id']: opcion['valor'] for opcion in pregunta['opciones']}
+            )
+            for pregunta in datos['preguntas']
+        }))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError('El cuestionario compilado es inmutable')
+
+    @property
+    def etiqueta(self):
+        """Identificador estable del snapshot (útil como ETag)"""
+        return f'{self.id}-{self.version}-{self.revision}'
+
+    def __repr__(self):
+        return f'<CuestionarioCompilado {self.etiqueta}>'
+
+
+def compilar_cuestionario(cuestionario_id, revision):
+    """Construye el snapshot serializado con una consulta por nivel del árbol"""
+    opciones = Prefetch(
+        'opcionrespuesta_set',
+        queryset=OpcionRespuesta.objects.order_by('orden', 'id'),
+    )
+    preguntas = Prefetch(
+        'preguntanom035_set',
+        queryset=PreguntaNOM035.objects.order_by('orden', 'id').prefetch_related(opciones),
+    )
+    dominios = Prefetch(
+        'dominionom035_set',
+        queryset=DominioNOM035.objects.order_by('orden', 'id').prefetch_related(preguntas),
+    )
+    cuestionario = CuestionarioNOM035.objects.prefetch_related(dominios).get(pk=cuestionario_id)
+
+    lista_dominios = []
+    lista_preguntas = []
+    for dominio in cuestionario.dominionom035_set.all():
+        ids_preguntas = []
+        for pregunta in dominio.preguntanom035_set.all():
+            ids_preguntas.append(pregunta.id)
+            lista_preguntas.append({
+                'id': pregunta.id,
+                'dominio': dominio.id,
+                'texto': pregunta.texto,
+                'tipo': pregunta.tipo,
+                'orden': pregunta.orden,
+                'obligatoria': pregunta.obligatoria,
+                'opciones': [
+                    {'id': opcion.id, 'texto': opcion.texto, 'valor': opcion.valor, 'orden': opcion.orden}
+                    for opcion in pregunta.opcionrespuesta_set.all()
+                ],
+            })
+        lista_dominios.append({
+            'id': dominio.id,
+            'nombre': dominio.nombre,
+            'descripcion': dominio.descripcion,
+            'orden': dominio.orden,
+            'preguntas': ids_preguntas,
+        })
+
+    datos = {
+        'success': True,
+        'cuestionario': {
+            'id': cuestionario.id,
+            'nombre': cuestionario.nombre,
+            'version': cuestionario.version,
+            'revision': revision,
+        },
+        'dominios': lista_dominios,
+        'preguntas': lista_preguntas,
+    }
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+@lru_cache(maxsize=TAMANO_LRU)
+def _cargar(cuestionario_id, revision):
+    clave = _clave_snapshot(cuestionario_id, revision)
+    contenido = cache.get(clave)
+    if contenido is None:
+        contenido = compilar_cuestionario(cuestionario_id, revision)
+        cache.set(clave, contenido, TIEMPO_CACHE)
+    return CuestionarioCompilado(contenido)
+
+
+def obtener_cuestionario(cuestionario_id):
+    """
+    Devuelve el CuestionarioCompilado vigente.
+
+    En el camino caliente solo se consulta la revisión en la caché compartida;
+    la base de datos se toca únicamente cuando hay que recompilar.
+    Lanza CuestionarioNOM035.DoesNotExist si el cuestionario no existe.
+    """
+    return _cargar(cuestionario_id, obtener_revision(cuestionario_id))
@@ -0,0 +1,34 @@
+"""
+Cifras públicas de la página de inicio.
+
+Se calculan a partir de los agregados y se guardan en la caché una hora; la página de
+inicio no consulta la base de datos en cada visita.
+"""
+from django.core.cache import cache
+from django.db.models import Sum
+
+from psymetrics.replicas import usar_replica
+
+from .models import AgregadoDominio, Evaluacion, EvaluacionPersonalizada
+
+
+CLAVE_CACHE = 'estadisticas_publicas'
+
+TIEMPO_CACHE = 60 * 60
+
+
+@usar_replica()
+def calcular_estadisticas():
+    completadas = (
+        AgregadoDominio.objects.filter(dominio__isnull=True).aggregate(total=Sum('conteo'))['total'] or 0
+    )
+    iniciadas = Evaluacion.objects.count()
+    return {
+        'evaluaciones_realizadas': completadas,
+        'clientes_corporativos': EvaluacionPersonalizada.objects.values('cliente').distinct().count(),
+        'tasa_exito': round(100 * completadas / iniciadas) if iniciadas else 0,
+    }
+
+
+def estadisticas_publicas():
+    return cache.get_or_set(CLAVE_CACHE, calcular_estadisticas, TIEMPO_CACHE)
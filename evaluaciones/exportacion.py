@@ -0,0 +1,191 @@
+"""
+Exportación en streaming de la matriz de respuestas.
+
+Las evaluaciones y sus respuestas se recorren con ``.iterator()`` ordenadas por
+evaluación y se pivotan al vuelo a una fila por Evaluacion y una columna por
+PreguntaNOM035, de modo que la memoria usada no depende del número de evaluados.
+El mismo generador alimenta la vista de descarga, la acción del admin y
+``manage.py export_resultados``.
+"""
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+from psymetrics.replicas import iterar_en_replica
+
+from .cuestionarios import obtener_cuestionario
+from .models import RespuestaEvaluacion
+
+
+TAMANO_LOTE = 2000
+
+COLUMNAS_EVALUACION = ['evaluacion', 'usuario', 'estado', 'fecha_completado', 'puntuacion_total']
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def filas_resultados(evaluaciones, cuestionario_id, tamano_lote=TAMANO_LOTE):
+    """
+    Genera la cabecera y después una fila por evaluación con el valor de cada pregunta.
+
+    ``evaluaciones`` es un queryset de Evaluacion de un mismo cuestionario. Las
+    preguntas abiertas se exportan con su texto; las demás con el valor de la opción.
+    Las evaluaciones sin respuestas salen con las columnas de preguntas vacías.
+    """
+    compilado = obtener_cuestionario(cuestionario_id)
+    preguntas = compilado.datos['preguntas']
+    columna = {pregunta['id']: len(COLUMNAS_EVALUACION) + indice for indice, pregunta in enumerate(preguntas)}
+    yield COLUMNAS_EVALUACION + [f'P{indice}' for indice in range(1, len(preguntas) + 1)]
+
+    # Dos recorridos ordenados por evaluación que se combinan como en un merge join
+    filas = (
+        evaluaciones.order_by('pk')
+        .values_list('pk', 'evaluado__username', 'estado', 'fecha_completado', 'puntuacion_total')
+        .iterator(chunk_size=tamano_lote)
+    )
+    respuestas = (
+        RespuestaEvaluacion.objects
+        .filter(evaluacion__in=evaluaciones.order_by().values('pk'))
+        .order_by('evaluacion_id')
+        .values_list('evaluacion_id', 'pregunta_id', 'opcion_seleccionada_id', 'respuesta_texto')
+        .iterator(chunk_size=tamano_lote)
+    )
+
+    respuesta = next(respuestas, None)
+    for evaluacion_id, usuario, estado, completado, total in filas:
+        fila = [evaluacion_id, usuario, estado, completado.isoformat() if completado else None, total]
+        fila.extend([None] * len(preguntas))
+        while respuesta is not None and respuesta[0] <= evaluacion_id:
+            _, pregunta_id, opcion_id, texto = respuesta
+            if respuesta[0] == evaluacion_id and pregunta_id in columna:
+                if opcion_id is not None:
+                    fila[columna[pregunta_id]] = compilado.opciones[pregunta_id].get(opcion_id)
+                else:
+                    fila[columna[pregunta_id]] = texto
+            respuesta = next(respuestas, None)
+        yield fila
+
+
+class _Eco:
+    """Pseudo-archivo que devuelve lo escrito, para usar csv.writer en un generador"""
+
+    def write(self, valor):
+        return valor
+
+
+def generar_csv(filas):
+    escritor = csv.writer(_Eco())
+    yield '\ufeff'  # BOM para que Excel detecte UTF-8
+    for fila in filas:
+        yield escritor.writerow(['' if valor is None else valor for valor in fila])
+
+
+class _BufferZip:
+    """Destino no posicionable para zipfile que acumula bytes hasta que se vacían"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+_XLSX_ESTATICOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Resultados" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _celda_xlsx(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(str(valor))}</t></is></c>'
+
+
+def generar_xlsx(filas, filas_por_bloque=500):
+    """Escribe un XLSX mínimo (cadenas en línea) sin mantener el libro en memoria"""
+    destino = _BufferZip()
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in _XLSX_ESTATICOS.items():
+            libro.writestr(nombre, contenido)
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for numero, fila in enumerate(filas, start=1):
+                hoja.write(('<row>' + ''.join(_celda_xlsx(valor) for valor in fila) + '</row>').encode('utf-8'))
+                if numero % filas_por_bloque == 0:
+                    yield destino.vaciar()
+            hoja.write(b'</sheetData></worksheet>')
+    yield destino.vaciar()
+
+
+def generar_exportacion(evaluaciones, cuestionario_id, formato='csv'):
+    """Generador de contenido (str para CSV, bytes para XLSX) en el formato indicado, leído de la réplica"""
+    filas = filas_resultados(evaluaciones, cuestionario_id)
+    if formato == 'xlsx':
+        return iterar_en_replica(generar_xlsx(filas))
+    return iterar_en_replica(generar_csv(filas))
+
+
+def respuesta_exportacion(evaluaciones, cuestionario_id, formato='csv'):
+    """StreamingHttpResponse con la matriz de respuestas como archivo adjunto"""
+    if formato not in FORMATOS:
+        formato = 'csv'
+    response = StreamingHttpResponse(
+        generar_exportacion(evaluaciones, cuestionario_id, formato),
+        content_type=FORMATOS[formato],
+    )
+    response['Content-Disposition'] = f'attachment; filename="resultados_cuestionario_{cuestionario_id}.{formato}"'
+    return response
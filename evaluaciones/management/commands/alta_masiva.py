@@ -0,0 +1,56 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from evaluaciones.alta_masiva import TAMANO_LOTE, dar_de_alta, escribir_accesos
+from evaluaciones.models import CuestionarioNOM035
+
+
+class Command(BaseCommand):
+    help = 'Da de alta empleados desde un CSV: crea sus usuarios (sin contraseña) y evaluaciones por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con columnas usuario, email, nombre, apellidos')
+        parser.add_argument('--cuestionario', type=int, required=True, help='ID del CuestionarioNOM035')
+        parser.add_argument('--evaluador', help='Usuario evaluador (por omisión, el primer superusuario)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE)
+        parser.add_argument('--salida', default='accesos.csv', help='CSV con el token de acceso de cada empleado')
+        parser.add_argument('--url-base', default='', help='Dominio de los enlaces de acceso, p. ej. https://psymetrics.example.com')
+
+    def handle(self, *args, **options):
+        cuestionario = CuestionarioNOM035.objects.filter(pk=options['cuestionario']).first()
+        if cuestionario is None:
+            raise CommandError('El cuestionario no existe')
+        if options['evaluador']:
+            evaluador = User.objects.filter(username=options['evaluador']).first()
+        else:
+            evaluador = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if evaluador is None:
+            raise CommandError('No se encontró el evaluador')
+
+        inicio = time.perf_counter()
+
+        def progreso(resumen):
+            self.stdout.write(
+                f'  {resumen.procesadas} filas, {resumen.creadas} creadas '
+                f'({resumen.procesadas / (time.perf_counter() - inicio):.0f} filas/s)',
+                ending='\r',
+            )
+
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                resumen = dar_de_alta(archivo, cuestionario, evaluador, options['lote'], progreso)
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        self.stdout.write('')
+
+        with open(options['salida'], 'w', encoding='utf-8', newline='') as destino:
+            escribir_accesos(resumen, destino, options['url_base'])
+        for error in resumen.errores:
+            self.stdout.write(self.style.WARNING(error))
+        self.stdout.write(self.style.SUCCESS(
+            f'{resumen.creadas} empleados y evaluaciones creados en {time.perf_counter() - inicio:.1f} s '
+            f'({resumen.existentes} ya existían, {resumen.repetidas} repetidos en el archivo, '
+            f'{resumen.invalidas} inválidos). Accesos en {options["salida"]}'
+        ))
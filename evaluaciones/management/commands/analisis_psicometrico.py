@@ -0,0 +1,93 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from evaluaciones.analitica import MatrizRespuestas, analisis_cuestionario, analizar
+from evaluaciones.cuestionarios import CuestionarioCompilado
+from evaluaciones.models import CuestionarioNOM035
+
+
+def _cuestionario_sintetico(dominios, items_por_dominio):
+    """Compilado de un cuestionario ficticio con opciones 0-4 (la estructura de la Guía III)"""
+    lista_dominios, lista_preguntas = [], []
+    for d in range(dominios):
+        ids = list(range(d * items_por_dominio + 1, (d + 1) * items_por_dominio + 1))
+        lista_dominios.append({'id': d + 1, 'nombre': f'Dominio {d + 1}', 'preguntas': ids})
+        lista_preguntas.extend(
+            {'id': i, 'dominio': d + 1, 'texto': f'Pregunta {i}',
+             'opciones': [{'id': i * 10 + v, 'valor': v} for v in range(5)]}
+            for i in ids
+        )
+    datos = {
+        'cuestionario': {'id': 0, 'nombre': 'Sintético', 'version': '0', 'revision': 0},
+        'dominios': lista_dominios,
+        'preguntas': lista_preguntas,
+    }
+    return CuestionarioCompilado(json.dumps(datos).encode('utf-8'))
+
+
+class Command(BaseCommand):
+    help = 'Alfa de Cronbach, correlaciones ítem-total y entre dominios de las evaluaciones completadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cuestionario', type=int, help='ID del CuestionarioNOM035')
+        parser.add_argument('--json', action='store_true', help='Imprimir el resultado completo en JSON')
+        parser.add_argument('--benchmark', type=int, metavar='EVALUACIONES',
+                            help='Medir el cálculo sobre una matriz sintética de EVALUACIONES × 72 preguntas')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self._benchmark(options['benchmark'])
+        if not options['cuestionario']:
+            raise CommandError('Indica --cuestionario o --benchmark')
+        if not CuestionarioNOM035.objects.filter(pk=options['cuestionario']).exists():
+            raise CommandError('El cuestionario no existe')
+
+        inicio = time.perf_counter()
+        resultado = analisis_cuestionario(options['cuestionario'])
+        transcurrido = time.perf_counter() - inicio
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{resultado['cuestionario']}: {resultado['evaluaciones']} evaluaciones completadas"
+        ))
+        self.stdout.write(f"{'dominio':<52}{'ítems':>7}{'n':>9}{'alfa':>9}{'r ít-total mín':>16}")
+        for dominio in resultado['dominios']:
+            correlaciones = [p['correlacion_total'] for p in dominio['preguntas'] if p['correlacion_total'] is not None]
+            self.stdout.write(
+                f"{dominio['nombre'][:50]:<52}{dominio['items']:>7}{dominio['evaluaciones']:>9}"
+                f"{self._cifra(dominio['alfa']):>9}{self._cifra(min(correlaciones, default=None)):>16}"
+            )
+        self.stdout.write(self.style.SUCCESS(f'Análisis listo en {transcurrido:.2f} s'))
+
+    def _cifra(self, valor):
+        return '-' if valor is None else f'{valor:.3f}'
+
+    def _benchmark(self, evaluaciones):
+        dominios, items = 9, 8
+        compilado = _cuestionario_sintetico(dominios, items)
+        generador = np.random.default_rng(35)
+        # Un factor latente por dominio más ruido, discretizado a 0-4, con 2% de faltantes
+        latente = np.repeat(generador.normal(size=(evaluaciones, dominios)), items, axis=1)
+        valores = np.clip(np.rint(2 + latente + generador.normal(size=latente.shape)), 0, 4).astype(np.int8)
+        matriz = MatrizRespuestas(
+            np.arange(evaluaciones), np.arange(1, dominios * items + 1),
+            np.ma.MaskedArray(valores, mask=generador.random(valores.shape) < 0.02),
+        )
+
+        tiempos = []
+        for _ in range(5):
+            inicio = time.perf_counter()
+            resultado = analizar(matriz, compilado)
+            tiempos.append(time.perf_counter() - inicio)
+        self.stdout.write(
+            f'Matriz {evaluaciones} × {dominios * items} ({valores.nbytes / 2 ** 20:.1f} MiB en int8), '
+            f"alfa del primer dominio {self._cifra(resultado['dominios'][0]['alfa'])}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Cálculo: {min(tiempos) * 1000:.0f} ms (mejor de 5), {np.mean(tiempos) * 1000:.0f} ms en promedio'
+        ))
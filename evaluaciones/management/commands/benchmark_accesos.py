@@ -0,0 +1,70 @@
+import secrets
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from evaluaciones.acceso import generar_token
+from evaluaciones.models import CuestionarioNOM035, Evaluacion
+
+
+class Command(BaseCommand):
+    help = 'Compara los inicios de sesión por segundo con contraseña y con enlace de acceso firmado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20,
+                            help='Inicios de sesión por camino (el de contraseña tarda lo que el hasher configurado)')
+
+    def handle(self, *args, **options):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        self.host = hosts[0] if hosts else 'localhost'
+        contrasena = secrets.token_urlsafe(16)
+        usuario = get_user_model().objects.create_user(f'benchmark-{secrets.token_hex(4)}', password=contrasena)
+        try:
+            cuestionario = CuestionarioNOM035.objects.create(
+                nombre='Benchmark de accesos', version='0', descripcion='', creado_por=usuario,
+            )
+            evaluacion = Evaluacion.objects.create(cuestionario=cuestionario, evaluado=usuario, evaluador=usuario)
+            acceso = reverse('evaluaciones:acceso', args=[generar_token(evaluacion.pk, usuario.pk)])
+            credenciales = {'username': usuario.username, 'password': contrasena}
+
+            caminos = {
+                'contraseña': lambda cliente: cliente.post(reverse('evaluaciones:login'), credenciales),
+                'enlace': lambda cliente: cliente.get(acceso),
+            }
+            resultados = {camino: self._medir(entrar, options['logins']) for camino, entrar in caminos.items()}
+        finally:
+            # delete() y no un rollback: las señales limpian el usuario de la caché
+            usuario.delete()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{options['logins']} inicios de sesión por camino (entrar + abrir la evaluación)"
+        ))
+        self.stdout.write(f"{'camino':<14}{'logins/s':>11}{'media ms':>11}{'máx ms':>11}")
+        for camino, tiempos in resultados.items():
+            self.stdout.write(
+                f'{camino:<14}{1000 / statistics.fmean(tiempos):>11.1f}'
+                f'{statistics.fmean(tiempos):>11.2f}{max(tiempos):>11.2f}'
+            )
+        proporcion = statistics.fmean(resultados['contraseña']) / statistics.fmean(resultados['enlace'])
+        self.stdout.write(self.style.SUCCESS(f'El enlace firmado es {proporcion:.0f}x más rápido'))
+
+    def _medir(self, entrar, logins):
+        """Milisegundos de cada inicio de sesión con un navegador nuevo"""
+        tiempos = []
+        for _ in range(logins):
+            cliente = Client(HTTP_HOST=self.host)
+            inicio = time.perf_counter()
+            respuesta = entrar(cliente)
+            if respuesta.status_code != 302:
+                raise CommandError(f'El inicio de sesión respondió {respuesta.status_code}')
+            respuesta = cliente.get(reverse('evaluaciones:evaluacion'))
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code != 200:
+                raise CommandError(f'La evaluación respondió {respuesta.status_code}')
+            cliente.logout()
+        return tiempos
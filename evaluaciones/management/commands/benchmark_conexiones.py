@@ -0,0 +1,107 @@
+import statistics
+import time
+from copy import deepcopy
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+# Cada modo ajusta la conexión 'default' como lo haría settings_production
+MODOS = {
+    'sin_persistencia': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'persistente': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+    'pool': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'pool': {'min_size': 1, 'max_size': 2}},
+}
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia por solicitud con conexiones nuevas, persistentes y con el pool de psycopg'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solicitudes', type=int, default=500)
+        parser.add_argument('--ruta', default='/consultas/disponibilidad/?dias=1',
+                            help='Ruta a solicitar; debe consultar la base de datos sin iniciar sesión')
+        parser.add_argument('--modos', nargs='+', choices=list(MODOS), default=list(MODOS))
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                f'La base de datos es {connection.vendor}: las cifras solo son representativas con PostgreSQL '
+                '(--settings psymetrics.settings_production y las variables DB_*)'
+            ))
+
+        aplicacion = WSGIHandler()
+        original = deepcopy(connection.settings_dict)
+        resultados = {}
+        try:
+            for modo in options['modos']:
+                if not self._configurar(original, MODOS[modo]):
+                    self.stdout.write(self.style.WARNING(f'{modo}: requiere PostgreSQL y psycopg[pool], se omite'))
+                    continue
+                for _ in range(10):
+                    self._solicitar(aplicacion, options['ruta'])
+                tiempos = [self._solicitar(aplicacion, options['ruta']) for _ in range(options['solicitudes'])]
+                resultados[modo] = tiempos
+        finally:
+            self._configurar(original, {})
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{options['solicitudes']} solicitudes a {options['ruta']} (ms por solicitud)"
+        ))
+        self.stdout.write(f"{'modo':<18}{'media':>9}{'p50':>9}{'p95':>9}")
+        for modo, tiempos in resultados.items():
+            percentiles = statistics.quantiles(tiempos, n=20)
+            self.stdout.write(
+                f'{modo:<18}{statistics.fmean(tiempos):>9.2f}{percentiles[9]:>9.2f}{percentiles[18]:>9.2f}'
+            )
+
+    def _configurar(self, original, ajustes):
+        """Cierra la conexión (y el pool) y aplica los ajustes del modo sobre la configuración original"""
+        connection.close()
+        if connection.vendor == 'postgresql':
+            connection.close_pool()
+
+        opciones = {clave: valor for clave, valor in original['OPTIONS'].items() if clave != 'pool'}
+        if 'pool' in ajustes:
+            try:
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                return False
+            if connection.vendor != 'postgresql':
+                return False
+            opciones['pool'] = ajustes['pool']
+        connection.settings_dict.update(
+            CONN_MAX_AGE=ajustes.get('CONN_MAX_AGE', original['CONN_MAX_AGE']),
+            CONN_HEALTH_CHECKS=ajustes.get('CONN_HEALTH_CHECKS', original['CONN_HEALTH_CHECKS']),
+            OPTIONS=opciones,
+        )
+        return True
+
+    def _solicitar(self, aplicacion, ruta):
+        """Una solicitud completa por el handler WSGI, como la atendería un worker de gunicorn"""
+        camino, _, consulta = ruta.partition('?')
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        entorno = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': camino,
+            'QUERY_STRING': consulta,
+            'SERVER_NAME': hosts[0] if hosts else 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': hosts[0] if hosts else 'localhost',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': self.stderr,
+        }
+        estado = []
+        inicio = time.perf_counter()
+        respuesta = aplicacion(entorno, lambda codigo, encabezados: estado.append(codigo))
+        b''.join(respuesta)
+        # close() dispara request_finished, donde Django cierra o conserva la conexión
+        respuesta.close()
+        transcurrido = (time.perf_counter() - inicio) * 1000
+        if not estado[0].startswith('200'):
+            raise CommandError(f'{ruta} respondió {estado[0]}')
+        return transcurrido
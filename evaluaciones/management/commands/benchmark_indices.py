@@ -0,0 +1,270 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+
+from consultas.models import Consulta, MensajeConsulta, Psicologo, TipoConsulta
+from evaluaciones.models import (
+    CuestionarioNOM035,
+    DominioNOM035,
+    Evaluacion,
+    OpcionRespuesta,
+    PreguntaNOM035,
+    RespuestaEvaluacion,
+)
+
+
+PREFIJO = 'bench_'
+
+NOMBRE_CUESTIONARIO = 'Benchmark índices'
+
+MODELOS_INDEXADOS = [Evaluacion, RespuestaEvaluacion, Consulta, MensajeConsulta]
+
+# Proporciones aproximadas de un cliente en producción
+ESTADOS_EVALUACION = [('completada', 70), ('en_progreso', 15), ('iniciada', 10), ('cancelada', 5)]
+ESTADOS_CONSULTA = [('completada', 55), ('confirmada', 15), ('solicitada', 15), ('cancelada', 10), ('en_progreso', 5)]
+
+
+def _elegir(rng, opciones):
+    return rng.choices([valor for valor, _ in opciones], weights=[peso for _, peso in opciones])[0]
+
+
+class Command(BaseCommand):
+    help = 'Siembra volúmenes realistas y mide las consultas del admin y los dashboards (EXPLAIN y tiempos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evaluaciones', type=int, default=14000,
+                            help='Evaluaciones a sembrar (72 respuestas cada una completada)')
+        parser.add_argument('--psicologos', type=int, default=50)
+        parser.add_argument('--consultas', type=int, default=50000)
+        parser.add_argument('--mensajes', type=int, default=4, help='Mensajes promedio por consulta')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Se reporta el mejor tiempo')
+        parser.add_argument('--comparar', action='store_true',
+                            help='Medir también sin los índices de Meta.indexes (se eliminan y se vuelven a crear)')
+        parser.add_argument('--sin-plan', action='store_true', help='No imprimir los planes EXPLAIN')
+        parser.add_argument('--limpiar', action='store_true', help='Eliminar los datos sembrados y terminar')
+        parser.add_argument('--base-de-prueba', action='store_true',
+                            help='Confirmar que la base de datos es desechable (obligatorio con DEBUG=False)')
+
+    def handle(self, *args, **options):
+        # Siembra miles de filas y con --comparar elimina índices: nunca sobre producción por descuido
+        if not settings.DEBUG and not options['base_de_prueba']:
+            raise CommandError(
+                f"DEBUG=False: confirma con --base-de-prueba que {connection.settings_dict['NAME']} es desechable"
+            )
+        if options['limpiar']:
+            self._limpiar()
+            return
+
+        if User.objects.filter(username=f'{PREFIJO}admin').exists():
+            self.stdout.write('Usando los datos ya sembrados (--limpiar para eliminarlos)')
+        else:
+            inicio = time.perf_counter()
+            self._sembrar(options)
+            self.stdout.write(self.style.SUCCESS(f'Datos sembrados en {time.perf_counter() - inicio:.1f} s'))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.stdout.write(
+            f"{RespuestaEvaluacion.objects.count()} respuestas, {Evaluacion.objects.count()} evaluaciones, "
+            f"{Consulta.objects.count()} consultas, {MensajeConsulta.objects.count()} mensajes"
+        )
+
+        consultas = self._consultas()
+        sin_indices = {}
+        if options['comparar']:
+            indices = [(modelo, indice) for modelo in MODELOS_INDEXADOS for indice in modelo._meta.indexes]
+            with connection.schema_editor() as editor:
+                for modelo, indice in indices:
+                    editor.remove_index(modelo, indice)
+            try:
+                self.stdout.write(self.style.MIGRATE_HEADING('\nSin índices'))
+                sin_indices = self._medir(consultas, options)
+            finally:
+                with connection.schema_editor() as editor:
+                    for modelo, indice in indices:
+                        editor.add_index(modelo, indice)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nCon índices'))
+        con_indices = self._medir(consultas, options)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nResumen (ms, mejor de %d)' % options['repeticiones']))
+        for nombre, _, _ in consultas:
+            linea = f'{nombre:<55} {con_indices[nombre]:>9.2f}'
+            if nombre in sin_indices:
+                antes = sin_indices[nombre]
+                linea = f'{nombre:<55} {antes:>9.2f} -> {con_indices[nombre]:>9.2f}  x{antes / max(con_indices[nombre], 0.001):.1f}'
+            self.stdout.write(linea)
+
+    def _consultas(self):
+        """(nombre, queryset, modo) que reproducen los changelists y los dashboards"""
+        ahora = timezone.now()
+        cuestionario_id = CuestionarioNOM035.objects.filter(nombre=NOMBRE_CUESTIONARIO).values_list('pk', flat=True).first()
+        psicologo_id = Psicologo.objects.filter(usuario__username__startswith=PREFIJO).values_list('pk', flat=True).first()
+        consulta_id = MensajeConsulta.objects.values_list('consulta_id', flat=True).order_by('-pk').first()
+        return [
+            ('Evaluaciones completadas (changelist)',
+             Evaluacion.objects.filter(estado='completada').select_related('evaluado', 'cuestionario')
+             .order_by('-fecha_inicio')[:100], 'lista'),
+            ('Evaluaciones completadas (conteo del changelist)',
+             Evaluacion.objects.filter(estado='completada'), 'conteo'),
+            ('Evaluaciones en progreso de un cuestionario',
+             Evaluacion.objects.filter(cuestionario_id=cuestionario_id, estado='en_progreso'), 'conteo'),
+            ('Dashboard: completadas del cuestionario, últimos 30 días',
+             Evaluacion.objects.filter(cuestionario_id=cuestionario_id, estado='completada',
+                                       fecha_completado__gte=ahora - timedelta(days=30)), 'conteo'),
+            ('Respuestas de evaluaciones completadas (changelist)',
+             RespuestaEvaluacion.objects.filter(evaluacion__estado='completada').order_by('-pk')[:100], 'lista'),
+            ('Respuestas de los últimos 7 días',
+             RespuestaEvaluacion.objects.filter(fecha_respuesta__gte=ahora - timedelta(days=7)), 'conteo'),
+            ('Consultas solicitadas (changelist)',
+             Consulta.objects.filter(estado='solicitada').select_related('cliente', 'psicologo__usuario', 'tipo_consulta')
+             .order_by('-fecha_solicitud')[:100], 'lista'),
+            ('Consultas agendadas este mes (date_hierarchy)',
+             Consulta.objects.filter(fecha_agendada__gte=ahora.replace(day=1),
+                                     fecha_agendada__lt=ahora.replace(day=1) + timedelta(days=31)), 'conteo'),
+            ('Agenda de un psicólogo, próximas 4 semanas',
+             Consulta.objects.filter(psicologo_id=psicologo_id, fecha_agendada__gte=ahora,
+                                     fecha_agendada__lt=ahora + timedelta(weeks=4)).order_by('fecha_agendada'), 'lista'),
+            ('Mensajes no leídos por consulta',
+             MensajeConsulta.objects.filter(leido=False).order_by().values('consulta').annotate(total=Count('pk')),
+             'lista'),
+            ('Hilo de mensajes de una consulta',
+             MensajeConsulta.objects.filter(consulta_id=consulta_id).order_by('fecha_envio'), 'lista'),
+            ('Mensajes de la última semana (changelist)',
+             MensajeConsulta.objects.filter(fecha_envio__gte=ahora - timedelta(days=7)).order_by('fecha_envio')[:100],
+             'lista'),
+        ]
+
+    def _medir(self, consultas, options):
+        tiempos = {}
+        for nombre, queryset, modo in consultas:
+            if not options['sin_plan']:
+                self.stdout.write(self.style.SQL_KEYWORD(f'\n{nombre}'))
+                self.stdout.write(queryset.explain())
+            mejor = float('inf')
+            for _ in range(options['repeticiones']):
+                inicio = time.perf_counter()
+                if modo == 'conteo':
+                    queryset.count()
+                else:
+                    list(queryset.all())
+                mejor = min(mejor, time.perf_counter() - inicio)
+            tiempos[nombre] = mejor * 1000
+            if not options['sin_plan']:
+                self.stdout.write(f'{tiempos[nombre]:.2f} ms')
+        return tiempos
+
+    @transaction.atomic
+    def _sembrar(self, options):
+        rng = random.Random(35)
+        ahora = timezone.now()
+        admin = User.objects.create(username=f'{PREFIJO}admin', is_staff=True)
+
+        cuestionario = CuestionarioNOM035.objects.create(
+            nombre=NOMBRE_CUESTIONARIO, version='1.0', descripcion='Datos sintéticos', estado='activo', creado_por=admin,
+        )
+        dominios = DominioNOM035.objects.bulk_create([
+            DominioNOM035(cuestionario=cuestionario, nombre=f'Dominio {n}', descripcion='', orden=n) for n in range(10)
+        ])
+        preguntas = PreguntaNOM035.objects.bulk_create([
+            PreguntaNOM035(dominio=dominios[n % 10], texto=f'Pregunta {n}', tipo='likert', orden=n) for n in range(72)
+        ])
+        opciones = OpcionRespuesta.objects.bulk_create([
+            OpcionRespuesta(pregunta=pregunta, texto=str(valor), valor=valor, orden=valor)
+            for pregunta in preguntas for valor in range(5)
+        ])
+        opciones_por_pregunta = [opciones[n * 5:(n + 1) * 5] for n in range(len(preguntas))]
+
+        User.objects.bulk_create(
+            [User(username=f'{PREFIJO}e{n}') for n in range(options['evaluaciones'])], batch_size=2000,
+        )
+        evaluados = list(User.objects.filter(username__startswith=f'{PREFIJO}e').order_by('pk'))
+
+        # Evaluaciones y respuestas por bloques para acotar la memoria
+        bloque = 500
+        for desde in range(0, len(evaluados), bloque):
+            evaluaciones = []
+            for evaluado in evaluados[desde:desde + bloque]:
+                estado = _elegir(rng, ESTADOS_EVALUACION)
+                evaluaciones.append(Evaluacion(
+                    cuestionario=cuestionario, evaluado=evaluado, evaluador=admin, estado=estado,
+                    fecha_completado=ahora - timedelta(minutes=rng.randrange(365 * 24 * 60))
+                    if estado == 'completada' else None,
+                ))
+            evaluaciones = Evaluacion.objects.bulk_create(evaluaciones)
+            # auto_now_add impide fijar la fecha al crear; se reparte a lo largo de un año
+            for evaluacion in evaluaciones:
+                evaluacion.fecha_inicio = (evaluacion.fecha_completado or ahora) - timedelta(minutes=rng.randrange(90))
+            Evaluacion.objects.bulk_update(evaluaciones, ['fecha_inicio'], batch_size=500)
+
+            respuestas = []
+            for evaluacion in evaluaciones:
+                contestadas = {'completada': 72, 'en_progreso': rng.randrange(1, 72)}.get(evaluacion.estado, 0)
+                for indice in range(contestadas):
+                    opcion = rng.choice(opciones_por_pregunta[indice])
+                    respuestas.append(RespuestaEvaluacion(
+                        evaluacion=evaluacion, pregunta=preguntas[indice], opcion_seleccionada=opcion,
+                        puntuacion=opcion.valor,
+                    ))
+            RespuestaEvaluacion.objects.bulk_create(respuestas, batch_size=5000)
+            self.stdout.write(f'  {desde + len(evaluaciones)} evaluaciones', ending='\r')
+        self.stdout.write('')
+
+        RespuestaEvaluacion.objects.filter(evaluacion__cuestionario=cuestionario).update(
+            fecha_respuesta=Subquery(Evaluacion.objects.filter(pk=OuterRef('evaluacion_id')).values('fecha_inicio')[:1]),
+        )
+
+        usuarios_psicologos = User.objects.bulk_create(
+            [User(username=f'{PREFIJO}p{n}') for n in range(options['psicologos'])],
+        )
+        usuarios_psicologos = list(User.objects.filter(username__startswith=f'{PREFIJO}p').order_by('pk'))
+        especialidades = [clave for clave, _ in Psicologo.ESPECIALIDADES]
+        Psicologo.objects.bulk_create([
+            Psicologo(usuario=usuario, especialidad=especialidades[n % len(especialidades)], experiencia_anos=5,
+                      descripcion='', tarifa_hora=800)
+            for n, usuario in enumerate(usuarios_psicologos)
+        ])
+        psicologos = list(Psicologo.objects.filter(usuario__username__startswith=PREFIJO))
+        tipo = TipoConsulta.objects.create(nombre=f'{PREFIJO}video', descripcion='', duracion_minutos=60, precio=800)
+
+        consultas = Consulta.objects.bulk_create([
+            Consulta(
+                cliente=rng.choice(evaluados), psicologo=rng.choice(psicologos), tipo_consulta=tipo,
+                fecha_agendada=ahora + timedelta(hours=rng.randrange(-180 * 24, 60 * 24)),
+                duracion_minutos=60, estado=_elegir(rng, ESTADOS_CONSULTA), motivo_consulta='Motivo',
+            )
+            for _ in range(options['consultas'])
+        ], batch_size=2000)
+        for consulta in consultas:
+            consulta.fecha_solicitud = consulta.fecha_agendada - timedelta(hours=rng.randrange(1, 21 * 24))
+        Consulta.objects.bulk_update(consultas, ['fecha_solicitud'], batch_size=500)
+
+        mensajes = []
+        for consulta in consultas:
+            for _ in range(rng.randrange(options['mensajes'] * 2 + 1)):
+                mensajes.append(MensajeConsulta(
+                    consulta=consulta,
+                    remitente_id=rng.choice([consulta.cliente_id, consulta.psicologo.usuario_id]),
+                    mensaje='Mensaje', leido=rng.random() > 0.2,
+                ))
+        MensajeConsulta.objects.bulk_create(mensajes, batch_size=5000)
+        MensajeConsulta.objects.filter(consulta__tipo_consulta=tipo).update(
+            fecha_envio=Subquery(Consulta.objects.filter(pk=OuterRef('consulta_id')).values('fecha_solicitud')[:1]),
+        )
+
+    def _limpiar(self):
+        with transaction.atomic():
+            CuestionarioNOM035.objects.filter(nombre=NOMBRE_CUESTIONARIO).delete()
+            TipoConsulta.objects.filter(nombre=f'{PREFIJO}video').delete()
+            User.objects.filter(username__startswith=PREFIJO).delete()
+        self.stdout.write(self.style.SUCCESS('Datos de benchmark eliminados'))
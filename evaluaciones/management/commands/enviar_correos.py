@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from evaluaciones.correos import TAMANO_BLOQUE, atender_bandeja, encolar_correos
+from evaluaciones.models import CorreoSaliente, Evaluacion
+
+
+class Command(BaseCommand):
+    help = 'Envía las invitaciones y recordatorios de la bandeja de salida por bloques, reutilizando la conexión SMTP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--encolar', choices=[tipo for tipo, _ in CorreoSaliente.TIPO_CORREO],
+                            help='Antes de enviar, agrega este correo para las evaluaciones pendientes')
+        parser.add_argument('--cuestionario', type=int, help='Encolar solo las evaluaciones de este cuestionario')
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help='Correos por conexión SMTP')
+        parser.add_argument('--por-segundo', type=float, default=0, help='Límite de envío (0 = sin límite)')
+        parser.add_argument('--espera', type=float, default=5.0, help='Segundos de espera con la bandeja vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Enviar lo pendiente y terminar')
+
+    def handle(self, *args, **options):
+        if options['cuestionario'] and not options['encolar']:
+            raise CommandError('--cuestionario solo aplica con --encolar')
+        if options['encolar']:
+            evaluaciones = Evaluacion.objects.all()
+            if options['cuestionario']:
+                evaluaciones = evaluaciones.filter(cuestionario_id=options['cuestionario'])
+            encolados = encolar_correos(options['encolar'], evaluaciones)
+            self.stdout.write(f'{encolados} correos agregados a la bandeja')
+
+        inicio = time.perf_counter()
+        enviados = atender_bandeja(
+            una_vez=options['una_vez'], espera=options['espera'],
+            tamano=options['bloque'], por_segundo=options['por_segundo'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{enviados} correos enviados en {time.perf_counter() - inicio:.1f} s'
+        ))
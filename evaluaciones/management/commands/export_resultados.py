@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from evaluaciones.exportacion import FORMATOS, generar_exportacion
+from evaluaciones.models import CuestionarioNOM035, Evaluacion
+
+
+class Command(BaseCommand):
+    help = 'Exporta en streaming la matriz de respuestas de un cuestionario (CSV o XLSX)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cuestionario', type=int, required=True, help='ID del CuestionarioNOM035')
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+        parser.add_argument('--estado', help='Filtrar por estado de la evaluación (p. ej. completada)')
+        parser.add_argument('--salida', help='Archivo de salida (por omisión, la salida estándar)')
+
+    def handle(self, *args, **options):
+        if not CuestionarioNOM035.objects.filter(pk=options['cuestionario']).exists():
+            raise CommandError('El cuestionario no existe')
+
+        evaluaciones = Evaluacion.objects.filter(cuestionario_id=options['cuestionario'])
+        if options['estado']:
+            evaluaciones = evaluaciones.filter(estado=options['estado'])
+
+        partes = generar_exportacion(evaluaciones, options['cuestionario'], options['formato'])
+        binario = options['formato'] == 'xlsx'
+        if options['salida']:
+            modo = {'mode': 'wb'} if binario else {'mode': 'w', 'encoding': 'utf-8', 'newline': ''}
+            with open(options['salida'], **modo) as destino:
+                for parte in partes:
+                    destino.write(parte)
+            self.stdout.write(self.style.SUCCESS(f"Exportación guardada en {options['salida']}"))
+        else:
+            for parte in partes:
+                if binario:
+                    sys.stdout.buffer.write(parte)
+                else:
+                    self.stdout.write(parte, ending='')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from evaluaciones.prerenderizado import DIRECTORIO, MANIFIESTO, prerenderizar
+
+
+class Command(BaseCommand):
+    help = 'Genera la versión estática (.html, .gz, .br) de las páginas públicas y su manifiesto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--destino', help='Directorio raíz de salida (por omisión STATIC_ROOT)')
+
+    def handle(self, *args, **options):
+        manifiesto = prerenderizar(options['destino'])
+        for ruta, pagina in manifiesto['paginas'].items():
+            self.stdout.write(f"{ruta} -> {pagina['archivo']} ({pagina['bytes']} bytes)")
+        if any(pagina['br'] is None for pagina in manifiesto['paginas'].values()):
+            self.stdout.write(self.style.WARNING('No se generaron .br: instala el paquete brotli'))
+        for nombre in manifiesto['faltantes']:
+            self.stdout.write(self.style.WARNING(f'Estático no encontrado, se deja sin hash: {nombre}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(manifiesto['paginas'])} páginas generadas; manifiesto en {DIRECTORIO}/{MANIFIESTO}"
+        ))
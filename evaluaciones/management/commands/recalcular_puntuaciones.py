@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from evaluaciones.agregados import reconstruir_agregados
+from evaluaciones.models import Evaluacion
+from evaluaciones.puntuacion import recalcular_puntuaciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalifica en bloque las evaluaciones completadas (p. ej. tras corregir valores de opciones) '
+        'y reconstruye sus agregados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cuestionario', type=int, help='ID del CuestionarioNOM035 a recalificar')
+        parser.add_argument('--todas', action='store_true', help='Recalificar todas las evaluaciones completadas')
+        parser.add_argument('--lote', type=int, default=5000, help='Evaluaciones por lote')
+
+    def handle(self, *args, **options):
+        if not options['cuestionario'] and not options['todas']:
+            raise CommandError('Indica --cuestionario ID o --todas')
+
+        evaluaciones = Evaluacion.objects.filter(estado='completada')
+        if options['cuestionario']:
+            evaluaciones = evaluaciones.filter(cuestionario_id=options['cuestionario'])
+
+        inicio = time.perf_counter()
+        total = recalcular_puntuaciones(evaluaciones, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} evaluaciones recalificadas en {time.perf_counter() - inicio:.2f} s'
+        ))
+
+        # Los agregados guardan calificaciones y niveles: se reconstruyen con las nuevas
+        inicio = time.perf_counter()
+        filas = reconstruir_agregados(tamano_lote=options['lote'], cuestionario_id=options['cuestionario'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{filas} agregados reconstruidos en {time.perf_counter() - inicio:.2f} s'
+        ))
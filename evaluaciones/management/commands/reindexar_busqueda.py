@@ -0,0 +1,31 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from psymetrics import busqueda
+
+
+MODELOS = ['consultas.consulta', 'consultas.mensajeconsulta', 'evaluaciones.preguntanom035', 'evaluaciones.opcionrespuesta']
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los índices de texto completo (después de cargas masivas o restauraciones)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modelo', action='append', choices=MODELOS,
+            help='Modelo a reindexar (app.modelo); se puede repetir. Por omisión todos',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        for etiqueta in options['modelo'] or MODELOS:
+            modelo = apps.get_model(etiqueta)
+            if not busqueda.campos_indexados(modelo):
+                raise CommandError(f'{etiqueta} no tiene índice de texto registrado')
+            inicio = time.perf_counter()
+            busqueda.reconstruir(modelo, using=options['database'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{etiqueta}: reindexado en {time.perf_counter() - inicio:.2f} s'
+            ))
@@ -0,0 +1,38 @@
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _trabajador(una_vez, espera):
+    # Importación diferida: el proceso hijo (spawn) inicializa Django antes de usarla
+    from evaluaciones.reportes import atender_cola
+
+    return atender_cola(una_vez=una_vez, espera=espera)
+
+
+class Command(BaseCommand):
+    help = 'Atiende la cola de reportes PDF con un pool local de procesos (sin broker externo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=2, help='Número de procesos trabajadores')
+        parser.add_argument('--espera', type=float, default=2.0, help='Segundos de espera con la cola vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Procesar lo pendiente y terminar')
+
+    def handle(self, *args, **options):
+        from evaluaciones.reportes import atender_cola
+
+        if options['procesos'] <= 1:
+            procesados = atender_cola(una_vez=options['una_vez'], espera=options['espera'])
+            self.stdout.write(self.style.SUCCESS(f'{procesados} reportes procesados'))
+            return
+
+        # Cada proceso abre sus propias conexiones a la base de datos
+        connections.close_all()
+        contexto = multiprocessing.get_context('spawn')
+        with contexto.Pool(options['procesos'], initializer=django.setup) as pool:
+            procesados = pool.starmap(
+                _trabajador, [(options['una_vez'], options['espera'])] * options['procesos'],
+            )
+        self.stdout.write(self.style.SUCCESS(f'{sum(procesados)} reportes procesados'))
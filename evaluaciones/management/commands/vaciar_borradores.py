@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from evaluaciones.borradores import vaciar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Escribe en la base de datos los borradores de evaluaciones con respuestas pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true',
+                            help='Escribir todos los borradores pendientes, no solo los más antiguos que BORRADOR_MAX_SEGUNDOS')
+        parser.add_argument('--cada', type=float, default=0,
+                            help='Repetir cada N segundos (0 = una sola vez)')
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            borradores, respuestas = vaciar_pendientes(todos=options['todos'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{respuestas} respuestas de {borradores} borradores escritas en {time.perf_counter() - inicio:.2f} s'
+            ))
+            if not options['cada']:
+                return
+            connections.close_all()
+            time.sleep(options['cada'])
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 09:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregadoDominio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(help_text='Primer día del mes')),
+                ('conteo', models.IntegerField(default=0)),
+                ('suma', models.FloatField(default=0)),
+                ('suma_cuadrados', models.FloatField(default=0)),
+                ('nivel_nulo', models.IntegerField(default=0)),
+                ('nivel_bajo', models.IntegerField(default=0)),
+                ('nivel_medio', models.IntegerField(default=0)),
+                ('nivel_alto', models.IntegerField(default=0)),
+                ('nivel_muy_alto', models.IntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('cuestionario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='evaluaciones.cuestionarionom035')),
+                ('dominio', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='evaluaciones.dominionom035')),
+            ],
+            options={
+                'verbose_name': 'Agregado por Dominio',
+                'verbose_name_plural': 'Agregados por Dominio',
+                'ordering': ['-periodo', 'cuestionario', 'dominio'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('dominio__isnull', False)), fields=('cuestionario', 'dominio', 'periodo'), name='agregado_unico_por_dominio'), models.UniqueConstraint(condition=models.Q(('dominio__isnull', True)), fields=('cuestionario', 'periodo'), name='agregado_unico_total')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 09:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluaciones', '0003_trabajoreporte'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='evaluacion',
+            index=models.Index(fields=['-fecha_inicio'], name='evaluacion_fecha_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluacion',
+            index=models.Index(fields=['estado', '-fecha_inicio'], name='evaluacion_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluacion',
+            index=models.Index(fields=['cuestionario', 'estado'], name='evaluacion_cuest_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluacion',
+            index=models.Index(condition=models.Q(('estado', 'completada')), fields=['cuestionario', 'fecha_completado'], name='evaluacion_completada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='respuestaevaluacion',
+            index=models.Index(fields=['fecha_respuesta'], name='respuesta_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 10:06
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from psymetrics.busqueda import indice_busqueda
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluaciones', '0004_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='opcionrespuesta',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='preguntanom035',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        indice_busqueda('evaluaciones', 'preguntanom035', 'texto'),
+        indice_busqueda('evaluaciones', 'opcionrespuesta', 'texto'),
+    ]
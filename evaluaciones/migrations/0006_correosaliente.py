@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 10:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluaciones', '0005_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSaliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('invitacion', 'Invitación'), ('recordatorio', 'Recordatorio')], max_length=15)),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('cancelado', 'Cancelado'), ('error', 'Error')], default='pendiente', max_length=15)),
+                ('intentos', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('lote', models.CharField(blank=True, max_length=32)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+                ('evaluacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='evaluaciones.evaluacion')),
+            ],
+            options={
+                'verbose_name': 'Correo Saliente',
+                'verbose_name_plural': 'Correos Salientes',
+                'ordering': ['fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='correo_saliente_cola_idx')],
+            },
+        ),
+    ]
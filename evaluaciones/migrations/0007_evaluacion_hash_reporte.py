@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluaciones', '0006_correosaliente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evaluacion',
+            name='hash_reporte',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
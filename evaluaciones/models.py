@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -53,6 +54,7 @@ class PreguntaNOM035(models.Model):
     tipo = models.CharField(max_length=10, choices=TIPO_PREGUNTA)
     orden = models.IntegerField()
     obligatoria = models.BooleanField(default=True)
+    busqueda = SearchVectorField(null=True, editable=False)
     
     class Meta:
         verbose_name = "Pregunta NOM-035"
@@ -68,6 +70,7 @@ class OpcionRespuesta(models.Model):
     texto = models.CharField(max_length=200)
     valor = models.IntegerField()
     orden = models.IntegerField()
+    busqueda = SearchVectorField(null=True, editable=False)
     
     class Meta:
         verbose_name = "Opción de Respuesta"
@@ -93,11 +96,24 @@ class Evaluacion(models.Model):
     fecha_inicio = models.DateTimeField(auto_now_add=True)
     fecha_completado = models.DateTimeField(null=True, blank=True)
     puntuacion_total = models.FloatField(null=True, blank=True)
+    # Hash del PDF vigente (ver evaluaciones.reportes); vacío si hay que generarlo
+    hash_reporte = models.CharField(max_length=64, blank=True, editable=False)
     
     class Meta:
         verbose_name = "Evaluación"
         verbose_name_plural = "Evaluaciones"
         ordering = ['-fecha_inicio']
+        indexes = [
+            models.Index(fields=['-fecha_inicio'], name='evaluacion_fecha_inicio_idx'),
+            models.Index(fields=['estado', '-fecha_inicio'], name='evaluacion_estado_fecha_idx'),
+            models.Index(fields=['cuestionario', 'estado'], name='evaluacion_cuest_estado_idx'),
+            # Dashboards y agregados solo leen evaluaciones completadas
+            models.Index(
+                fields=['cuestionario', 'fecha_completado'],
+                condition=models.Q(estado='completada'),
+                name='evaluacion_completada_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.evaluado.get_full_name()} - {self.cuestionario.nombre}"
@@ -115,6 +131,9 @@ class RespuestaEvaluacion(models.Model):
         verbose_name = "Respuesta de Evaluación"
         verbose_name_plural = "Respuestas de Evaluación"
         unique_together = ['evaluacion', 'pregunta']
+        indexes = [
+            models.Index(fields=['fecha_respuesta'], name='respuesta_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.evaluacion} - {self.pregunta}"
@@ -150,4 +169,135 @@ class EvaluacionPersonalizada(models.Model):
         ordering = ['-fecha_solicitud']
     
     def __str__(self):
-        return f"{self.cliente.get_full_name()} - {self.nombre_proyecto}"
\ No newline at end of file
+        return f"{self.cliente.get_full_name()} - {self.nombre_proyecto}"
+
+
+class AgregadoDominio(models.Model):
+    """Acumulados por cuestionario, dominio y periodo (mes) de las evaluaciones completadas.
+
+    Las filas con dominio nulo guardan la calificación final del cuestionario.
+    """
+    cuestionario = models.ForeignKey(CuestionarioNOM035, on_delete=models.CASCADE)
+    dominio = models.ForeignKey(DominioNOM035, on_delete=models.CASCADE, null=True, blank=True)
+    periodo = models.DateField(help_text="Primer día del mes")
+    conteo = models.IntegerField(default=0)
+    suma = models.FloatField(default=0)
+    suma_cuadrados = models.FloatField(default=0)
+    nivel_nulo = models.IntegerField(default=0)
+    nivel_bajo = models.IntegerField(default=0)
+    nivel_medio = models.IntegerField(default=0)
+    nivel_alto = models.IntegerField(default=0)
+    nivel_muy_alto = models.IntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Agregado por Dominio"
+        verbose_name_plural = "Agregados por Dominio"
+        ordering = ['-periodo', 'cuestionario', 'dominio']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cuestionario', 'dominio', 'periodo'],
+                condition=models.Q(dominio__isnull=False),
+                name='agregado_unico_por_dominio',
+            ),
+            models.UniqueConstraint(
+                fields=['cuestionario', 'periodo'],
+                condition=models.Q(dominio__isnull=True),
+                name='agregado_unico_total',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.cuestionario_id} - {self.dominio_id or 'Total'} - {self.periodo:%Y-%m}"
+    
+    @property
+    def media(self):
+        return self.suma / self.conteo if self.conteo else None
+    
+    @property
+    def desviacion(self):
+        if self.conteo < 2:
+            return None
+        varianza = (self.suma_cuadrados - self.suma ** 2 / self.conteo) / (self.conteo - 1)
+        return max(varianza, 0) ** 0.5
+    
+    @property
+    def histograma(self):
+        return {
+            'nulo': self.nivel_nulo,
+            'bajo': self.nivel_bajo,
+            'medio': self.nivel_medio,
+            'alto': self.nivel_alto,
+            'muy_alto': self.nivel_muy_alto,
+        }
+
+
+class TrabajoReporte(models.Model):
+    """Cola de generación de reportes PDF atendida por ``manage.py run_report_worker``"""
+    ESTADO_TRABAJO = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+    
+    evaluacion = models.ForeignKey(Evaluacion, on_delete=models.CASCADE)
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    estado = models.CharField(max_length=15, choices=ESTADO_TRABAJO, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    hash_contenido = models.CharField(max_length=64, blank=True)
+    archivo = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Trabajo de Reporte"
+        verbose_name_plural = "Trabajos de Reporte"
+        ordering = ['fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion'], name='trabajo_reporte_cola_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Reporte {self.evaluacion_id} - {self.get_estado_display()}"
+
+
+class CorreoSaliente(models.Model):
+    """Bandeja de salida de invitaciones y recordatorios atendida por ``manage.py enviar_correos``"""
+    TIPO_CORREO = [
+        ('invitacion', 'Invitación'),
+        ('recordatorio', 'Recordatorio'),
+    ]
+
+    ESTADO_CORREO = [
+        ('pendiente', 'Pendiente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('cancelado', 'Cancelado'),
+        ('error', 'Error'),
+    ]
+    
+    evaluacion = models.ForeignKey(Evaluacion, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=15, choices=TIPO_CORREO)
+    destinatario = models.EmailField()
+    estado = models.CharField(max_length=15, choices=ESTADO_CORREO, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    # Marca del trabajador que tomó el correo
+    lote = models.CharField(max_length=32, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Correo Saliente"
+        verbose_name_plural = "Correos Salientes"
+        ordering = ['fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='correo_saliente_cola_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} a {self.destinatario} - {self.get_estado_display()}"
@@ -0,0 +1,140 @@
+"""
+Versión estática de las páginas públicas.
+
+``manage.py prerender_public`` renderiza inicio, servicios, nosotros y contacto como los
+ve un visitante anónimo y los escribe en ``STATIC_ROOT/paginas/<ruta>/index.html`` junto
+con sus variantes ``.gz`` y ``.br``, de modo que nginx o la CDN los sirvan sin pasar por
+Django. Los enlaces a archivos estáticos se reescriben a nombres con hash para poder
+cachearlos indefinidamente, y ``manifest.json`` describe lo generado para el despliegue.
+
+La página estática no lleva token CSRF: el formulario de contacto lo pide a
+``/csrf/`` antes de enviar. Tampoco deja fijas las cifras de inicio: home.html las
+actualiza desde ``/estadisticas/``.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone, translation
+
+
+PAGINAS = ['evaluaciones:home', 'evaluaciones:servicios', 'evaluaciones:nosotros', 'evaluaciones:contacto']
+
+DIRECTORIO = 'paginas'
+
+MANIFIESTO = 'manifest.json'
+
+_TOKEN_CSRF = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _url_estatica():
+    return '/' + settings.STATIC_URL.lstrip('/')
+
+
+def _nombre_con_hash(nombre, raiz, estaticos):
+    """Nombre del archivo con hash de contenido; lo crea si el storage no usa manifiesto"""
+    if nombre in estaticos:
+        return estaticos[nombre]
+    if isinstance(staticfiles_storage, ManifestFilesMixin):
+        try:
+            estaticos[nombre] = staticfiles_storage.stored_name(nombre)
+        except ValueError:
+            estaticos[nombre] = None
+        return estaticos[nombre]
+
+    origen = raiz / nombre
+    if not origen.is_file():
+        estaticos[nombre] = None
+        return None
+    contenido = origen.read_bytes()
+    base, extension = os.path.splitext(nombre)
+    hasheado = f'{base}.{hashlib.md5(contenido).hexdigest()[:12]}{extension}'
+    destino = raiz / hasheado
+    if not destino.exists():
+        destino.write_bytes(contenido)
+    estaticos[nombre] = hasheado
+    return hasheado
+
+
+def _enlazar_estaticos(html, raiz, estaticos):
+    """Reescribe las referencias a STATIC_URL (con o sin ``?v=``) a nombres con hash"""
+    prefijo = _url_estatica()
+    patron = re.compile(r'(["\'(])' + re.escape(prefijo) + r'([^"\'()?#\s]+)(\?[^"\'()#\s]*)?')
+
+    def reemplazar(coincidencia):
+        hasheado = _nombre_con_hash(coincidencia.group(2), raiz, estaticos)
+        if hasheado is None:
+            return coincidencia.group(0)
+        return f'{coincidencia.group(1)}{prefijo}{hasheado}'
+
+    return patron.sub(reemplazar, html)
+
+
+def renderizar(nombre):
+    """HTML de la página tal como la recibe un visitante anónimo"""
+    ruta = reverse(nombre)
+    request = RequestFactory().get(ruta)
+    request.user = AnonymousUser()
+    with translation.override(settings.LANGUAGE_CODE):
+        respuesta = resolve(ruta).func(request)
+        if hasattr(respuesta, 'render'):
+            respuesta.render()
+    if respuesta.status_code != 200:
+        raise ValueError(f'{ruta} respondió {respuesta.status_code}')
+    return ruta, respuesta.content.decode(respuesta.charset)
+
+
+def _escribir(destino, contenido):
+    """Escribe el archivo y sus variantes comprimidas; devuelve los nombres escritos"""
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    destino.write_bytes(contenido)
+    escritos = {'gz': destino.with_name(destino.name + '.gz')}
+    # mtime=0 para que el .gz sea idéntico entre despliegues si la página no cambió
+    escritos['gz'].write_bytes(gzip.compress(contenido, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        escritos['br'] = None
+    else:
+        escritos['br'] = destino.with_name(destino.name + '.br')
+        escritos['br'].write_bytes(brotli.compress(contenido, mode=brotli.MODE_TEXT))
+    return escritos
+
+
+def prerenderizar(raiz=None):
+    """Genera las páginas públicas y su manifiesto; devuelve el manifiesto"""
+    raiz = Path(raiz or settings.STATIC_ROOT)
+    estaticos = {}
+    paginas = {}
+    for nombre in PAGINAS:
+        ruta, html = renderizar(nombre)
+        html = _TOKEN_CSRF.sub(r'\g<1>\g<2>', html)
+        contenido = _enlazar_estaticos(html, raiz, estaticos).encode()
+
+        relativo = Path(DIRECTORIO, ruta.strip('/'), 'index.html')
+        escritos = _escribir(raiz / relativo, contenido)
+        paginas[ruta] = {
+            'archivo': relativo.as_posix(),
+            'bytes': len(contenido),
+            'sha256': hashlib.sha256(contenido).hexdigest(),
+            'gz': escritos['gz'].relative_to(raiz).as_posix(),
+            'br': escritos['br'].relative_to(raiz).as_posix() if escritos['br'] else None,
+        }
+
+    manifiesto = {
+        'version': getattr(settings, 'VERSION_DESPLIEGUE', 'dev'),
+        'generado': timezone.now().isoformat(),
+        'paginas': paginas,
+        'estaticos': {nombre: hasheado for nombre, hasheado in sorted(estaticos.items()) if hasheado},
+        'faltantes': sorted(nombre for nombre, hasheado in estaticos.items() if hasheado is None),
+    }
+    (raiz / DIRECTORIO / MANIFIESTO).write_text(json.dumps(manifiesto, indent=2, ensure_ascii=False))
+    return manifiesto
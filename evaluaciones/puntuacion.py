@@ -0,0 +1,418 @@
+"""
+Motor de calificación NOM-035.
+
+Las respuestas de una o muchas evaluaciones se cargan como arreglos planos
+(evaluación, opción) y la calificación se resuelve en una sola pasada vectorizada:
+sumas por DominioNOM035, por categoría y total, con los niveles de riesgo de las
+Guías de referencia II y III de la NOM-035-STPS-2018.
+"""
+import unicodedata
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .cuestionarios import obtener_cuestionario
+from .models import Evaluacion, OpcionRespuesta, RespuestaEvaluacion
+
+
+NIVELES = ('nulo', 'bajo', 'medio', 'alto', 'muy_alto')
+
+NIVELES_ETIQUETAS = {
+    'nulo': 'Nulo o despreciable',
+    'bajo': 'Bajo',
+    'medio': 'Medio',
+    'alto': 'Alto',
+    'muy_alto': 'Muy alto',
+}
+
+# Criterios para la toma de acciones de la NOM-035 según el nivel de riesgo
+CRITERIOS_ACCION = {
+    'nulo': 'El riesgo resulta despreciable por lo que no se requieren medidas adicionales.',
+    'bajo': (
+        'Es necesario una mayor difusión de la política de prevención de riesgos psicosociales '
+        'y programas para la prevención de los factores de riesgo psicosocial, la promoción de un '
+        'entorno organizacional favorable y la prevención de la violencia laboral.'
+    ),
+    'medio': (
+        'Se requiere revisar la política de prevención de riesgos psicosociales y programas para la '
+        'prevención de los factores de riesgo psicosocial, la promoción de un entorno organizacional '
+        'favorable y la prevención de la violencia laboral, así como reforzar su aplicación y '
+        'difusión, mediante un Programa de intervención.'
+    ),
+    'alto': (
+        'Se requiere realizar un análisis de cada categoría y dominio para determinar las acciones '
+        'de intervención apropiadas a través de un Programa de intervención, que podrá incluir una '
+        'evaluación específica y deberá incluir una campaña de sensibilización.'
+    ),
+    'muy_alto': (
+        'Se requiere realizar el análisis de cada categoría y dominio para establecer las acciones '
+        'de intervención apropiadas, mediante un Programa de intervención que deberá incluir '
+        'evaluaciones específicas y campañas de sensibilización, y reforzar la política de '
+        'prevención de riesgos psicosociales.'
+    ),
+}
+
+# Puntos de corte (límite inferior de bajo, medio, alto y muy alto) por número de ítems
+# de la guía: 72 = Guía de referencia III, 46 = Guía de referencia II
+CORTES_CALIFICACION_FINAL = {
+    72: (50, 75, 99, 140),
+    46: (20, 45, 70, 90),
+}
+
+CORTES_CATEGORIA = {
+    72: {
+        'Ambiente de trabajo': (5, 9, 11, 14),
+        'Factores propios de la actividad': (15, 30, 45, 60),
+        'Organización del tiempo de trabajo': (5, 7, 10, 13),
+        'Liderazgo y relaciones en el trabajo': (14, 29, 42, 58),
+        'Entorno organizacional': (10, 14, 18, 23),
+    },
+    46: {
+        'Ambiente de trabajo': (3, 5, 7, 9),
+        'Factores propios de la actividad': (10, 20, 30, 40),
+        'Organización del tiempo de trabajo': (4, 6, 9, 12),
+        'Liderazgo y relaciones en el trabajo': (10, 18, 28, 38),
+    },
+}
+
+CORTES_DOMINIO = {
+    72: {
+        'condiciones en el ambiente de trabajo': (5, 9, 11, 14),
+        'carga de trabajo': (15, 21, 27, 37),
+        'falta de control sobre el trabajo': (11, 16, 21, 25),
+        'jornada de trabajo': (1, 2, 4, 6),
+        'interferencia en la relacion trabajo-familia': (4, 6, 8, 10),
+        'liderazgo': (9, 12, 16, 20),
+        'relaciones en el trabajo': (10, 13, 17, 21),
+        'violencia': (7, 10, 13, 16),
+        'reconocimiento del desempeno': (6, 10, 14, 18),
+        'insuficiente sentido de pertenencia e inestabilidad': (4, 6, 8, 10),
+    },
+    46: {
+        'condiciones en el ambiente de trabajo': (3, 5, 7, 9),
+        'carga de trabajo': (12, 16, 20, 24),
+        'falta de control sobre el trabajo': (5, 8, 11, 14),
+        'jornada de trabajo': (1, 2, 4, 6),
+        'interferencia en la relacion trabajo-familia': (1, 2, 4, 6),
+        'liderazgo': (3, 5, 8, 11),
+        'relaciones en el trabajo': (5, 8, 11, 14),
+        'violencia': (7, 10, 13, 16),
+    },
+}
+
+CATEGORIA_DOMINIO = {
+    'condiciones en el ambiente de trabajo': 'Ambiente de trabajo',
+    'carga de trabajo': 'Factores propios de la actividad',
+    'falta de control sobre el trabajo': 'Factores propios de la actividad',
+    'jornada de trabajo': 'Organización del tiempo de trabajo',
+    'interferencia en la relacion trabajo-familia': 'Organización del tiempo de trabajo',
+    'liderazgo': 'Liderazgo y relaciones en el trabajo',
+    'relaciones en el trabajo': 'Liderazgo y relaciones en el trabajo',
+    'violencia': 'Liderazgo y relaciones en el trabajo',
+    'reconocimiento del desempeno': 'Entorno organizacional',
+    'insuficiente sentido de pertenencia e inestabilidad': 'Entorno organizacional',
+}
+
+SIN_CORTES = (np.nan,) * 4
+
+TAMANO_LOTE = 5000
+
+ESTADOS_ABIERTOS = ['iniciada', 'en_progreso']
+
+
+def normalizar_nombre(nombre):
+    """Minúsculas, sin acentos ni comas y con espacios simples"""
+    nombre = unicodedata.normalize('NFKD', nombre)
+    nombre = ''.join(c for c in nombre if not unicodedata.combining(c))
+    return ' '.join(nombre.replace(',', ' ').lower().split())
+
+
+def _niveles(valores, cortes):
+    """Índice de nivel (0-4) para cada valor; -1 donde no hay puntos de corte"""
+    niveles = (valores[..., None] >= cortes).sum(axis=-1).astype(np.int8)
+    niveles[np.isnan(cortes).all(axis=-1) | np.isnan(valores)] = -1
+    return niveles
+
+
+class ResultadosPuntuacion:
+    """
+    Calificaciones de un conjunto de evaluaciones en forma matricial.
+
+    Las filas siguen el orden de ``evaluaciones``; las columnas de ``sumas_dominio``
+    siguen ``dominios`` (cuyo cuestionario está en ``dominio_cuestionarios``) y las
+    de ``sumas_categoria`` siguen ``categorias`` (pares cuestionario, categoría).
+    """
+
+    def __init__(self, evaluaciones, cuestionarios, dominios, dominio_cuestionarios, categorias,
+                 sumas_dominio, maximos_dominio, sumas_categoria, total, maximo_total,
+                 nivel_dominio, nivel_categoria, nivel_total):
+        self.evaluaciones = evaluaciones
+        self.cuestionarios = cuestionarios
+        self.dominios = dominios
+        self.dominio_cuestionarios = dominio_cuestionarios
+        self.categorias = categorias
+        self.sumas_dominio = sumas_dominio
+        self.maximos_dominio = maximos_dominio
+        self.sumas_categoria = sumas_categoria
+        self.total = total
+        self.maximo_total = maximo_total
+        self.nivel_dominio = nivel_dominio
+        self.nivel_categoria = nivel_categoria
+        self.nivel_total = nivel_total
+
+    def __len__(self):
+        return len(self.evaluaciones)
+
+    def indice(self, evaluacion_id):
+        posicion = int(np.searchsorted(self.evaluaciones, evaluacion_id))
+        if posicion >= len(self.evaluaciones) or self.evaluaciones[posicion] != evaluacion_id:
+            raise KeyError(evaluacion_id)
+        return posicion
+
+
+def _cargar_opciones(evaluacion_ids):
+    """(evaluacion_id, opcion_id) de todas las respuestas con opción, como arreglo Nx2"""
+    filas = (
+        RespuestaEvaluacion.objects
+        .filter(evaluacion_id__in=evaluacion_ids, opcion_seleccionada__isnull=False)
+        .values_list('evaluacion_id', 'opcion_seleccionada_id')
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+    return np.fromiter(chain.from_iterable(filas), dtype=np.int64).reshape(-1, 2)
+
+
+def puntuar(evaluacion_ids):
+    """Califica las evaluaciones indicadas en una sola pasada vectorizada"""
+    evaluaciones = dict(
+        Evaluacion.objects.filter(pk__in=list(evaluacion_ids)).values_list('id', 'cuestionario_id')
+    )
+    ids = np.array(sorted(evaluaciones), dtype=np.int64)
+    cuestionario_de = np.array([evaluaciones[i] for i in ids.tolist()], dtype=np.int64)
+    cuestionario_ids = np.unique(cuestionario_de)
+
+    # Metadatos del árbol desde los cuestionarios compilados (sin consultas)
+    dominios, dominio_cuestionario, maximos, cortes_dominio = [], [], [], []
+    categorias, cortes_categoria, categoria_de_dominio = [], [], []
+    cortes_total = []
+    opcion_ids, opcion_valor, opcion_dominio = [], [], []
+    for cuestionario_id in cuestionario_ids.tolist():
+        compilado = obtener_cuestionario(cuestionario_id)
+        guia = len(compilado.preguntas)
+        cortes_total.append(CORTES_CALIFICACION_FINAL.get(guia, SIN_CORTES))
+        for dominio in compilado.datos['dominios']:
+            columna = len(dominios)
+            nombre = normalizar_nombre(dominio['nombre'])
+            dominios.append(dominio['id'])
+            dominio_cuestionario.append(cuestionario_id)
+            cortes_dominio.append(CORTES_DOMINIO.get(guia, {}).get(nombre, SIN_CORTES))
+            maximo = 0
+            for pregunta_id in dominio['preguntas']:
+                opciones = compilado.opciones[pregunta_id]
+                maximo += max(opciones.values(), default=0)
+                opcion_ids.extend(opciones.keys())
+                opcion_valor.extend(opciones.values())
+                opcion_dominio.extend([columna] * len(opciones))
+            maximos.append(maximo)
+
+            categoria = CATEGORIA_DOMINIO.get(nombre)
+            if categoria is None:
+                categoria_de_dominio.append(-1)
+                continue
+            clave = (cuestionario_id, categoria)
+            if clave not in categorias:
+                categorias.append(clave)
+                cortes_categoria.append(CORTES_CATEGORIA.get(guia, {}).get(categoria, SIN_CORTES))
+            categoria_de_dominio.append(categorias.index(clave))
+
+    n_eval, n_dom, n_cat = len(ids), len(dominios), len(categorias)
+
+    # Tablas de búsqueda opción -> (valor, columna de dominio), ordenadas por id
+    opcion_ids = np.array(opcion_ids, dtype=np.int64)
+    orden = np.argsort(opcion_ids)
+    opcion_ids = opcion_ids[orden]
+    opcion_valor = np.array(opcion_valor, dtype=np.float64)[orden]
+    opcion_dominio = np.array(opcion_dominio, dtype=np.int64)[orden]
+
+    respuestas = _cargar_opciones(ids.tolist())
+    sumas_dominio = np.zeros((n_eval, n_dom))
+    if len(respuestas) and len(opcion_ids):
+        posicion = np.minimum(np.searchsorted(opcion_ids, respuestas[:, 1]), len(opcion_ids) - 1)
+        validas = opcion_ids[posicion] == respuestas[:, 1]
+        posicion = posicion[validas]
+        celdas = np.searchsorted(ids, respuestas[validas, 0]) * n_dom + opcion_dominio[posicion]
+        sumas_dominio = np.bincount(
+            celdas, weights=opcion_valor[posicion], minlength=n_eval * n_dom
+        ).reshape(n_eval, n_dom)
+
+    # Categorías y total como productos matriciales sobre las sumas por dominio
+    pertenencia = np.zeros((n_dom, n_cat))
+    categoria_de_dominio = np.array(categoria_de_dominio, dtype=np.int64)
+    columnas = np.flatnonzero(categoria_de_dominio >= 0)
+    pertenencia[columnas, categoria_de_dominio[columnas]] = 1
+    sumas_categoria = sumas_dominio @ pertenencia
+    total = sumas_dominio.sum(axis=1)
+
+    maximos_dominio = np.array(maximos, dtype=np.float64)
+    indice_cuestionario = np.searchsorted(cuestionario_ids, cuestionario_de)
+    maximo_por_cuestionario = np.bincount(
+        np.searchsorted(cuestionario_ids, np.array(dominio_cuestionario, dtype=np.int64)),
+        weights=maximos_dominio,
+        minlength=len(cuestionario_ids),
+    )
+    cortes_total = np.array(cortes_total, dtype=np.float64).reshape(-1, 4)
+
+    return ResultadosPuntuacion(
+        evaluaciones=ids,
+        cuestionarios=cuestionario_de,
+        dominios=np.array(dominios, dtype=np.int64),
+        dominio_cuestionarios=np.array(dominio_cuestionario, dtype=np.int64),
+        categorias=categorias,
+        sumas_dominio=sumas_dominio,
+        maximos_dominio=maximos_dominio,
+        sumas_categoria=sumas_categoria,
+        total=total,
+        maximo_total=maximo_por_cuestionario[indice_cuestionario],
+        nivel_dominio=_niveles(sumas_dominio, np.array(cortes_dominio, dtype=np.float64).reshape(n_dom, 4)),
+        nivel_categoria=_niveles(sumas_categoria, np.array(cortes_categoria, dtype=np.float64).reshape(n_cat, 4)),
+        nivel_total=_niveles(total, cortes_total[indice_cuestionario]),
+    )
+
+
+def guardar_puntuaciones(resultados):
+    """
+    Persiste puntuacion_total, recalcula RespuestaEvaluacion.puntuacion desde las opciones y
+    descarta el hash del reporte (se regenera en la siguiente descarga)
+    """
+    ids = resultados.evaluaciones.tolist()
+    totales = resultados.total.tolist()
+    for inicio in range(0, len(ids), TAMANO_LOTE):
+        lote = ids[inicio:inicio + TAMANO_LOTE]
+        Evaluacion.objects.bulk_update(
+            [Evaluacion(pk=pk, puntuacion_total=total, hash_reporte='')
+             for pk, total in zip(lote, totales[inicio:inicio + TAMANO_LOTE])],
+            ['puntuacion_total', 'hash_reporte'],
+            batch_size=1000,
+        )
+        RespuestaEvaluacion.objects.filter(
+            evaluacion_id__in=lote, opcion_seleccionada__isnull=False,
+        ).update(puntuacion=Subquery(
+            OpcionRespuesta.objects.filter(pk=OuterRef('opcion_seleccionada_id')).values('valor')[:1]
+        ))
+
+
+def recalcular_puntuaciones(evaluaciones, tamano_lote=TAMANO_LOTE):
+    """
+    Recalifica en bloque un queryset de evaluaciones (p. ej. todo un cuestionario
+    tras corregir la tabla de valores). Devuelve el número de evaluaciones procesadas.
+    """
+    ids = list(evaluaciones.order_by().values_list('pk', flat=True))
+    for inicio in range(0, len(ids), tamano_lote):
+        guardar_puntuaciones(puntuar(ids[inicio:inicio + tamano_lote]))
+    return len(ids)
+
+
+def finalizar_evaluacion(evaluacion):
+    """
+    Marca la evaluación como completada, guarda su calificación y la suma a los agregados.
+
+    La transición se reclama con un UPDATE condicional: si la evaluación ya no estaba
+    abierta (otra solicitud la completó antes) no se vuelve a sumar.
+    """
+    from .agregados import acumular_evaluacion, periodo_de
+
+    resultados = puntuar([evaluacion.pk])
+    fecha = timezone.now()
+    total = float(resultados.total[0])
+    with transaction.atomic():
+        reclamada = Evaluacion.objects.filter(pk=evaluacion.pk, estado__in=ESTADOS_ABIERTOS).update(
+            estado='completada', fecha_completado=fecha, puntuacion_total=total, hash_reporte='',
+        )
+        if reclamada:
+            acumular_evaluacion(resultados, evaluacion.pk, periodo_de(fecha))
+    if reclamada:
+        evaluacion.estado, evaluacion.fecha_completado, evaluacion.puntuacion_total = 'completada', fecha, total
+    else:
+        evaluacion.refresh_from_db(fields=['estado', 'fecha_completado', 'puntuacion_total'])
+    return resultados
+
+
+def retirar_evaluacion(evaluacion, estado='en_progreso'):
+    """
+    Saca una evaluación de 'completada' (al reabrirla, o con 'cancelada' antes de borrarla)
+    y la resta de los agregados. Como al finalizar, la transición se reclama con un UPDATE
+    condicional para descontarla una sola vez. Devuelve si se retiró.
+    """
+    from .agregados import acumular_evaluacion, periodo_de
+
+    fila = (
+        Evaluacion.objects.filter(pk=evaluacion.pk, estado='completada')
+        .values_list('fecha_completado', 'fecha_inicio').first()
+    )
+    if fila is None:
+        return False
+    completado, iniciado = fila
+    resultados = puntuar([evaluacion.pk])
+    with transaction.atomic():
+        reclamada = Evaluacion.objects.filter(
+            pk=evaluacion.pk, estado='completada', fecha_completado=completado,
+        ).update(estado=estado, fecha_completado=None, puntuacion_total=None, hash_reporte='')
+        if not reclamada:
+            return False
+        acumular_evaluacion(resultados, evaluacion.pk, periodo_de(completado or iniciado), signo=-1)
+    evaluacion.estado, evaluacion.fecha_completado, evaluacion.puntuacion_total = estado, None, None
+    return True
+
+
+def _nivel(indice):
+    return NIVELES[indice] if indice >= 0 else None
+
+
+def _porcentaje(valor, maximo):
+    return round(float(valor) * 100 / float(maximo), 1) if maximo else 0.0
+
+
+def resumen_evaluacion(resultados, evaluacion_id):
+    """Resultados de una evaluación en el formato que consumen las plantillas"""
+    fila = resultados.indice(evaluacion_id)
+    compilado = obtener_cuestionario(int(resultados.cuestionarios[fila]))
+    nombres = {dominio['id']: dominio['nombre'] for dominio in compilado.datos['dominios']}
+
+    dominios = []
+    for columna, dominio_id in enumerate(resultados.dominios.tolist()):
+        if dominio_id not in nombres:
+            continue
+        nivel = _nivel(resultados.nivel_dominio[fila, columna])
+        dominios.append({
+            'id': dominio_id,
+            'nombre': nombres[dominio_id],
+            'calificacion': float(resultados.sumas_dominio[fila, columna]),
+            'puntuacion': _porcentaje(resultados.sumas_dominio[fila, columna], resultados.maximos_dominio[columna]),
+            'nivel': nivel,
+            'interpretacion': f'Nivel de riesgo {NIVELES_ETIQUETAS[nivel].lower()}' if nivel else '',
+            'recomendaciones': [CRITERIOS_ACCION[nivel]] if nivel in ('medio', 'alto', 'muy_alto') else [],
+        })
+
+    categorias = [
+        {
+            'nombre': nombre,
+            'calificacion': float(resultados.sumas_categoria[fila, columna]),
+            'nivel': _nivel(resultados.nivel_categoria[fila, columna]),
+        }
+        for columna, (cuestionario_id, nombre) in enumerate(resultados.categorias)
+        if cuestionario_id == compilado.id
+    ]
+
+    nivel = _nivel(resultados.nivel_total[fila])
+    return {
+        'evaluacion': evaluacion_id,
+        'calificacion_final': float(resultados.total[fila]),
+        'puntuacion_general': _porcentaje(resultados.total[fila], resultados.maximo_total[fila]),
+        'nivel': nivel,
+        'nivel_riesgo': NIVELES_ETIQUETAS[nivel] if nivel else 'Sin clasificar',
+        'dominios': dominios,
+        'categorias': categorias,
+        'recomendaciones': [CRITERIOS_ACCION[nivel]] if nivel else [],
+    }
@@ -0,0 +1,216 @@
+"""
+Generación asíncrona de reportes PDF por evaluación.
+
+Las solicitudes se encolan en TrabajoReporte y un proceso aparte
+(``manage.py run_report_worker``) las atiende sin depender de Redis ni de otro
+broker. Cada PDF se guarda en MEDIA_ROOT con el hash de su contenido, que queda en
+Evaluacion.hash_reporte: las descargas se sirven desde disco sin volver a calificar la
+evaluación. El hash se borra cuando cambia la calificación (ver ``puntuacion``).
+"""
+import hashlib
+import io
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Evaluacion, TrabajoReporte
+from .puntuacion import NIVELES_ETIQUETAS, puntuar, resumen_evaluacion
+
+
+logger = logging.getLogger(__name__)
+
+# Cambiar al modificar el diseño del PDF para invalidar los archivos generados
+# (forma parte del hash y de la ruta)
+VERSION_PLANTILLA = 1
+
+MAX_INTENTOS = 3
+
+# Trabajos en 'procesando' más antiguos que esto se consideran abandonados
+MINUTOS_ABANDONO = 10
+
+# Cada cuánto un trabajador devuelve a la cola los trabajos abandonados
+SEGUNDOS_REVISION = 60
+
+COLORES_NIVEL = {
+    'nulo': '#36A89C',
+    'bajo': '#7FBF7F',
+    'medio': '#F2C14E',
+    'alto': '#F08A4B',
+    'muy_alto': '#D64545',
+}
+
+
+def datos_reporte(evaluacion):
+    """Contenido del reporte a partir de la calificación de la evaluación"""
+    datos = resumen_evaluacion(puntuar([evaluacion.pk]), evaluacion.pk)
+    datos['evaluado'] = evaluacion.evaluado.get_full_name() or evaluacion.evaluado.username
+    datos['cuestionario'] = str(evaluacion.cuestionario)
+    datos['fecha_evaluacion'] = evaluacion.fecha_completado.isoformat() if evaluacion.fecha_completado else None
+    return datos
+
+
+def hash_reporte(datos):
+    contenido = json.dumps([VERSION_PLANTILLA, datos], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def ruta_reporte(hash_contenido):
+    return f'reportes/v{VERSION_PLANTILLA}/{hash_contenido[:2]}/{hash_contenido}.pdf'
+
+
+def renderizar_pdf(datos):
+    """Dibuja el reporte (resumen y gráfico de barras por dominio) y devuelve los bytes del PDF"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    ancho, alto = letter
+    margen = 50
+
+    pdf.setFillColor(colors.HexColor('#0F2C4B'))
+    pdf.setFont('Helvetica-Bold', 18)
+    pdf.drawString(margen, alto - 60, 'PsyMetrics Global - Reporte NOM-035')
+    pdf.setFillColor(colors.black)
+    pdf.setFont('Helvetica', 11)
+    pdf.drawString(margen, alto - 85, f"Evaluado: {datos['evaluado']}")
+    pdf.drawString(margen, alto - 100, f"Cuestionario: {datos['cuestionario']}")
+    if datos.get('fecha_evaluacion'):
+        pdf.drawString(margen, alto - 115, f"Fecha: {datos['fecha_evaluacion'][:10]}")
+
+    pdf.setFont('Helvetica-Bold', 13)
+    pdf.drawString(margen, alto - 145, f"Calificación final: {datos['calificacion_final']:.0f}")
+    pdf.drawString(margen + 250, alto - 145, f"Nivel de riesgo: {datos['nivel_riesgo']}")
+
+    # Gráfico de barras horizontales por dominio (porcentaje del máximo posible)
+    y = alto - 185
+    ancho_barra = ancho - 2 * margen - 200
+    pdf.setFont('Helvetica', 9)
+    for dominio in datos['dominios']:
+        if y < 120:
+            pdf.showPage()
+            pdf.setFont('Helvetica', 9)
+            y = alto - 60
+        pdf.setFillColor(colors.black)
+        pdf.drawString(margen, y + 2, dominio['nombre'][:40])
+        pdf.setFillColor(colors.HexColor('#E5E7EB'))
+        pdf.rect(margen + 200, y, ancho_barra, 10, stroke=0, fill=1)
+        pdf.setFillColor(colors.HexColor(COLORES_NIVEL.get(dominio['nivel'], '#0F2C4B')))
+        pdf.rect(margen + 200, y, ancho_barra * min(dominio['puntuacion'], 100) / 100, 10, stroke=0, fill=1)
+        pdf.setFillColor(colors.black)
+        etiqueta = NIVELES_ETIQUETAS.get(dominio['nivel'], '')
+        pdf.drawString(margen + 205 + ancho_barra, y + 2, f"{dominio['puntuacion']:.0f}% {etiqueta}"[:22])
+        y -= 22
+
+    # Recomendaciones
+    texto = pdf.beginText(margen, max(y - 20, 80))
+    texto.setFont('Helvetica', 9)
+    for recomendacion in datos['recomendaciones']:
+        linea = ''
+        for palabra in recomendacion.split():
+            if len(linea) + len(palabra) > 100:
+                texto.textLine(linea)
+                linea = ''
+            linea = f'{linea} {palabra}'.strip()
+        texto.textLine(linea)
+    pdf.drawText(texto)
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def reporte_en_disco(evaluacion):
+    """(hash, ruta) del reporte vigente según Evaluacion.hash_reporte; la ruta es None si hay que generarlo"""
+    if not evaluacion.hash_reporte:
+        return None, None
+    ruta = ruta_reporte(evaluacion.hash_reporte)
+    return evaluacion.hash_reporte, ruta if default_storage.exists(ruta) else None
+
+
+def encolar_reporte(evaluacion, usuario=None):
+    """Devuelve el trabajo activo de la evaluación o crea uno nuevo"""
+    trabajo = TrabajoReporte.objects.filter(
+        evaluacion=evaluacion, estado__in=['pendiente', 'procesando'],
+    ).first()
+    if trabajo is None:
+        trabajo = TrabajoReporte.objects.create(evaluacion=evaluacion, solicitado_por=usuario)
+    return trabajo
+
+
+def reclamar_trabajo():
+    """Toma el trabajo pendiente más antiguo con un UPDATE condicional (seguro entre procesos)"""
+    while True:
+        candidato = (
+            TrabajoReporte.objects.filter(estado='pendiente')
+            .order_by('fecha_creacion', 'pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if candidato is None:
+            return None
+        tomado = TrabajoReporte.objects.filter(pk=candidato, estado='pendiente').update(
+            estado='procesando', fecha_inicio=timezone.now(), intentos=F('intentos') + 1,
+        )
+        if tomado:
+            return TrabajoReporte.objects.select_related('evaluacion').get(pk=candidato)
+
+
+def procesar_trabajo(trabajo):
+    """Renderiza el PDF del trabajo (o reutiliza el existente con el mismo hash)"""
+    try:
+        evaluacion = Evaluacion.objects.select_related('evaluado', 'cuestionario').get(pk=trabajo.evaluacion_id)
+        datos = datos_reporte(evaluacion)
+        hash_contenido = hash_reporte(datos)
+        ruta = ruta_reporte(hash_contenido)
+        if not default_storage.exists(ruta):
+            ruta = default_storage.save(ruta, ContentFile(renderizar_pdf(datos)))
+    except Exception as error:
+        logger.exception('Error al generar el reporte %s', trabajo.pk)
+        estado = 'error' if trabajo.intentos >= MAX_INTENTOS else 'pendiente'
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(estado=estado, error=str(error))
+        return False
+
+    TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+        estado='completado', hash_contenido=hash_contenido, archivo=ruta, error='', fecha_fin=timezone.now(),
+    )
+    # Solo si la evaluación no se reabrió mientras tanto
+    Evaluacion.objects.filter(
+        pk=evaluacion.pk, estado='completada', fecha_completado=evaluacion.fecha_completado,
+    ).update(hash_reporte=hash_contenido)
+    return True
+
+
+def recuperar_abandonados():
+    """Devuelve a la cola los trabajos de un trabajador que murió a medio proceso"""
+    limite = timezone.now() - timedelta(minutes=MINUTOS_ABANDONO)
+    return TrabajoReporte.objects.filter(estado='procesando', fecha_inicio__lt=limite).update(estado='pendiente')
+
+
+def atender_cola(una_vez=False, espera=2.0):
+    """Bucle de un trabajador: procesa trabajos hasta vaciar la cola (una_vez) o indefinidamente"""
+    procesados = 0
+    revision = 0
+    while True:
+        if time.monotonic() >= revision:
+            recuperados = recuperar_abandonados()
+            if recuperados:
+                logger.warning('%s trabajos abandonados devueltos a la cola', recuperados)
+            revision = time.monotonic() + SEGUNDOS_REVISION
+        trabajo = reclamar_trabajo()
+        if trabajo is not None:
+            procesar_trabajo(trabajo)
+            procesados += 1
+            continue
+        if una_vez:
+            return procesados
+        connections.close_all()
+        time.sleep(espera)
@@ -0,0 +1,108 @@
+"""
+Ingesta por lotes de RespuestaEvaluacion.
+
+Las respuestas se validan contra el cuestionario compilado (sin consultas) y se
+escriben con una sola sentencia INSERT ... ON CONFLICT DO UPDATE cuando el motor lo
+permite; en otro caso se reemplazan dentro de una transacción.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from .models import RespuestaEvaluacion
+
+
+ESTADOS_EDITABLES = ['iniciada', 'en_progreso']
+
+CAMPOS_ACTUALIZABLES = ['opcion_seleccionada', 'respuesta_texto', 'puntuacion']
+
+
+def _entero(valor):
+    if isinstance(valor, bool):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def preparar_respuestas(evaluacion, compilado, respuestas):
+    """
+    Valida un lote de respuestas y construye las instancias sin guardar.
+
+    Cada elemento es un dict con 'pregunta' y uno de 'opcion' (id de la opción),
+    'valor' (valor de la opción, como lo envía evaluacion.html) o 'respuesta_texto'.
+    La puntuación se toma de OpcionRespuesta.valor en la misma pasada.
+    Si una pregunta aparece varias veces prevalece la última.
+    """
+    errores = []
+    por_pregunta = {}
+    for indice, respuesta in enumerate(respuestas):
+        if not isinstance(respuesta, dict):
+            errores.append(f'Respuesta {indice}: formato inválido')
+            continue
+
+        pregunta_id = _entero(respuesta.get('pregunta'))
+        pregunta = compilado.preguntas.get(pregunta_id)
+        if pregunta is None:
+            errores.append(f'Respuesta {indice}: la pregunta no pertenece al cuestionario')
+            continue
+
+        opciones = compilado.opciones[pregunta_id]
+        opcion_id = _entero(respuesta.get('opcion'))
+        valor = _entero(respuesta.get('valor'))
+        texto = respuesta.get('respuesta_texto')
+
+        if opcion_id is None and valor is not None:
+            opcion_id = next((o for o, v in opciones.items() if v == valor), None)
+            if opcion_id is None:
+                errores.append(f'Pregunta {pregunta_id}: valor {valor} no válido')
+                continue
+
+        if opcion_id is not None:
+            if opcion_id not in opciones:
+                errores.append(f'Pregunta {pregunta_id}: la opción {opcion_id} no le corresponde')
+                continue
+            por_pregunta[pregunta_id] = RespuestaEvaluacion(
+                evaluacion=evaluacion,
+                pregunta_id=pregunta_id,
+                opcion_seleccionada_id=opcion_id,
+                respuesta_texto=texto or None,
+                puntuacion=opciones[opcion_id],
+            )
+        elif texto and pregunta['tipo'] == 'abierta':
+            por_pregunta[pregunta_id] = RespuestaEvaluacion(
+                evaluacion=evaluacion,
+                pregunta_id=pregunta_id,
+                respuesta_texto=str(texto),
+            )
+        else:
+            errores.append(f'Pregunta {pregunta_id}: falta la respuesta')
+
+    if errores:
+        raise ValidationError(errores)
+    return list(por_pregunta.values())
+
+
+def escribir_respuestas(instancias):
+    """Inserta o actualiza las respuestas en una sola escritura"""
+    if not instancias:
+        return
+    alias = router.db_for_write(RespuestaEvaluacion)
+    if connections[alias].features.supports_update_conflicts_with_target:
+        RespuestaEvaluacion.objects.using(alias).bulk_create(
+            instancias,
+            update_conflicts=True,
+            unique_fields=['evaluacion', 'pregunta'],
+            update_fields=CAMPOS_ACTUALIZABLES,
+        )
+        return
+
+    # Motores sin ON CONFLICT: se reemplazan las filas del lote de forma atómica
+    evaluacion_ids = {instancia.evaluacion_id for instancia in instancias}
+    with transaction.atomic(using=alias):
+        for evaluacion_id in evaluacion_ids:
+            RespuestaEvaluacion.objects.using(alias).filter(
+                evaluacion_id=evaluacion_id,
+                pregunta_id__in=[i.pregunta_id for i in instancias if i.evaluacion_id == evaluacion_id],
+            ).delete()
+        RespuestaEvaluacion.objects.using(alias).bulk_create(instancias)
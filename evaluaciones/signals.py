@@ -0,0 +1,105 @@
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from psymetrics.busqueda import registrar
+from psymetrics.sesiones import olvidar_usuarios
+
+from .cuestionarios import invalidar_cuestionario
+from .models import CuestionarioNOM035, DominioNOM035, Evaluacion, PreguntaNOM035, OpcionRespuesta
+from .puntuacion import retirar_evaluacion
+
+
+registrar(PreguntaNOM035, 'texto')
+registrar(OpcionRespuesta, 'texto')
+
+
+def _invalidar_al_confirmar(cuestionario_id):
+    """Invalida después del commit para no recompilar con datos sin confirmar"""
+    if cuestionario_id is not None:
+        transaction.on_commit(lambda: invalidar_cuestionario(cuestionario_id))
+
+
+@receiver(post_save, sender=CuestionarioNOM035)
+@receiver(post_delete, sender=CuestionarioNOM035)
+def invalidar_por_cuestionario(sender, instance, **kwargs):
+    _invalidar_al_confirmar(instance.pk)
+
+
+@receiver(post_save, sender=DominioNOM035)
+@receiver(post_delete, sender=DominioNOM035)
+def invalidar_por_dominio(sender, instance, **kwargs):
+    _invalidar_al_confirmar(instance.cuestionario_id)
+
+
+@receiver(post_save, sender=PreguntaNOM035)
+@receiver(post_delete, sender=PreguntaNOM035)
+def invalidar_por_pregunta(sender, instance, **kwargs):
+    # En un borrado en cascada el dominio puede ya no existir; en ese caso
+    # la señal del cuestionario o del dominio se encarga de invalidar
+    cuestionario_id = (
+        DominioNOM035.objects.filter(pk=instance.dominio_id)
+        .values_list('cuestionario_id', flat=True)
+        .first()
+    )
+    _invalidar_al_confirmar(cuestionario_id)
+
+
+@receiver(post_save, sender=OpcionRespuesta)
+@receiver(post_delete, sender=OpcionRespuesta)
+def invalidar_por_opcion(sender, instance, **kwargs):
+    cuestionario_id = (
+        PreguntaNOM035.objects.filter(pk=instance.pregunta_id)
+        .values_list('dominio__cuestionario_id', flat=True)
+        .first()
+    )
+    _invalidar_al_confirmar(cuestionario_id)
+
+
+@receiver(pre_delete, sender=Evaluacion)
+def descontar_evaluacion_borrada(sender, instance, **kwargs):
+    """Una evaluación completada sale de los agregados en la misma transacción que la borra"""
+    retirar_evaluacion(instance, 'cancelada')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def olvidar_usuario(sender, instance, **kwargs):
+    """El usuario en caché de las sesiones se vuelve a leer tras cualquier cambio"""
+    olvidar_usuarios([instance.pk])
+
+
+def _afectados(action, reverse, pk_set, forward, inverso):
+    """
+    Ids afectados por un cambio m2m: ``forward()`` si se cambió desde el usuario/grupo;
+    desde el otro lado, ``inverso(pks)`` con los pk agregados o quitados. Un clear desde el
+    otro lado solo se conoce antes de ejecutarse (pre_clear).
+    """
+    if not reverse:
+        return forward() if action in ('post_add', 'post_remove', 'post_clear') else []
+    if action in ('post_add', 'post_remove'):
+        return inverso(pk_set)
+    return inverso(None) if action == 'pre_clear' else []
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def olvidar_por_permisos(sender, instance, action, reverse, pk_set, **kwargs):
+    olvidar_usuarios(_afectados(
+        action, reverse, pk_set,
+        lambda: [instance.pk],
+        lambda pks: pks if pks is not None else list(instance.user_set.values_list('pk', flat=True)),
+    ))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def olvidar_por_permisos_de_grupo(sender, instance, action, reverse, pk_set, **kwargs):
+    olvidar_usuarios(_afectados(
+        action, reverse, pk_set,
+        lambda: list(instance.user_set.values_list('pk', flat=True)),
+        lambda pks: list(
+            User.objects.filter(groups__in=pks if pks is not None else instance.group_set.all())
+            .values_list('pk', flat=True)
+        ),
+    ))
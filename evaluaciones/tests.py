@@ -1,3 +1,1402 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection, connections
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from psymetrics.estaticos import CACHE_INMUTABLE, CACHE_SIN_HASH, ServidorEstaticos, ServidorEstaticosASGI, comprimir
+from psymetrics import replicas
+from psymetrics.sesiones import SessionStore
+
+from .models import (
+    AgregadoDominio,
+    CorreoSaliente,
+    CuestionarioNOM035,
+    DominioNOM035,
+    Evaluacion,
+    EvaluacionPersonalizada,
+    OpcionRespuesta,
+    PreguntaNOM035,
+    RespuestaEvaluacion,
+    TipoEvaluacion,
+    TrabajoReporte,
+)
+from .acceso import COOKIE as COOKIE_ACCESO, generar_token, leer_token
+from .agregados import CAMPOS_NIVEL, reconstruir_agregados
+from .alta_masiva import dar_de_alta
+from .analitica import analisis_cuestionario, cargar_matriz
+from .borradores import guardar_borrador, leer_borrador, vaciar_borrador, vaciar_pendientes
+from .correos import atender_bandeja, encolar_correos
+from .exportacion import filas_resultados
+from .prerenderizado import prerenderizar
+from .puntuacion import (
+    CRITERIOS_ACCION, finalizar_evaluacion, guardar_puntuaciones, puntuar, resumen_evaluacion, retirar_evaluacion,
+)
+from .reportes import MAX_INTENTOS as MAX_INTENTOS_REPORTE, atender_cola, procesar_trabajo, reclamar_trabajo
+
+
+MODELOS_ADMIN = [
+    'cuestionarionom035',
+    'dominionom035',
+    'preguntanom035',
+    'opcionrespuesta',
+    'evaluacion',
+    'respuestaevaluacion',
+    'tipoevaluacion',
+    'evaluacionpersonalizada',
+    'agregadodominio',
+]
+
+
+class CuestionarioCompiladoTests(TestCase):
+    TABLAS = ['cuestionarionom035', 'dominionom035', 'preguntanom035', 'opcionrespuesta']
+
+    def setUp(self):
+        caches['default'].clear()
+        self.usuario = User.objects.create(username='evaluado')
+        cuestionario = CuestionarioNOM035.objects.create(nombre='C', version='1', descripcion='', creado_por=self.usuario)
+        dominio = DominioNOM035.objects.create(cuestionario=cuestionario, nombre='D', descripcion='', orden=1)
+        self.pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto='P', tipo='likert', orden=1)
+        self.opcion = OpcionRespuesta.objects.create(pregunta=self.pregunta, texto='Nunca', valor=0, orden=0)
+        Evaluacion.objects.create(cuestionario=cuestionario, evaluado=self.usuario, evaluador=self.usuario)
+        self.client.force_login(self.usuario)
+
+    def preguntas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('evaluaciones:obtener_preguntas'))
+        self.assertEqual(respuesta.status_code, 200)
+        sql = ' '.join(consulta['sql'] for consulta in consultas)
+        return respuesta.json()['preguntas'], [tabla for tabla in self.TABLAS if f'evaluaciones_{tabla}' in sql]
+
+    def test_sin_consultas_al_cuestionario_tras_calentar(self):
+        _, tablas = self.preguntas()
+        self.assertEqual(tablas, self.TABLAS)
+        _, tablas = self.preguntas()
+        self.assertEqual(tablas, [])
+
+    def test_cambios_visibles_tras_el_commit(self):
+        self.preguntas()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pregunta.texto = 'Pregunta editada'
+            self.pregunta.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.opcion.texto = 'Siempre'
+            self.opcion.save()
+        (pregunta,), tablas = self.preguntas()
+        self.assertEqual(tablas, self.TABLAS)
+        self.assertEqual(pregunta['texto'], 'Pregunta editada')
+        self.assertEqual(pregunta['opciones'][0]['texto'], 'Siempre')
+
+        # Sin commit no se invalida: la recompilación no debe ver datos sin confirmar
+        with self.captureOnCommitCallbacks(execute=False):
+            OpcionRespuesta.objects.create(pregunta=self.pregunta, texto='A veces', valor=1, orden=1)
+        (pregunta,), _ = self.preguntas()
+        self.assertEqual(len(pregunta['opciones']), 1)
+
+
+class IngestaRespuestasTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.usuario = User.objects.create(username='evaluado')
+        self.cuestionario = CuestionarioNOM035.objects.create(
+            nombre='C', version='1', descripcion='', creado_por=self.usuario,
+        )
+        dominio = DominioNOM035.objects.create(cuestionario=self.cuestionario, nombre='D', descripcion='', orden=1)
+        self.opciones = {}
+        for orden in range(3):
+            pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto='P', tipo='likert', orden=orden)
+            self.opciones[pregunta.pk] = [
+                OpcionRespuesta.objects.create(pregunta=pregunta, texto=str(v), valor=v, orden=v).pk for v in range(3)
+            ]
+        self.evaluacion = Evaluacion.objects.create(
+            cuestionario=self.cuestionario, evaluado=self.usuario, evaluador=self.usuario,
+        )
+        self.client.force_login(self.usuario)
+
+    def enviar(self, respuestas, evaluacion=None):
+        return self.client.post(
+            reverse('evaluaciones:guardar_respuestas'),
+            json.dumps({'evaluacion': (evaluacion or self.evaluacion).pk, 'respuestas': respuestas}),
+            content_type='application/json',
+        )
+
+    def test_upsert_en_una_escritura(self):
+        lote = [{'pregunta': pregunta, 'opcion': opciones[0]} for pregunta, opciones in self.opciones.items()]
+        self.assertEqual(self.enviar(lote).json()['guardadas'], 3)
+
+        preguntas = list(self.opciones)
+        cambios = [
+            {'pregunta': preguntas[0], 'opcion': self.opciones[preguntas[0]][2]},
+            {'pregunta': preguntas[1], 'valor': 1},
+            {'pregunta': preguntas[1], 'valor': 2},  # Prevalece la última
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.enviar(cambios).json()['guardadas'], 2)
+        escrituras = [c['sql'] for c in consultas if 'evaluaciones_respuestaevaluacion' in c['sql']]
+        self.assertEqual(len(escrituras), 1)
+        self.assertIn('ON CONFLICT', escrituras[0])
+        self.assertEqual(
+            dict(RespuestaEvaluacion.objects.values_list('pregunta_id', 'puntuacion')),
+            {preguntas[0]: 2, preguntas[1]: 2, preguntas[2]: 0},
+        )
+        self.evaluacion.refresh_from_db()
+        self.assertEqual(self.evaluacion.estado, 'en_progreso')
+
+    def test_lote_invalido_no_escribe(self):
+        pregunta, opciones = next(iter(self.opciones.items()))
+        otra = next(o for p, lista in self.opciones.items() if p != pregunta for o in lista)
+        respuesta = self.enviar([{'pregunta': pregunta, 'opcion': opciones[0]}, {'pregunta': pregunta, 'opcion': otra}])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(RespuestaEvaluacion.objects.exists())
+
+    def test_varias_evaluaciones_abiertas(self):
+        otra = Evaluacion.objects.create(cuestionario=self.cuestionario, evaluado=self.usuario, evaluador=self.usuario)
+        pregunta = next(iter(self.opciones))
+        url = reverse('evaluaciones:guardar_progreso')
+        datos = {'respuestas': json.dumps({pregunta: 1})}
+        self.assertEqual(self.client.post(url, datos).status_code, 400)
+        self.assertEqual(self.client.get(reverse('evaluaciones:cargar_progreso')).status_code, 400)
+
+        self.assertTrue(self.client.post(f'{url}?evaluacion={otra.pk}', datos).json()['success'])
+        progreso = self.client.get(reverse('evaluaciones:cargar_progreso'), {'evaluacion': otra.pk}).json()
+        self.assertEqual(progreso['progreso']['respuestas'], {str(pregunta): 1})
+        progreso = self.client.get(reverse('evaluaciones:cargar_progreso'), {'evaluacion': self.evaluacion.pk}).json()
+        self.assertEqual(progreso['progreso']['respuestas'], {})
+
+
+# Dominios y número de ítems de las Guías de referencia III (72 ítems) y II (46 ítems)
+GUIA_III = [
+    ('Condiciones en el ambiente de trabajo', 5),
+    ('Carga de trabajo', 15),
+    ('Falta de control sobre el trabajo', 10),
+    ('Jornada de trabajo', 2),
+    ('Interferencia en la relación trabajo-familia', 4),
+    ('Liderazgo', 9),
+    ('Relaciones en el trabajo', 9),
+    ('Violencia', 8),
+    ('Reconocimiento del desempeño', 6),
+    ('Insuficiente sentido de pertenencia e, inestabilidad', 4),
+]
+
+GUIA_II = [
+    ('Condiciones en el ambiente de trabajo', 3),
+    ('Carga de trabajo', 13),
+    ('Falta de control sobre el trabajo', 7),
+    ('Jornada de trabajo', 2),
+    ('Interferencia en la relación trabajo-familia', 2),
+    ('Liderazgo', 5),
+    ('Relaciones en el trabajo', 6),
+    ('Violencia', 8),
+]
+
+
+class PuntuacionTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.usuario = User.objects.create(username='evaluado')
+
+    def guia(self, dominios):
+        """Cuestionario con opciones 0-4; devuelve (cuestionario, {dominio: [[opción por valor], ...]})"""
+        cuestionario = CuestionarioNOM035.objects.create(
+            nombre='Guía', version='1', descripcion='', creado_por=self.usuario,
+        )
+        opciones = {}
+        for orden, (nombre, items) in enumerate(dominios):
+            dominio = DominioNOM035.objects.create(cuestionario=cuestionario, nombre=nombre, descripcion='', orden=orden)
+            opciones[nombre] = []
+            for n in range(items):
+                pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto=f'{nombre} {n}', tipo='likert', orden=n)
+                opciones[nombre].append([
+                    OpcionRespuesta.objects.create(pregunta=pregunta, texto=str(v), valor=v, orden=v) for v in range(5)
+                ])
+        return cuestionario, opciones
+
+    def completada(self, cuestionario, opciones, sumas):
+        """Evaluación completada cuyas respuestas suman ``sumas[dominio]`` (0 en los demás)"""
+        evaluacion = Evaluacion.objects.create(
+            cuestionario=cuestionario, evaluado=self.usuario, evaluador=self.usuario,
+            estado='completada', fecha_completado=timezone.now(),
+        )
+        respuestas = []
+        for nombre, preguntas in opciones.items():
+            restante = sumas.get(nombre, 0)
+            for por_valor in preguntas:
+                valor = min(4, restante)
+                restante -= valor
+                respuestas.append(RespuestaEvaluacion(
+                    evaluacion=evaluacion, pregunta=por_valor[valor].pregunta, opcion_seleccionada=por_valor[valor],
+                ))
+            self.assertEqual(restante, 0)
+        RespuestaEvaluacion.objects.bulk_create(respuestas)
+        return evaluacion
+
+    def repartir(self, total, dominios):
+        """Sumas por dominio que llenan los dominios en orden hasta ``total``"""
+        sumas = {}
+        for nombre, items in dominios:
+            sumas[nombre] = min(total, items * 4)
+            total -= sumas[nombre]
+        return sumas
+
+    def niveles(self, resumen):
+        return (
+            resumen['nivel'],
+            {dominio['nombre']: dominio['nivel'] for dominio in resumen['dominios'] if dominio['calificacion']},
+            {categoria['nombre']: categoria['nivel'] for categoria in resumen['categorias']},
+        )
+
+    def test_guia_iii(self):
+        cuestionario, opciones = self.guia(GUIA_III)
+        sumas = {
+            'Condiciones en el ambiente de trabajo': 9,
+            'Carga de trabajo': 14,
+            'Falta de control sobre el trabajo': 25,
+            'Jornada de trabajo': 2,
+            'Liderazgo': 12,
+            'Relaciones en el trabajo': 10,
+            'Violencia': 16,
+            'Insuficiente sentido de pertenencia e, inestabilidad': 4,
+        }
+        evaluacion = self.completada(cuestionario, opciones, sumas)
+        # Calificación final en los límites de cada nivel: C < 50, 50 ≤ C < 75, ..., C ≥ 140
+        limites = {
+            total: self.completada(cuestionario, opciones, self.repartir(total, GUIA_III))
+            for total in (49, 50, 74, 75, 98, 99, 139, 140)
+        }
+        resultados = puntuar([evaluacion.pk, *[e.pk for e in limites.values()]])
+
+        resumen = resumen_evaluacion(resultados, evaluacion.pk)
+        self.assertEqual(resumen['calificacion_final'], 92)
+        self.assertEqual(self.niveles(resumen), ('medio', {
+            'Condiciones en el ambiente de trabajo': 'medio',
+            'Carga de trabajo': 'nulo',
+            'Falta de control sobre el trabajo': 'muy_alto',
+            'Jornada de trabajo': 'medio',
+            'Liderazgo': 'medio',
+            'Relaciones en el trabajo': 'bajo',
+            'Violencia': 'muy_alto',
+            'Insuficiente sentido de pertenencia e, inestabilidad': 'bajo',
+        }, {
+            'Ambiente de trabajo': 'medio',
+            'Factores propios de la actividad': 'medio',
+            'Organización del tiempo de trabajo': 'nulo',
+            'Liderazgo y relaciones en el trabajo': 'medio',
+            'Entorno organizacional': 'nulo',
+        }))
+        self.assertEqual(resumen['nivel_riesgo'], 'Medio')
+        self.assertEqual(resumen['recomendaciones'], [CRITERIOS_ACCION['medio']])
+        self.assertEqual(resumen['puntuacion_general'], round(92 * 100 / 288, 1))
+
+        niveles = {total: resumen_evaluacion(resultados, e.pk)['nivel'] for total, e in limites.items()}
+        self.assertEqual(niveles, {
+            49: 'nulo', 50: 'bajo', 74: 'bajo', 75: 'medio', 98: 'medio', 99: 'alto', 139: 'alto', 140: 'muy_alto',
+        })
+
+    def test_guia_ii(self):
+        cuestionario, opciones = self.guia(GUIA_II)
+        sumas = {'Carga de trabajo': 24, 'Liderazgo': 5, 'Violencia': 16}
+        evaluacion = self.completada(cuestionario, opciones, sumas)
+        limites = {
+            total: self.completada(cuestionario, opciones, self.repartir(total, GUIA_II))
+            for total in (19, 20, 44, 45, 69, 70, 89, 90)
+        }
+        resultados = puntuar([evaluacion.pk, *[e.pk for e in limites.values()]])
+
+        resumen = resumen_evaluacion(resultados, evaluacion.pk)
+        self.assertEqual(self.niveles(resumen), ('medio', {
+            'Carga de trabajo': 'muy_alto',
+            'Liderazgo': 'medio',
+            'Violencia': 'muy_alto',
+        }, {
+            'Ambiente de trabajo': 'nulo',
+            'Factores propios de la actividad': 'medio',
+            'Organización del tiempo de trabajo': 'nulo',
+            'Liderazgo y relaciones en el trabajo': 'medio',
+        }))
+        niveles = {total: resumen_evaluacion(resultados, e.pk)['nivel'] for total, e in limites.items()}
+        self.assertEqual(niveles, {
+            19: 'nulo', 20: 'bajo', 44: 'bajo', 45: 'medio', 69: 'medio', 70: 'alto', 89: 'alto', 90: 'muy_alto',
+        })
+
+    def test_cuestionario_sin_puntos_de_corte(self):
+        cuestionario, opciones = self.guia([('Dominio propio', 3)])
+        evaluacion = self.completada(cuestionario, opciones, {'Dominio propio': 7})
+        resumen = resumen_evaluacion(puntuar([evaluacion.pk]), evaluacion.pk)
+        self.assertEqual((resumen['calificacion_final'], resumen['nivel'], resumen['nivel_riesgo']), (7, None, 'Sin clasificar'))
+        self.assertEqual(resumen['dominios'][0]['nivel'], None)
+
+    def test_finalizar_exige_las_obligatorias(self):
+        cuestionario, opciones = self.guia([('Liderazgo', 3)])
+        evaluacion = Evaluacion.objects.create(cuestionario=cuestionario, evaluado=self.usuario, evaluador=self.usuario)
+        self.client.force_login(self.usuario)
+        preguntas = [por_valor[0].pregunta_id for por_valor in opciones['Liderazgo']]
+        finalizar = reverse('evaluaciones:finalizar_evaluacion')
+
+        respuesta = self.client.post(finalizar, {'respuestas': '{}'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['pendientes'], preguntas)
+        respuesta = self.client.post(finalizar, {'respuestas': json.dumps({preguntas[0]: 4, preguntas[2]: 1})})
+        self.assertEqual(respuesta.json()['pendientes'], [preguntas[1]])
+        evaluacion.refresh_from_db()
+        self.assertEqual(evaluacion.estado, 'en_progreso')
+        self.assertFalse(AgregadoDominio.objects.exists())
+
+        pregunta = PreguntaNOM035.objects.get(pk=preguntas[1])
+        pregunta.obligatoria = False
+        with self.captureOnCommitCallbacks(execute=True):
+            pregunta.save()
+        respuesta = self.client.post(finalizar, {'respuestas': '{}'})
+        self.assertEqual(respuesta.json()['resultados']['calificacion_final'], 5)
+
+    def agregados(self):
+        return sorted(AgregadoDominio.objects.values_list(
+            'dominio_id', 'periodo', 'conteo', 'suma', 'suma_cuadrados', *CAMPOS_NIVEL,
+        ), key=lambda fila: (fila[0] or 0, fila[1]))
+
+    def abierta(self, cuestionario, opciones, sumas):
+        evaluacion = self.completada(cuestionario, opciones, sumas)
+        Evaluacion.objects.filter(pk=evaluacion.pk).update(estado='en_progreso', fecha_completado=None)
+        evaluacion.refresh_from_db()
+        return evaluacion
+
+    def test_finalizar_suma_una_sola_vez(self):
+        cuestionario, opciones = self.guia(GUIA_III)
+        evaluacion = self.abierta(cuestionario, opciones, self.repartir(80, GUIA_III))
+        duplicada = Evaluacion.objects.get(pk=evaluacion.pk)
+        finalizar_evaluacion(evaluacion)
+        # Una segunda solicitud con la evaluación leída antes de completarse no vuelve a sumar
+        finalizar_evaluacion(duplicada)
+        self.assertEqual(duplicada.estado, 'completada')
+
+        total = AgregadoDominio.objects.get(dominio__isnull=True)
+        self.assertEqual((total.conteo, total.suma, total.nivel_medio), (1, 80, 1))
+        acumulados = self.agregados()
+        reconstruir_agregados()
+        self.assertEqual(self.agregados(), acumulados)
+
+    def test_reabrir_y_borrar_descuentan(self):
+        cuestionario, opciones = self.guia(GUIA_III)
+        evaluaciones = [
+            self.abierta(cuestionario, opciones, self.repartir(total, GUIA_III)) for total in (40, 80, 120)
+        ]
+        for evaluacion in evaluaciones:
+            finalizar_evaluacion(evaluacion)
+
+        self.assertTrue(retirar_evaluacion(evaluaciones[0]))
+        self.assertFalse(retirar_evaluacion(Evaluacion.objects.get(pk=evaluaciones[0].pk)))
+        evaluaciones[1].delete()
+        Evaluacion.objects.filter(pk=evaluaciones[2].pk).delete()
+        # Borrar una evaluación abierta no toca los agregados
+        Evaluacion.objects.filter(pk=evaluaciones[0].pk).delete()
+
+        total = AgregadoDominio.objects.get(dominio__isnull=True)
+        self.assertEqual((total.conteo, total.suma, total.suma_cuadrados), (0, 0, 0))
+        self.assertEqual(sum(total.histograma.values()), 0)
+        self.assertFalse(AgregadoDominio.objects.exclude(conteo=0).exists())
+
+    def test_cambios_de_estado_desde_el_admin(self):
+        cuestionario, opciones = self.guia([('Liderazgo', 3)])
+        evaluacion = self.abierta(cuestionario, opciones, {'Liderazgo': 6})
+        admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        url = reverse('admin:evaluaciones_evaluacion_change', args=[evaluacion.pk])
+        formulario = self.client.get(url).context['adminform'].form
+        datos = {campo: valor for campo, valor in formulario.initial.items() if campo in formulario.fields and valor is not None}
+        datos.update({
+            'respuestaevaluacion_set-TOTAL_FORMS': 0, 'respuestaevaluacion_set-INITIAL_FORMS': 0,
+            'respuestaevaluacion_set-MIN_NUM_FORMS': 0, 'respuestaevaluacion_set-MAX_NUM_FORMS': 1000,
+        })
+
+        for estado, conteo in [('completada', 1), ('en_progreso', 0), ('completada', 1)]:
+            self.assertEqual(self.client.post(url, {**datos, 'estado': estado}).status_code, 302)
+            evaluacion.refresh_from_db()
+            self.assertEqual(evaluacion.estado, estado)
+            self.assertEqual(AgregadoDominio.objects.get(dominio__isnull=True).conteo, conteo)
+        self.assertEqual(evaluacion.puntuacion_total, 6)
+
+    def test_resumen_en_el_admin(self):
+        cuestionario, opciones = self.guia([('Liderazgo', 3), ('Violencia', 2)])
+        for sumas in ({'Liderazgo': 2, 'Violencia': 8}, {'Liderazgo': 6, 'Violencia': 0}):
+            finalizar_evaluacion(self.abierta(cuestionario, opciones, sumas))
+        admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        url = reverse('admin:evaluaciones_evaluacion_changelist')
+        self.assertNotIn('resumen_agregados', self.client.get(url).context)
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, {'cuestionario__id__exact': cuestionario.pk})
+        # Los agregados sustituyen a recorrer las respuestas
+        self.assertFalse([c for c in consultas if 'evaluaciones_respuestaevaluacion' in c['sql']])
+        resumen = {fila['dominio']: fila for fila in respuesta.context['resumen_agregados']}
+        self.assertEqual(list(resumen), ['Liderazgo', 'Violencia', 'Total'])
+        self.assertEqual((resumen['Liderazgo']['conteo'], resumen['Liderazgo']['media']), (2, 4))
+        self.assertEqual(resumen['Total']['media'], 8)
+        self.assertAlmostEqual(resumen['Violencia']['desviacion'], np.std([8, 0], ddof=1))
+        self.assertContains(respuesta, 'Resultados de las evaluaciones completadas del cuestionario')
+
+    def test_recalcular_reconstruye_los_agregados(self):
+        cuestionario, opciones = self.guia([('Liderazgo', 3)])
+        evaluacion = self.completada(cuestionario, opciones, {'Liderazgo': 6})
+        reconstruir_agregados()
+        with self.captureOnCommitCallbacks(execute=True):
+            for por_valor in opciones['Liderazgo']:
+                for opcion in por_valor:
+                    opcion.valor *= 2
+                    opcion.save()
+        call_command('recalcular_puntuaciones', cuestionario=cuestionario.pk, stdout=io.StringIO())
+
+        evaluacion.refresh_from_db()
+        self.assertEqual(evaluacion.puntuacion_total, 12)
+        self.assertEqual(
+            AgregadoDominio.objects.get(cuestionario=cuestionario, dominio__isnull=True).suma, 12,
+        )
+
+
+class ExportacionTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.cuestionario = CuestionarioNOM035.objects.create(
+            nombre='C', version='1', descripcion='', creado_por=self.admin,
+        )
+        dominio = DominioNOM035.objects.create(cuestionario=self.cuestionario, nombre='D', descripcion='', orden=1)
+        self.preguntas = [
+            PreguntaNOM035.objects.create(dominio=dominio, texto='P', tipo=tipo, orden=orden)
+            for orden, tipo in enumerate(['likert', 'likert', 'abierta'])
+        ]
+        self.opciones = [
+            [OpcionRespuesta.objects.create(pregunta=pregunta, texto=str(v), valor=v, orden=v) for v in range(3)]
+            for pregunta in self.preguntas[:2]
+        ]
+        evaluados = [User.objects.create(username=f'evaluado{n}') for n in range(3)]
+        self.evaluaciones = [
+            Evaluacion.objects.create(cuestionario=self.cuestionario, evaluado=evaluado, evaluador=self.admin)
+            for evaluado in evaluados
+        ]
+        # La segunda evaluación no tiene respuestas; la tercera solo una
+        RespuestaEvaluacion.objects.bulk_create([
+            RespuestaEvaluacion(evaluacion=self.evaluaciones[0], pregunta=self.preguntas[0], opcion_seleccionada=self.opciones[0][2]),
+            RespuestaEvaluacion(evaluacion=self.evaluaciones[0], pregunta=self.preguntas[1], opcion_seleccionada=self.opciones[1][0]),
+            RespuestaEvaluacion(evaluacion=self.evaluaciones[0], pregunta=self.preguntas[2], respuesta_texto='Turnos <largos> & pesados'),
+            RespuestaEvaluacion(evaluacion=self.evaluaciones[2], pregunta=self.preguntas[1], opcion_seleccionada=self.opciones[1][1]),
+        ])
+        self.esperadas = [
+            ['evaluacion', 'usuario', 'estado', 'fecha_completado', 'puntuacion_total', 'P1', 'P2', 'P3'],
+            [self.evaluaciones[0].pk, 'evaluado0', 'iniciada', None, None, 2, 0, 'Turnos <largos> & pesados'],
+            [self.evaluaciones[1].pk, 'evaluado1', 'iniciada', None, None, None, None, None],
+            [self.evaluaciones[2].pk, 'evaluado2', 'iniciada', None, None, None, 1, None],
+        ]
+        self.client.force_login(self.admin)
+
+    def descargar(self, formato, **parametros):
+        return self.client.get(
+            reverse('evaluaciones:exportar_resultados'),
+            {'cuestionario': self.cuestionario.pk, 'formato': formato, **parametros},
+        )
+
+    def test_filas_incluyen_evaluaciones_sin_respuestas(self):
+        evaluaciones = Evaluacion.objects.filter(cuestionario=self.cuestionario)
+        self.assertEqual(list(filas_resultados(evaluaciones, self.cuestionario.pk, tamano_lote=1)), self.esperadas)
+        solo_una = evaluaciones.filter(pk=self.evaluaciones[2].pk)
+        self.assertEqual(list(filas_resultados(solo_una, self.cuestionario.pk)), [self.esperadas[0], self.esperadas[3]])
+
+    def test_csv(self):
+        respuesta = self.descargar('csv')
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8')
+        self.assertTrue(contenido.startswith('\ufeff'))
+        filas = list(csv.reader(io.StringIO(contenido[1:])))
+        self.assertEqual(filas, [['' if v is None else str(v) for v in fila] for fila in self.esperadas])
+
+    def test_xlsx(self):
+        respuesta = self.descargar('xlsx')
+        with zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content))) as libro:
+            self.assertIsNone(libro.testzip())
+            hoja = libro.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        filas = re.findall(r'<row>(.*?)</row>', hoja)
+        self.assertEqual(len(filas), 4)
+        self.assertIn('<c t="inlineStr"><is><t>Turnos &lt;largos&gt; &amp; pesados</t></is></c>', filas[1])
+        self.assertEqual(filas[2].count('<c/>'), 5)
+        self.assertIn('<c><v>1</v></c>', filas[3])
+
+    def test_cuestionario_inexistente(self):
+        respuesta = self.client.get(reverse('evaluaciones:exportar_resultados'), {'cuestionario': 999})
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertEqual(self.client.get(reverse('evaluaciones:exportar_resultados'), {'cuestionario': 'x'}).status_code, 400)
+
+
+class ReportesTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.usuario = User.objects.create(username='evaluado')
+        cuestionario = CuestionarioNOM035.objects.create(nombre='C', version='1', descripcion='', creado_por=self.usuario)
+        dominio = DominioNOM035.objects.create(cuestionario=cuestionario, nombre='Liderazgo', descripcion='', orden=1)
+        pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto='P', tipo='likert', orden=1)
+        opcion = OpcionRespuesta.objects.create(pregunta=pregunta, texto='Siempre', valor=4, orden=4)
+        self.evaluacion = Evaluacion.objects.create(cuestionario=cuestionario, evaluado=self.usuario, evaluador=self.usuario)
+        RespuestaEvaluacion.objects.create(evaluacion=self.evaluacion, pregunta=pregunta, opcion_seleccionada=opcion)
+        finalizar_evaluacion(self.evaluacion)
+        self.client.force_login(self.usuario)
+
+    def descargar(self):
+        return self.client.get(reverse('evaluaciones:descargar_reporte'), {'id': self.evaluacion.pk})
+
+    def test_encolar_reclamar_y_servir(self):
+        respuesta = self.descargar()
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(self.descargar().json()['trabajo'], respuesta.json()['trabajo'])
+
+        trabajo = reclamar_trabajo()
+        self.assertEqual((trabajo.pk, trabajo.estado, trabajo.intentos), (respuesta.json()['trabajo'], 'procesando', 1))
+        self.assertIsNone(reclamar_trabajo())
+        self.assertTrue(procesar_trabajo(trabajo))
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+        self.evaluacion.refresh_from_db()
+        self.assertEqual(self.evaluacion.hash_reporte, trabajo.hash_contenido)
+
+        # La descarga se sirve desde disco sin volver a calificar
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.descargar()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['ETag'], f'"{trabajo.hash_contenido}"')
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+        self.assertNotIn('evaluaciones_respuestaevaluacion', ' '.join(c['sql'] for c in consultas))
+
+        # Al recalificar el reporte vuelve a generarse
+        guardar_puntuaciones(puntuar([self.evaluacion.pk]))
+        self.assertEqual(self.descargar().status_code, 202)
+
+    def test_reintentos(self):
+        self.descargar()
+        with (
+            mock.patch('evaluaciones.reportes.renderizar_pdf', side_effect=RuntimeError('sin fuentes')),
+            self.assertLogs('evaluaciones.reportes', 'ERROR') as registro,
+        ):
+            for intento in range(1, MAX_INTENTOS_REPORTE + 1):
+                trabajo = reclamar_trabajo()
+                self.assertEqual(trabajo.intentos, intento)
+                self.assertFalse(procesar_trabajo(trabajo))
+        self.assertEqual(
+            [(r.getMessage(), r.exc_info[1].args) for r in registro.records],
+            [(f'Error al generar el reporte {trabajo.pk}', ('sin fuentes',))] * MAX_INTENTOS_REPORTE,
+        )
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.error), ('error', 'sin fuentes'))
+        self.assertIsNone(reclamar_trabajo())
+        self.evaluacion.refresh_from_db()
+        self.assertEqual(self.evaluacion.hash_reporte, '')
+
+    def test_trabajos_abandonados(self):
+        self.descargar()
+        trabajo = reclamar_trabajo()
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(fecha_inicio=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('evaluaciones.reportes', 'WARNING') as registro:
+            self.assertEqual(atender_cola(una_vez=True), 1)
+        self.assertEqual(registro.output, ['WARNING:evaluaciones.reportes:1 trabajos abandonados devueltos a la cola'])
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('completado', 2))
+
+
+class BenchmarkIndicesTests(TestCase):
+    def test_exige_base_de_prueba_sin_debug(self):
+        with self.assertRaisesMessage(CommandError, '--base-de-prueba'):
+            call_command('benchmark_indices', '--limpiar')
+        call_command('benchmark_indices', '--limpiar', '--base-de-prueba', stdout=io.StringIO())
+
+
+class AdminEvaluacionesConstantesTests(TestCase):
+    """El número de consultas de cada changelist no debe depender del número de filas"""
+
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        self.creadas = 0
+
+    def _crear(self, total):
+        """Lleva cada modelo a ``total`` filas"""
+        nuevas = range(self.creadas, total)
+        self.creadas = total
+        cuestionarios = CuestionarioNOM035.objects.bulk_create([
+            CuestionarioNOM035(nombre=f'C{n}', version='1', descripcion='', creado_por=self.admin) for n in nuevas
+        ])
+        dominios = DominioNOM035.objects.bulk_create([
+            DominioNOM035(cuestionario=cuestionario, nombre=f'D{n}', descripcion='', orden=n)
+            for n, cuestionario in zip(nuevas, cuestionarios)
+        ])
+        preguntas = PreguntaNOM035.objects.bulk_create([
+            PreguntaNOM035(dominio=dominio, texto=f'P{n}', tipo='likert', orden=n)
+            for n, dominio in zip(nuevas, dominios)
+        ])
+        opciones = OpcionRespuesta.objects.bulk_create([
+            OpcionRespuesta(pregunta=pregunta, texto=str(valor), valor=valor, orden=valor)
+            for pregunta in preguntas for valor in range(2)
+        ])
+        evaluados = User.objects.bulk_create([User(username=f'evaluado{n}', first_name='E') for n in nuevas])
+        evaluaciones = Evaluacion.objects.bulk_create([
+            Evaluacion(cuestionario=cuestionario, evaluado=evaluado, evaluador=self.admin, estado='completada')
+            for cuestionario, evaluado in zip(cuestionarios, evaluados)
+        ])
+        RespuestaEvaluacion.objects.bulk_create([
+            RespuestaEvaluacion(evaluacion=evaluacion, pregunta=pregunta, opcion_seleccionada=opcion, puntuacion=0)
+            for evaluacion, pregunta, opcion in zip(evaluaciones, preguntas, opciones[::2])
+        ])
+        tipos = TipoEvaluacion.objects.bulk_create([
+            TipoEvaluacion(nombre=f'T{n}', descripcion='', duracion_minutos=60) for n in nuevas
+        ])
+        EvaluacionPersonalizada.objects.bulk_create([
+            EvaluacionPersonalizada(
+                tipo_evaluacion=tipo, cliente=evaluado, nombre_proyecto=f'Proyecto {n}', descripcion='',
+                fecha_entrega_estimada=timezone.now() + timedelta(days=30),
+            )
+            for n, tipo, evaluado in zip(nuevas, tipos, evaluados)
+        ])
+        AgregadoDominio.objects.bulk_create([
+            AgregadoDominio(cuestionario=cuestionario, dominio=dominio, periodo=date(2024, 1, 1), conteo=1, suma=10)
+            for cuestionario, dominio in zip(cuestionarios, dominios)
+        ])
+
+    def _consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def test_changelists(self):
+        urls = {modelo: reverse(f'admin:evaluaciones_{modelo}_changelist') for modelo in MODELOS_ADMIN}
+        self._crear(10)
+        self.client.get(reverse('admin:index'))  # Calienta la caché del usuario de la sesión
+        con_10 = {modelo: self._consultas(url) for modelo, url in urls.items()}
+        self._crear(500)
+        for modelo, url in urls.items():
+            with self.subTest(modelo=modelo):
+                self.assertEqual(self._consultas(url), con_10[modelo])
+
+    def test_inline_de_respuestas(self):
+        self._crear(1)
+        cuestionario = CuestionarioNOM035.objects.get()
+        dominio = DominioNOM035.objects.get()
+        preguntas = PreguntaNOM035.objects.bulk_create([
+            PreguntaNOM035(dominio=dominio, texto=f'Extra {n}', tipo='likert', orden=n + 1) for n in range(72)
+        ])
+        opciones = OpcionRespuesta.objects.bulk_create([
+            OpcionRespuesta(pregunta=pregunta, texto=str(valor), valor=valor, orden=valor)
+            for pregunta in preguntas for valor in range(5)
+        ])
+        evaluacion = Evaluacion.objects.get(cuestionario=cuestionario)
+        url = reverse('admin:evaluaciones_evaluacion_change', args=[evaluacion.pk])
+
+        RespuestaEvaluacion.objects.bulk_create([
+            RespuestaEvaluacion(evaluacion=evaluacion, pregunta=pregunta, opcion_seleccionada=opciones[n * 5])
+            for n, pregunta in enumerate(preguntas[:9])
+        ])
+        self.client.get(url)  # Calienta la caché de ContentType
+        con_10 = self._consultas(url)
+        RespuestaEvaluacion.objects.bulk_create([
+            RespuestaEvaluacion(evaluacion=evaluacion, pregunta=pregunta, opcion_seleccionada=opciones[(n + 9) * 5])
+            for n, pregunta in enumerate(preguntas[9:])
+        ])
+        self.assertEqual(self._consultas(url), con_10)
+
+
+class CacheAnonimoTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+
+    def test_paginas_publicas_sin_consultas(self):
+        for nombre in ['home', 'servicios', 'nosotros', 'contacto']:
+            url = reverse(f'evaluaciones:{nombre}')
+            self.client.get(url)
+            with self.subTest(pagina=nombre), CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url, {'utm_source': 'campana'})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(len(consultas), 0)
+
+    def test_token_csrf_por_visitante(self):
+        tokens = []
+        for _ in range(2):
+            cliente = Client(enforce_csrf_checks=True)
+            respuesta = cliente.get(reverse('evaluaciones:contacto'))
+            token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', respuesta.content.decode()).group(1)
+            respuesta = cliente.post(reverse('evaluaciones:login'), {'csrfmiddlewaretoken': token})
+            self.assertNotEqual(respuesta.status_code, 403)
+            tokens.append(token)
+        self.assertNotEqual(tokens[0], tokens[1])
+
+    def test_usuario_autenticado_no_recibe_la_pagina_anonima(self):
+        self.client.get(reverse('evaluaciones:home'))
+        self.client.force_login(User.objects.create(username='usuario'))
+        self.assertContains(self.client.get(reverse('evaluaciones:home')), 'Cerrar Sesión')
+
+
+class PrerenderizadoTests(TestCase):
+    def test_paginas_y_manifiesto(self):
+        with tempfile.TemporaryDirectory() as raiz:
+            raiz = Path(raiz)
+            manifiesto = prerenderizar(raiz)
+            self.assertEqual(set(manifiesto['paginas']), {'/', '/servicios/', '/nosotros/', '/contacto/'})
+            self.assertEqual(json.loads((raiz / 'paginas' / 'manifest.json').read_text()), manifiesto)
+            for pagina in manifiesto['paginas'].values():
+                contenido = (raiz / pagina['archivo']).read_bytes()
+                self.assertEqual(gzip.decompress((raiz / pagina['gz']).read_bytes()), contenido)
+            contacto = (raiz / manifiesto['paginas']['/contacto/']['archivo']).read_text()
+            self.assertIn('name="csrfmiddlewaretoken" value=""', contacto)
+
+    def test_cifras_de_inicio_no_quedan_fijas(self):
+        with tempfile.TemporaryDirectory() as raiz:
+            manifiesto = prerenderizar(raiz)
+            inicio = (Path(raiz) / manifiesto['paginas']['/']['archivo']).read_text()
+        self.assertIn('data-estadistica="evaluaciones_realizadas"', inicio)
+        self.assertIn(reverse('evaluaciones:estadisticas'), inicio)
+
+        respuesta = self.client.get(reverse('evaluaciones:estadisticas'))
+        self.assertEqual(set(respuesta.json()), {'evaluaciones_realizadas', 'clientes_corporativos', 'tasa_exito'})
+        self.assertIn('max-age=60', respuesta['Cache-Control'])
+
+    def test_token_para_paginas_estaticas(self):
+        respuesta = self.client.get(reverse('evaluaciones:token_csrf'))
+        self.assertTrue(respuesta.json()['token'])
+        self.assertIn('csrftoken', respuesta.cookies)
+
+
+class ServidorEstaticosTests(TestCase):
+    def setUp(self):
+        self.raiz = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        (self.raiz / 'css').mkdir()
+        (self.raiz / 'css' / 'estilos.0123456789ab.css').write_text('.boton { color: red; }\n' * 100)
+        (self.raiz / 'robots.txt').write_text('User-agent: *\n')
+        comprimir(self.raiz / 'css' / 'estilos.0123456789ab.css')
+        self.servidor = ServidorEstaticos(lambda environ, start_response: [b'django'], self.raiz, '/static/')
+
+    def pedir(self, ruta, **encabezados):
+        respuesta = {}
+
+        def start_response(estado, lista):
+            respuesta['estado'], respuesta['encabezados'] = estado, dict(lista)
+
+        cuerpo = b''.join(self.servidor({'PATH_INFO': ruta, 'REQUEST_METHOD': 'GET', **encabezados}, start_response))
+        return respuesta.get('estado'), respuesta.get('encabezados', {}), cuerpo
+
+    def test_nombre_con_hash_es_inmutable_y_comprimido(self):
+        estado, encabezados, cuerpo = self.pedir('/static/css/estilos.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(estado, '200 OK')
+        self.assertEqual(encabezados['Cache-Control'], CACHE_INMUTABLE)
+        self.assertEqual(encabezados['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(cuerpo), (self.raiz / 'css' / 'estilos.0123456789ab.css').read_bytes())
+
+        estado, encabezados, cuerpo = self.pedir('/static/robots.txt')
+        self.assertEqual(encabezados['Cache-Control'], CACHE_SIN_HASH)
+        self.assertNotIn('Content-Encoding', encabezados)
+
+    def test_etag_y_rutas_ajenas(self):
+        _, encabezados, _ = self.pedir('/static/robots.txt')
+        estado, _, cuerpo = self.pedir('/static/robots.txt', HTTP_IF_NONE_MATCH=encabezados['ETag'])
+        self.assertEqual((estado, cuerpo), ('304 Not Modified', b''))
+        self.assertEqual(self.pedir('/static/../settings.py')[2], b'django')
+        self.assertEqual(self.pedir('/servicios/')[2], b'django')
+
+    def test_asgi(self):
+        async def django(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'django'})
+
+        servidor = ServidorEstaticosASGI(django, self.raiz, '/static/')
+
+        def pedir(ruta, **encabezados):
+            mensajes = []
+
+            async def send(mensaje):
+                mensajes.append(mensaje)
+
+            scope = {
+                'type': 'http', 'path': ruta, 'method': 'GET',
+                'headers': [(nombre.encode(), valor.encode()) for nombre, valor in encabezados.items()],
+            }
+            asyncio.run(servidor(scope, None, send))
+            cuerpo = b''.join(mensaje.get('body', b'') for mensaje in mensajes[1:])
+            return mensajes[0]['status'], dict(mensajes[0]['headers']), cuerpo
+
+        estado, encabezados, cuerpo = pedir('/static/css/estilos.0123456789ab.css', **{'accept-encoding': 'gzip'})
+        self.assertEqual((estado, encabezados[b'cache-control'], encabezados[b'content-encoding']),
+                         (200, CACHE_INMUTABLE.encode(), b'gzip'))
+        self.assertEqual(gzip.decompress(cuerpo), (self.raiz / 'css' / 'estilos.0123456789ab.css').read_bytes())
+        estado, _, cuerpo = pedir('/static/css/estilos.0123456789ab.css', **{'if-none-match': encabezados[b'etag'].decode()})
+        self.assertEqual((estado, cuerpo), (304, b''))
+        self.assertEqual(pedir('/servicios/')[2], b'django')
+
+
+class SesionesEnCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.usuario = User.objects.create_user(username='evaluado', password='clave-segura-1')
+        cuestionario = CuestionarioNOM035.objects.create(nombre='C', version='1', descripcion='', creado_por=self.usuario)
+        dominio = DominioNOM035.objects.create(cuestionario=cuestionario, nombre='D', descripcion='', orden=1)
+        self.pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto='P', tipo='likert', orden=1)
+        for valor in range(3):
+            OpcionRespuesta.objects.create(pregunta=self.pregunta, texto=str(valor), valor=valor, orden=valor)
+        Evaluacion.objects.create(
+            cuestionario=cuestionario, evaluado=self.usuario, evaluador=self.usuario, estado='en_progreso'
+        )
+        self.client.login(username='evaluado', password='clave-segura-1')
+
+    def autoguardar(self, valor):
+        return self.client.post(
+            reverse('evaluaciones:guardar_progreso'), {'respuestas': json.dumps({self.pregunta.pk: valor})}
+        )
+
+    def test_autoguardado_sin_leer_sesion_ni_usuario(self):
+        self.autoguardar(1)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.autoguardar(2).json()['success'], True)
+        tablas = ' '.join(consulta['sql'] for consulta in consultas)
+        self.assertNotIn('django_session', tablas)
+        self.assertNotIn('auth_user', tablas)
+
+    def test_cambios_del_usuario_invalidan_la_cache(self):
+        self.assertEqual(self.autoguardar(1).status_code, 200)
+        self.usuario.set_password('otra-clave-2')
+        self.usuario.save()
+        self.assertEqual(self.autoguardar(1).status_code, 302)
+
+        self.client.login(username='evaluado', password='otra-clave-2')
+        self.autoguardar(1)
+        grupo = Group.objects.create(name='Evaluados')
+        grupo.user_set.add(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            self.autoguardar(1)
+        self.assertIn('auth_user', ' '.join(consulta['sql'] for consulta in consultas))
+        self.autoguardar(1)
+        grupo.permissions.add(Permission.objects.first())
+        with CaptureQueriesContext(connection) as consultas:
+            self.autoguardar(1)
+        self.assertIn('auth_user', ' '.join(consulta['sql'] for consulta in consultas))
+
+    def test_escritura_diferida(self):
+        sesion = SessionStore()
+        sesion['paso'] = 1
+        sesion.save()
+        clave = sesion.session_key
+
+        with override_settings(SESION_ESCRITURA_DIFERIDA=300):
+            sesion = SessionStore(clave)
+            sesion['paso'] = 2
+            with self.assertNumQueries(0):
+                sesion.save()
+            self.assertEqual(Session.objects.get(pk=clave).get_decoded()['paso'], 1)
+            self.assertEqual(SessionStore(clave)['paso'], 2)
+
+        sesion = SessionStore(clave)
+        sesion['paso'] = 2
+        with self.assertNumQueries(0):
+            sesion.save()
+        sesion['paso'] = 3
+        sesion.save()
+        self.assertEqual(Session.objects.get(pk=clave).get_decoded()['paso'], 3)
+
+        caches['default'].clear()
+        self.assertEqual(SessionStore(clave)['paso'], 3)
+
+
+class ConfiguracionProduccionTests(SimpleTestCase):
+    def importar(self, valor='DB_POOL_MAX', **variables):
+        return subprocess.run(
+            [sys.executable, '-c', f'import psymetrics.settings_production as s; print(s.{valor})'],
+            env={**os.environ, 'DB_POOL': '1', **variables}, capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent.parent,
+        )
+
+    def test_pool_dentro_de_max_conexiones(self):
+        resultado = self.importar(WEB_CONCURRENCY='9', GUNICORN_THREADS='1', DB_MAX_CONEXIONES='90')
+        self.assertEqual(resultado.stdout.strip(), '10', resultado.stderr)
+        resultado = self.importar(WEB_CONCURRENCY='9', GUNICORN_THREADS='16', DB_MAX_CONEXIONES='90')
+        self.assertNotEqual(resultado.returncode, 0)
+        self.assertIn('ImproperlyConfigured', resultado.stderr)
+
+    def test_conexiones_persistentes_solo_con_wsgi(self):
+        valor = "DATABASES['default']['CONN_MAX_AGE']"
+        for clase, esperado in [('uvicorn_worker.UvicornWorker', '0'), ('gthread', '600'), ('sync', '600')]:
+            resultado = self.importar(valor, DB_POOL='0', GUNICORN_WORKER_CLASS=clase)
+            self.assertEqual(resultado.stdout.strip(), esperado, resultado.stderr)
+        # Con el pool, bajo ASGI las conexiones se reutilizan desde el pool
+        resultado = self.importar("DATABASES['default']['OPTIONS']['pool']['max_size']",
+                                  GUNICORN_WORKER_CLASS='uvicorn_worker.UvicornWorker', WEB_CONCURRENCY='9')
+        self.assertEqual(resultado.stdout.strip(), '10', resultado.stderr)
+
+
+class ReplicaTests(TestCase):
+    """Réplica atrasada: una base SQLite aparte que no recibe lo escrito en default"""
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        # En settings.py la réplica de pruebas es un espejo de default; aquí se vuelve una base aparte
+        directorio = cls.enterClassContext(tempfile.TemporaryDirectory())
+        ajustes = connections.settings[replicas.ALIAS]
+        cls.addClassCleanup(ajustes.update, {'NAME': ajustes['NAME'], 'TEST': ajustes['TEST']})
+        cls.addClassCleanup(connections[replicas.ALIAS].close)
+        connections[replicas.ALIAS].close()
+        ajustes.update(NAME=str(Path(directorio, 'replica.sqlite3')), TEST={**ajustes['TEST'], 'MIRROR': None})
+        call_command('migrate', database=replicas.ALIAS, verbosity=0)
+        super().setUpClass()
+
+    def setUp(self):
+        caches['default'].clear()
+        self.usuario = User.objects.create_user(username='evaluado', password='clave-segura-1', is_staff=True,
+                                                is_superuser=True)
+        cuestionario = CuestionarioNOM035.objects.create(nombre='C', version='1', descripcion='', creado_por=self.usuario)
+        dominio = DominioNOM035.objects.create(cuestionario=cuestionario, nombre='D', descripcion='', orden=1)
+        self.pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto='P', tipo='likert', orden=1)
+        OpcionRespuesta.objects.create(pregunta=self.pregunta, texto='1', valor=1, orden=1)
+        Evaluacion.objects.create(
+            cuestionario=cuestionario, evaluado=self.usuario, evaluador=self.usuario, estado='en_progreso'
+        )
+        self.client.force_login(self.usuario)
+
+    def test_lecturas_dentro_del_contexto(self):
+        self.assertTrue(Evaluacion.objects.exists())
+        with replicas.usar_replica():
+            self.assertFalse(Evaluacion.objects.exists())
+            Evaluacion.objects.update(estado='iniciada')
+        self.assertTrue(Evaluacion.objects.filter(estado='iniciada').exists())
+
+    @override_settings(BORRADOR_MAX_RESPUESTAS=1)
+    def test_lee_lo_que_escribio(self):
+        listado = reverse('admin:evaluaciones_evaluacion_changelist')
+        self.assertEqual(self.client.get(listado).context_data['cl'].result_count, 0)
+
+        respuesta = self.client.get(listado)
+        self.assertNotIn(replicas.COOKIE, respuesta.cookies)
+        respuesta = self.client.post(
+            reverse('evaluaciones:guardar_progreso'), {'respuestas': json.dumps({self.pregunta.pk: 1})}
+        )
+        self.assertEqual(respuesta.cookies[replicas.COOKIE]['max-age'], 5)
+        self.assertEqual(self.client.get(listado).context_data['cl'].result_count, 1)
+
+
+class AltaMasivaTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.cuestionario = CuestionarioNOM035.objects.create(
+            nombre='C', version='1', descripcion='', creado_por=self.admin, estado='activo'
+        )
+        # Guardado antes de normalizar los correos: la comparación no distingue mayúsculas
+        User.objects.create(username='existente', email='Ya@Empresa.MX')
+
+    def csv(self, empleados, extra=''):
+        filas = ''.join(f'Empleado {n},Pérez,Empleado{n}@Empresa.mx\n' for n in range(empleados))
+        return io.StringIO('nombre,apellidos,email\n' + filas + extra)
+
+    def test_alta_por_lotes(self):
+        extra = 'Repetido,X,empleado0@empresa.mx\nOtro,X,ya@empresa.mx\nMalo,X,sin-arroba\n'
+        resumen = dar_de_alta(self.csv(5, extra), self.cuestionario, self.admin, tamano_lote=2)
+        self.assertEqual(
+            (resumen.creadas, resumen.repetidas, resumen.existentes, resumen.invalidas), (5, 1, 1, 1)
+        )
+        self.assertEqual(resumen.errores, ["Línea 9: correo 'sin-arroba' inválido"])
+
+        usuario = User.objects.get(username='empleado3@empresa.mx')
+        self.assertEqual(usuario.first_name, 'Empleado 3')
+        self.assertFalse(usuario.has_usable_password())
+        evaluacion = usuario.evaluaciones_recibidas.get()
+        self.assertEqual((evaluacion.cuestionario, evaluacion.estado), (self.cuestionario, 'iniciada'))
+        token = next(acceso[3] for acceso in resumen.accesos if acceso[0] == usuario.username)
+        self.assertEqual(leer_token(token), (evaluacion.pk, usuario.pk))
+
+    def test_consultas_por_lote_constantes(self):
+        with CaptureQueriesContext(connection) as pocas:
+            dar_de_alta(self.csv(5), self.cuestionario, self.admin, tamano_lote=10)
+        User.objects.filter(email__startswith='empleado').delete()
+        with CaptureQueriesContext(connection) as muchas:
+            dar_de_alta(self.csv(80), self.cuestionario, self.admin, tamano_lote=500)
+        self.assertEqual(len(muchas), len(pocas))
+
+    def test_carga_desde_el_admin(self):
+        self.client.force_login(self.admin)
+        archivo = SimpleUploadedFile('plantilla.csv', self.csv(3).getvalue().encode('utf-8-sig'))
+        respuesta = self.client.post(
+            reverse('admin:evaluaciones_alta_masiva'), {'archivo': archivo, 'cuestionario': self.cuestionario.pk}
+        )
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(len(respuesta.content.decode().splitlines()), 4)
+        self.assertEqual(Evaluacion.objects.filter(cuestionario=self.cuestionario).count(), 3)
+
+
+class AccesoPorEnlaceTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.usuario = User.objects.create(username='empleado')
+        cuestionario = CuestionarioNOM035.objects.create(nombre='C', version='1', descripcion='', creado_por=self.usuario)
+        dominio = DominioNOM035.objects.create(cuestionario=cuestionario, nombre='D', descripcion='', orden=1)
+        self.pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto='P', tipo='likert', orden=1)
+        OpcionRespuesta.objects.create(pregunta=self.pregunta, texto='1', valor=1, orden=1)
+        self.evaluacion, self.otra = [
+            Evaluacion.objects.create(cuestionario=cuestionario, evaluado=self.usuario, evaluador=self.usuario)
+            for _ in range(2)
+        ]
+        self.enlace = reverse('evaluaciones:acceso', args=[generar_token(self.evaluacion.pk, self.usuario.pk)])
+
+    def test_enlace_limitado_a_su_evaluacion(self):
+        respuesta = self.client.get(self.enlace)
+        self.assertRedirects(respuesta, reverse('evaluaciones:evaluacion'))
+        self.assertTrue(respuesta.cookies[COOKIE_ACCESO]['httponly'])
+        self.assertFalse(Session.objects.exists())
+
+        progreso = reverse('evaluaciones:cargar_progreso')
+        self.assertEqual(self.client.get(progreso).json()['progreso']['respuestas'], {})
+        respuesta = self.client.post(
+            reverse('evaluaciones:guardar_progreso'),
+            {'evaluacion': self.otra.pk, 'respuestas': json.dumps({self.pregunta.pk: 1})},
+        )
+        self.assertEqual(respuesta.status_code, 404)
+        self.client.post(reverse('evaluaciones:guardar_progreso'), {'respuestas': json.dumps({self.pregunta.pk: 1})})
+        self.assertEqual(self.client.get(progreso).json()['progreso']['respuestas'], {str(self.pregunta.pk): 1})
+
+        # Fuera de los endpoints de la evaluación sigue siendo anónimo
+        self.assertEqual(self.client.get(reverse('evaluaciones:dashboard')).status_code, 302)
+
+    def test_enlace_alterado(self):
+        # Carga útil de otra evaluación con la firma del enlace original
+        token = generar_token(self.evaluacion.pk, self.usuario.pk)
+        alterado = generar_token(self.otra.pk, self.usuario.pk).split(':')[0] + token[token.index(':'):]
+        respuesta = self.client.get(reverse('evaluaciones:acceso', args=[alterado]))
+        self.assertRedirects(respuesta, reverse('evaluaciones:login'))
+        self.assertNotIn(COOKIE_ACCESO, respuesta.cookies)
+
+        self.client.cookies[COOKIE_ACCESO] = generar_token(self.otra.pk, self.usuario.pk) + 'x'
+        respuesta = self.client.get(reverse('evaluaciones:obtener_preguntas'))
+        self.assertEqual(respuesta.status_code, 302)
+
+
+
+@override_settings(BORRADOR_MAX_RESPUESTAS=3, BORRADOR_MAX_SEGUNDOS=60)
+class BorradoresTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.usuario = User.objects.create(username='evaluado')
+        cuestionario = CuestionarioNOM035.objects.create(nombre='C', version='1', descripcion='', creado_por=self.usuario)
+        dominio = DominioNOM035.objects.create(cuestionario=cuestionario, nombre='D', descripcion='', orden=1)
+        self.preguntas = []
+        for orden in range(4):
+            pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto='P', tipo='likert', orden=orden)
+            for valor in range(3):
+                OpcionRespuesta.objects.create(pregunta=pregunta, texto=str(valor), valor=valor, orden=valor)
+            self.preguntas.append(pregunta.pk)
+        self.evaluacion = Evaluacion.objects.create(cuestionario=cuestionario, evaluado=self.usuario, evaluador=self.usuario)
+        self.client.force_login(self.usuario)
+
+    def autoguardar(self, pregunta, valor):
+        respuesta = self.client.post(
+            reverse('evaluaciones:guardar_progreso'), {'respuestas': json.dumps({pregunta: valor})}
+        )
+        self.assertEqual(respuesta.json()['guardadas'], 1)
+
+    def progreso(self):
+        return self.client.get(reverse('evaluaciones:cargar_progreso')).json()['progreso']
+
+    def test_escritura_cada_n_respuestas(self):
+        self.autoguardar(self.preguntas[0], 1)
+        self.autoguardar(self.preguntas[0], 2)
+        self.assertFalse(RespuestaEvaluacion.objects.exists())
+        self.assertEqual(self.progreso(), {'respuestas': {str(self.preguntas[0]): 2}, 'pregunta_actual': 1})
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.autoguardar(self.preguntas[1], 0)
+        escrituras = [c['sql'] for c in consultas if c['sql'].startswith('INSERT INTO "evaluaciones_respuestaevaluacion"')]
+        self.assertEqual(len(escrituras), 1)
+        self.assertEqual(
+            dict(RespuestaEvaluacion.objects.values_list('pregunta_id', 'puntuacion')),
+            {self.preguntas[0]: 2, self.preguntas[1]: 0},
+        )
+        self.evaluacion.refresh_from_db()
+        self.assertEqual(self.evaluacion.estado, 'en_progreso')
+
+    def test_vaciado_periodico_y_perdida_de_cache(self):
+        self.autoguardar(self.preguntas[2], 1)
+        self.assertEqual(vaciar_pendientes(), (0, 0))
+        with override_settings(BORRADOR_MAX_SEGUNDOS=0):
+            self.assertEqual(vaciar_pendientes(), (1, 1))
+        self.assertEqual(vaciar_pendientes(todos=True), (0, 0))
+
+        # Tras vaciarse, el borrador se rearma desde la base de datos
+        caches['default'].clear()
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.progreso()['respuestas'], {str(self.preguntas[2]): 1})
+
+    def test_finalizar_escribe_el_borrador(self):
+        for pregunta in self.preguntas[:2]:
+            self.autoguardar(pregunta, 1)
+        respuesta = self.client.post(
+            reverse('evaluaciones:finalizar_evaluacion'),
+            {'respuestas': json.dumps({pregunta: 2 for pregunta in self.preguntas[2:]})},
+        )
+        self.assertTrue(respuesta.json()['success'])
+        self.assertEqual(RespuestaEvaluacion.objects.filter(evaluacion=self.evaluacion).count(), 4)
+        self.assertIsNone(caches['default'].get(f'borrador:{self.evaluacion.pk}'))
+
+    def en_hilos(self, *funciones):
+        """Ejecuta cada función en su propio hilo y devuelve las excepciones que lanzaron"""
+        errores = []
+
+        def ejecutar(funcion):
+            try:
+                funcion()
+            except Exception as error:
+                errores.append(error)
+
+        hilos = [threading.Thread(target=ejecutar, args=(funcion,)) for funcion in funciones]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return errores
+
+    # Sin llegar al límite: los hilos solo usan la caché (SQLite no admite escrituras concurrentes)
+    @override_settings(BORRADOR_MAX_RESPUESTAS=100)
+    def test_guardados_simultaneos_no_se_pisan(self):
+        self.autoguardar(self.preguntas[0], 1)
+
+        def leer_lento(evaluacion_id):
+            # Sin candado, todos leerían el borrador antes de que alguno lo guarde
+            borrador = leer_borrador(evaluacion_id)
+            time.sleep(0.05)
+            return borrador
+
+        guardados = [
+            lambda p=p: guardar_borrador(self.evaluacion, [{'pregunta': p, 'valor': 2}]) for p in self.preguntas[1:]
+        ]
+        with mock.patch('evaluaciones.borradores.leer_borrador', leer_lento):
+            self.assertEqual(self.en_hilos(*guardados), [])
+        self.assertFalse(RespuestaEvaluacion.objects.exists())
+        self.assertEqual(
+            self.progreso()['respuestas'],
+            {str(self.preguntas[0]): 1, **{str(p): 2 for p in self.preguntas[1:]}},
+        )
+
+    def test_vaciados_simultaneos_no_retroceden(self):
+        # Ya en curso, para que los hilos no actualicen la evaluación en SQLite
+        Evaluacion.objects.filter(pk=self.evaluacion.pk).update(estado='en_progreso')
+        self.evaluacion.estado = 'en_progreso'
+        self.autoguardar(self.preguntas[0], 1)
+        escritas, escribiendo = {}, threading.Event()
+
+        def escribir_lento(instancias):
+            # La primera escritura, con la respuesta vieja, termina después de la segunda
+            if not escribiendo.is_set():
+                escribiendo.set()
+                time.sleep(0.1)
+            escritas.update((instancia.pregunta_id, instancia.puntuacion) for instancia in instancias)
+
+        def cambiar_y_vaciar():
+            escribiendo.wait()
+            guardar_borrador(self.evaluacion, [{'pregunta': self.preguntas[0], 'valor': 2}], escribir=True)
+
+        with mock.patch('evaluaciones.borradores.escribir_respuestas', escribir_lento):
+            self.assertEqual(self.en_hilos(lambda: vaciar_borrador(self.evaluacion), cambiar_y_vaciar), [])
+        self.assertEqual(escritas, {self.preguntas[0]: 2})
+        self.assertEqual(
+            caches['default'].get(f'borrador:{self.evaluacion.pk}:escrito'),
+            leer_borrador(self.evaluacion.pk)['version'],
+        )
+
+    def test_ingesta_por_lotes_actualiza_el_borrador(self):
+        self.autoguardar(self.preguntas[0], 1)
+        respuesta = self.client.post(
+            reverse('evaluaciones:guardar_respuestas'),
+            json.dumps({'evaluacion': self.evaluacion.pk, 'respuestas': [{'pregunta': self.preguntas[0], 'valor': 2}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.json()['guardadas'], 1)
+        self.assertEqual(RespuestaEvaluacion.objects.get().puntuacion, 2)
+        self.assertEqual(self.progreso()['respuestas'], {str(self.preguntas[0]): 2})
+
+
+class BackendCorreoContado(EmailBackend):
+    """locmem que cuenta las conexiones abiertas y rechaza a los destinatarios de RECHAZADOS"""
+
+    aperturas = 0
+    RECHAZADOS = set()
+
+    def open(self):
+        BackendCorreoContado.aperturas += 1
+        return True
+
+    def send_messages(self, messages):
+        if any(destinatario in self.RECHAZADOS for mensaje in messages for destinatario in mensaje.to):
+            raise ConnectionError('buzón no disponible')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='evaluaciones.tests.BackendCorreoContado', SITIO_URL='https://psymetrics.test')
+class CorreosTests(TestCase):
+    def setUp(self):
+        BackendCorreoContado.aperturas = 0
+        BackendCorreoContado.RECHAZADOS = set()
+        self.admin = User.objects.create(username='admin')
+        self.cuestionario = CuestionarioNOM035.objects.create(
+            nombre='Guía II', version='1', descripcion='', creado_por=self.admin,
+        )
+        for n, estado in enumerate(['iniciada', 'en_progreso', 'en_progreso', 'completada']):
+            usuario = User.objects.create(username=f'empleado{n}', email=f'empleado{n}@empresa.mx')
+            Evaluacion.objects.create(
+                cuestionario=self.cuestionario, evaluado=usuario, evaluador=self.admin, estado=estado,
+            )
+        sin_correo = User.objects.create(username='sin-correo')
+        Evaluacion.objects.create(cuestionario=self.cuestionario, evaluado=sin_correo, evaluador=self.admin)
+
+    def test_envio_por_bloques_con_una_conexion(self):
+        self.assertEqual(encolar_correos('invitacion'), 3)
+        self.assertEqual(encolar_correos('invitacion'), 0)
+
+        self.assertEqual(atender_bandeja(una_vez=True, tamano=2), 3)
+        self.assertEqual(BackendCorreoContado.aperturas, 2)
+        self.assertEqual(len(mail.outbox), 3)
+        mensaje = mail.outbox[0]
+        self.assertIn('Guía II', mensaje.subject)
+        enlace = re.search(r'https://psymetrics\.test(/acceso/\S+/)', mensaje.body).group(1)
+        self.assertRedirects(self.client.get(enlace), reverse('evaluaciones:evaluacion'))
+        self.assertEqual(CorreoSaliente.objects.filter(estado='enviado').count(), 3)
+
+        # Los recordatorios sí se repiten, pero no para quien ya terminó
+        Evaluacion.objects.filter(evaluado__username='empleado0').update(estado='completada')
+        self.assertEqual(encolar_correos('recordatorio'), 2)
+
+    def test_reintentos(self):
+        encolar_correos('invitacion')
+        BackendCorreoContado.RECHAZADOS = {'empleado1@empresa.mx'}
+        with self.assertLogs('evaluaciones.correos', 'WARNING'):
+            self.assertEqual(atender_bandeja(una_vez=True), 2)
+
+        fallido = CorreoSaliente.objects.get(destinatario='empleado1@empresa.mx')
+        self.assertEqual((fallido.estado, fallido.intentos), ('pendiente', 1))
+        self.assertEqual(fallido.error, 'buzón no disponible')
+        self.assertGreater(fallido.proximo_intento, timezone.now())
+
+        # Al vencer la espera se reintenta; si la evaluación ya se cerró se cancela
+        CorreoSaliente.objects.filter(pk=fallido.pk).update(proximo_intento=timezone.now())
+        Evaluacion.objects.filter(pk=fallido.evaluacion_id).update(estado='completada')
+        self.assertEqual(atender_bandeja(una_vez=True), 0)
+        self.assertEqual(CorreoSaliente.objects.get(pk=fallido.pk).estado, 'cancelado')
+
+    def test_recupera_abandonados_en_cada_vuelta(self):
+        encolar_correos('invitacion')
+        # Un trabajador murió con el bloque reclamado y su plazo ya venció
+        CorreoSaliente.objects.update(estado='enviando', proximo_intento=timezone.now() - timedelta(minutes=1))
+        with self.assertLogs('evaluaciones.correos', 'WARNING'):
+            self.assertEqual(atender_bandeja(una_vez=True), 3)
+        self.assertEqual(CorreoSaliente.objects.filter(estado='enviado').count(), 3)
+
+
+class AnaliticaTests(TestCase):
+    # Evaluaciones × (dominio A: 3 preguntas, dominio B: 2 preguntas); None = sin respuesta
+    RESPUESTAS = [
+        [4, 3, 4, 1, 0],
+        [2, 2, 1, 2, 2],
+        [0, 1, 0, 4, 3],
+        [3, 3, 2, 0, 1],
+        [1, 0, 1, 3, None],
+    ]
+
+    def setUp(self):
+        caches['default'].clear()
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.cuestionario = CuestionarioNOM035.objects.create(
+            nombre='Guía III', version='1', descripcion='', creado_por=self.admin,
+        )
+        self.opciones = []
+        for orden, (nombre, preguntas) in enumerate([('A', 3), ('B', 2)]):
+            dominio = DominioNOM035.objects.create(cuestionario=self.cuestionario, nombre=nombre, descripcion='', orden=orden)
+            for n in range(preguntas):
+                pregunta = PreguntaNOM035.objects.create(dominio=dominio, texto=f'{nombre}{n}', tipo='likert', orden=n)
+                self.opciones.append([
+                    OpcionRespuesta.objects.create(pregunta=pregunta, texto=str(v), valor=v, orden=v) for v in range(5)
+                ])
+        for fila in self.RESPUESTAS:
+            self.completar(fila)
+        # Las evaluaciones abiertas no cuentan
+        Evaluacion.objects.create(cuestionario=self.cuestionario, evaluado=self.admin, evaluador=self.admin)
+
+    def completar(self, fila):
+        evaluacion = Evaluacion.objects.create(
+            cuestionario=self.cuestionario, evaluado=self.admin, evaluador=self.admin,
+            estado='completada', fecha_completado=timezone.now(),
+        )
+        RespuestaEvaluacion.objects.bulk_create(
+            RespuestaEvaluacion(evaluacion=evaluacion, pregunta=opciones[valor].pregunta, opcion_seleccionada=opciones[valor])
+            for opciones, valor in zip(self.opciones, fila) if valor is not None
+        )
+
+    def test_confiabilidad_y_correlaciones(self):
+        analisis = analisis_cuestionario(self.cuestionario.pk)
+        self.assertEqual(analisis['evaluaciones'], 5)
+        a, b = analisis['dominios']
+        self.assertEqual((a['evaluaciones'], b['evaluaciones']), (5, 4))
+
+        items = np.array([fila[:3] for fila in self.RESPUESTAS], dtype=float)
+        alfa = 3 / 2 * (1 - items.var(axis=0, ddof=1).sum() / items.sum(axis=1).var(ddof=1))
+        self.assertAlmostEqual(a['alfa'], alfa, places=4)
+        resto = items[:, 1:].sum(axis=1)
+        self.assertAlmostEqual(a['preguntas'][0]['correlacion_total'], np.corrcoef(items[:, 0], resto)[0, 1], places=4)
+
+        sumas = np.array([[sum(fila[:3]), sum(fila[3:])] for fila in self.RESPUESTAS[:4]], dtype=float)
+        matriz = analisis['correlaciones']['matriz']
+        self.assertEqual(analisis['correlaciones']['evaluaciones'], 4)
+        self.assertAlmostEqual(matriz[0][1], np.corrcoef(sumas.T)[0, 1], places=4)
+        self.assertEqual(matriz[0][0], 1.0)
+
+    def test_cache_por_ultima_evaluacion(self):
+        analisis_cuestionario(self.cuestionario.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(analisis_cuestionario(self.cuestionario.pk)['evaluaciones'], 5)
+        self.completar([4, 4, 4, 0, 0])
+        self.assertEqual(analisis_cuestionario(self.cuestionario.pk)['evaluaciones'], 6)
+
+    def test_evaluaciones_completadas_entre_consultas(self):
+        # Se completan después de leer la lista de evaluaciones, antes de leer las respuestas
+        ids = list(Evaluacion.objects.filter(estado='completada').order_by('pk').values_list('pk', flat=True))
+        tardias = [ids[1], ids[-1]]
+        filtrar = Evaluacion.objects.filter
+        with mock.patch.object(Evaluacion.objects, 'filter', lambda *a, **k: filtrar(*a, **k).exclude(pk__in=tardias)):
+            matriz = cargar_matriz(self.cuestionario.pk)
+        self.assertEqual(matriz.evaluaciones.tolist(), [pk for pk in ids if pk not in tardias])
+        self.assertEqual(
+            matriz.valores.tolist(), [fila for pk, fila in zip(ids, self.RESPUESTAS) if pk not in tardias],
+        )
+
+    def test_pagina_del_admin(self):
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(
+            reverse('admin:evaluaciones_cuestionarionom035_analisis', args=[self.cuestionario.pk])
+        )
+        self.assertContains(respuesta, 'Confiabilidad por dominio')
+        self.assertContains(
+            self.client.get(reverse('admin:evaluaciones_cuestionarionom035_change', args=[self.cuestionario.pk])),
+            reverse('admin:evaluaciones_cuestionarionom035_analisis', args=[self.cuestionario.pk]),
+        )
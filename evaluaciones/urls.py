@@ -8,8 +8,21 @@ urlpatterns = [
     path('servicios/', views.ServiciosView.as_view(), name='servicios'),
     path('nosotros/', views.NosotrosView.as_view(), name='nosotros'),
     path('contacto/', views.ContactoView.as_view(), name='contacto'),
+    path('csrf/', views.token_csrf, name='token_csrf'),
+    path('estadisticas/', views.estadisticas, name='estadisticas'),
     path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
     path('solicitar-evaluacion/', views.solicitar_evaluacion, name='solicitar_evaluacion'),
+    path('acceso/<str:token>/', views.acceso_evaluacion, name='acceso'),
+    path('evaluacion/', views.EvaluacionView.as_view(), name='evaluacion'),
+    path('evaluacion/preguntas/', views.obtener_preguntas, name='obtener_preguntas'),
+    path('evaluacion/respuestas/', views.guardar_respuestas, name='guardar_respuestas'),
+    path('evaluacion/progreso/', views.cargar_progreso, name='cargar_progreso'),
+    path('evaluacion/guardar-progreso/', views.guardar_progreso, name='guardar_progreso'),
+    path('evaluacion/finalizar/', views.finalizar_evaluacion, name='finalizar_evaluacion'),
+    path('evaluacion/resultados/', views.resultados, name='resultados'),
+    path('evaluacion/reporte/', views.descargar_reporte, name='descargar_reporte'),
+    path('evaluacion/reporte/estado/', views.estado_reporte, name='estado_reporte'),
+    path('evaluacion/exportar/', views.exportar_resultados, name='exportar_resultados'),
     path('login/', views.login_view, name='login'),
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
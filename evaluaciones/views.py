@@ -1,34 +1,58 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse
 from django.views.generic import TemplateView
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.middleware.csrf import get_token
 from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import require_GET, require_POST
+
+from psymetrics.cache_paginas import cache_anonimo
+from psymetrics.replicas import usar_replica
+
+from .acceso import COOKIE as COOKIE_ACCESO, TokenInvalido, evaluado_requerido, leer_token, vigencia
+from .borradores import descartar_borrador, guardar_borrador, preguntas_pendientes, respuestas_borrador
+from .cuestionarios import obtener_cuestionario
+from .estadisticas import estadisticas_publicas
+from .exportacion import respuesta_exportacion
+from .models import CuestionarioNOM035, Evaluacion, TrabajoReporte
+from .puntuacion import finalizar_evaluacion as calificar_evaluacion, puntuar, resumen_evaluacion
+from .reportes import encolar_reporte, reporte_en_disco
+
 
+ESTADOS_ABIERTOS = ['iniciada', 'en_progreso']
 
+
+@method_decorator(cache_anonimo(), name='dispatch')
 class HomeView(TemplateView):
     template_name = 'home.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['estadisticas'] = {
-            'evaluaciones_realizadas': 500,
-            'clientes_corporativos': 200,
-            'tasa_exito': 95,
-        }
+        context['estadisticas'] = estadisticas_publicas()
         return context
 
 
+@method_decorator(cache_anonimo(), name='dispatch')
 class ServiciosView(TemplateView):
     template_name = 'servicios.html'
 
 
+@method_decorator(cache_anonimo(), name='dispatch')
 class NosotrosView(TemplateView):
     template_name = 'nosotros.html'
 
 
+@method_decorator(cache_anonimo(), name='dispatch')
 class ContactoView(TemplateView):
     template_name = 'contacto.html'
 
@@ -38,6 +62,43 @@ class DashboardView(TemplateView):
     template_name = 'dashboard.html'
 
 
+@method_decorator(evaluado_requerido, name='dispatch')
+class EvaluacionView(TemplateView):
+    template_name = 'evaluaciones/evaluacion.html'
+
+
+@never_cache
+@require_GET
+def acceso_evaluacion(request, token):
+    """Enlace firmado de un evaluado: abre su evaluación sin contraseña ni sesión"""
+    try:
+        leer_token(token)
+    except TokenInvalido as error:
+        messages.error(request, str(error))
+        return redirect('evaluaciones:login')
+
+    response = redirect('evaluaciones:evaluacion')
+    response.set_cookie(
+        COOKIE_ACCESO, token, max_age=vigencia(), httponly=True, samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+    return response
+
+
+@never_cache
+@require_GET
+def token_csrf(request):
+    """Token CSRF para las páginas públicas servidas como archivos estáticos"""
+    return JsonResponse({'token': get_token(request)})
+
+
+@cache_control(public=True, max_age=60)
+@require_GET
+def estadisticas(request):
+    """Cifras de la página de inicio; la versión estática las pide aquí para no quedar fijas"""
+    return JsonResponse(estadisticas_publicas())
+
+
 def solicitar_evaluacion(request):
     if request.method == 'POST':
         return JsonResponse({'success': True, 'message': 'Solicitud enviada correctamente'})
@@ -45,6 +106,239 @@ def solicitar_evaluacion(request):
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
 
+def _evaluaciones_del_usuario(request, estados=None):
+    """
+    Evaluaciones del evaluado (ver ``evaluado_requerido``), opcionalmente acotadas por el
+    parámetro 'evaluacion'; con acceso por enlace, solo la del enlace
+    """
+    evaluaciones = Evaluacion.objects.filter(evaluado_id=request.evaluado_id)
+    if request.evaluacion_acceso is not None:
+        evaluaciones = evaluaciones.filter(pk=request.evaluacion_acceso)
+    if estados is not None:
+        evaluaciones = evaluaciones.filter(estado__in=estados)
+    evaluacion_id = request.GET.get('evaluacion') or request.POST.get('evaluacion')
+    if evaluacion_id:
+        if not str(evaluacion_id).isdigit():
+            return evaluaciones.none()
+        evaluaciones = evaluaciones.filter(pk=evaluacion_id)
+    return evaluaciones
+
+
+def _evaluacion_abierta(request):
+    """
+    (evaluación abierta del usuario, None) o (None, respuesta de error); con varias
+    abiertas hay que indicar cuál con el parámetro 'evaluacion'
+    """
+    abiertas = list(_evaluaciones_del_usuario(request, ESTADOS_ABIERTOS)[:2])
+    if not abiertas:
+        return None, JsonResponse({'success': False, 'message': 'No tienes evaluaciones pendientes'}, status=404)
+    if len(abiertas) > 1:
+        return None, JsonResponse(
+            {'success': False, 'message': 'Tienes varias evaluaciones pendientes; indica cuál'}, status=400,
+        )
+    return abiertas[0], None
+
+
+@evaluado_requerido
+@require_GET
+def obtener_preguntas(request):
+    """Devuelve el árbol de preguntas del cuestionario compilado, sin consultar la BD"""
+    evaluacion, error = _evaluacion_abierta(request)
+    if error is not None:
+        return error
+
+    compilado = obtener_cuestionario(evaluacion.cuestionario_id)
+    etag = f'"{compilado.etiqueta}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified()
+
+    response = HttpResponse(compilado.json, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def _guardar_lote(evaluacion, respuestas, escribir=False):
+    try:
+        guardadas = guardar_borrador(evaluacion, respuestas, escribir=escribir)
+    except ValidationError as error:
+        return JsonResponse({'success': False, 'message': ' '.join(error.messages)}, status=400)
+    return JsonResponse({'success': True, 'guardadas': guardadas})
+
+
+@evaluado_requerido
+@require_POST
+def guardar_respuestas(request):
+    """
+    API de ingesta por lotes: {"evaluacion": id, "respuestas": [{"pregunta": id, "opcion": id}, ...]}
+
+    Pasa por el borrador y lo escribe de inmediato, para que evaluacion.html no retome
+    respuestas que este lote ya cambió.
+    """
+    try:
+        datos = json.loads(request.body)
+        evaluacion_id = int(datos['evaluacion'])
+        respuestas = list(datos['respuestas'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'message': 'Formato de solicitud inválido'}, status=400)
+
+    evaluacion = _evaluaciones_del_usuario(request).filter(pk=evaluacion_id).first()
+    if evaluacion is None:
+        return JsonResponse({'success': False, 'message': 'Evaluación no encontrada'}, status=404)
+    return _guardar_lote(evaluacion, respuestas, escribir=True)
+
+
+@evaluado_requerido
+@require_GET
+def cargar_progreso(request):
+    """Respuestas del borrador de la evaluación abierta, para retomarla en evaluacion.html"""
+    evaluacion, error = _evaluacion_abierta(request)
+    if error is not None:
+        return error
+
+    respuestas = respuestas_borrador(evaluacion)
+    orden = [pregunta['id'] for pregunta in obtener_cuestionario(evaluacion.cuestionario_id).datos['preguntas']]
+    pendiente = next((i for i, pregunta in enumerate(orden) if str(pregunta) not in respuestas), len(orden) - 1)
+    return JsonResponse({
+        'success': True,
+        'progreso': {'respuestas': respuestas, 'pregunta_actual': max(pendiente, 0)},
+    })
+
+
+@evaluado_requerido
+@require_POST
+def guardar_progreso(request):
+    """Agrega al borrador el progreso enviado por evaluacion.html ({pregunta_id: valor})"""
+    try:
+        respuestas = json.loads(request.POST.get('respuestas', '{}'))
+        lote = [{'pregunta': pregunta, 'valor': valor} for pregunta, valor in respuestas.items()]
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Formato de respuestas inválido'}, status=400)
+
+    evaluacion, error = _evaluacion_abierta(request)
+    if error is not None:
+        return error
+    return _guardar_lote(evaluacion, lote)
+
+
+@evaluado_requerido
+@require_POST
+def finalizar_evaluacion(request):
+    """Guarda las últimas respuestas, completa la evaluación y devuelve sus resultados"""
+    try:
+        respuestas = json.loads(request.POST.get('respuestas', '{}'))
+        lote = [{'pregunta': pregunta, 'valor': valor} for pregunta, valor in respuestas.items()]
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Formato de respuestas inválido'}, status=400)
+
+    evaluacion, error = _evaluacion_abierta(request)
+    if error is not None:
+        return error
+
+    try:
+        guardar_borrador(evaluacion, lote, escribir=True)
+    except ValidationError as error:
+        return JsonResponse({'success': False, 'message': ' '.join(error.messages)}, status=400)
+
+    pendientes = preguntas_pendientes(evaluacion)
+    if pendientes:
+        return JsonResponse({
+            'success': False,
+            'message': f'Faltan {len(pendientes)} preguntas obligatorias por responder',
+            'pendientes': pendientes,
+        }, status=400)
+
+    resultados = calificar_evaluacion(evaluacion)
+    descartar_borrador(evaluacion.pk)
+    return JsonResponse({'success': True, 'resultados': resumen_evaluacion(resultados, evaluacion.pk)})
+
+
+@evaluado_requerido
+@require_GET
+@usar_replica()
+def resultados(request):
+    """Resultados de una evaluación completada (?id=)"""
+    evaluacion_id = request.GET.get('id', '')
+    evaluacion = None
+    if evaluacion_id.isdigit():
+        evaluacion = _evaluaciones_del_usuario(request, ['completada']).filter(pk=evaluacion_id).first()
+    if evaluacion is None:
+        return JsonResponse({'success': False, 'message': 'Evaluación no encontrada'}, status=404)
+
+    datos = resumen_evaluacion(puntuar([evaluacion.pk]), evaluacion.pk)
+    datos['fecha_evaluacion'] = evaluacion.fecha_completado.isoformat() if evaluacion.fecha_completado else None
+    datos['recomendaciones'] = [
+        {
+            'titulo': f"Nivel de riesgo {datos['nivel_riesgo'].lower()}",
+            'descripcion': criterio,
+            'acciones': [d['nombre'] for d in datos['dominios'] if d['nivel'] in ('alto', 'muy_alto')],
+        }
+        for criterio in datos['recomendaciones']
+    ]
+    return JsonResponse({'success': True, 'resultados': datos})
+
+
+def _evaluacion_para_reporte(request, evaluacion_id):
+    evaluaciones = Evaluacion.objects.filter(estado='completada').select_related('evaluado', 'cuestionario')
+    if not request.user.is_staff:
+        evaluaciones = evaluaciones.filter(evaluado=request.user)
+    return evaluaciones.filter(pk=evaluacion_id).first() if str(evaluacion_id).isdigit() else None
+
+
+@login_required
+@require_GET
+def descargar_reporte(request):
+    """Sirve el PDF desde disco si ya existe; si no, encola su generación (?id=)"""
+    evaluacion = _evaluacion_para_reporte(request, request.GET.get('id', ''))
+    if evaluacion is None:
+        return JsonResponse({'success': False, 'message': 'Evaluación no encontrada'}, status=404)
+
+    hash_contenido, ruta = reporte_en_disco(evaluacion)
+    if ruta is not None:
+        response = FileResponse(
+            default_storage.open(ruta, 'rb'),
+            as_attachment=True,
+            filename=f'reporte_evaluacion_{evaluacion.pk}.pdf',
+            content_type='application/pdf',
+        )
+        response['ETag'] = f'"{hash_contenido}"'
+        return response
+
+    trabajo = encolar_reporte(evaluacion, request.user)
+    return JsonResponse({'success': True, 'trabajo': trabajo.pk, 'estado': trabajo.estado}, status=202)
+
+
+@login_required
+@require_GET
+def estado_reporte(request):
+    """Estado de un trabajo de reporte (?trabajo=)"""
+    trabajos = TrabajoReporte.objects.all()
+    if not request.user.is_staff:
+        trabajos = trabajos.filter(evaluacion__evaluado=request.user)
+    trabajo_id = request.GET.get('trabajo', '')
+    trabajo = trabajos.filter(pk=trabajo_id).first() if trabajo_id.isdigit() else None
+    if trabajo is None:
+        return JsonResponse({'success': False, 'message': 'Trabajo no encontrado'}, status=404)
+    return JsonResponse({'success': True, 'trabajo': trabajo.pk, 'estado': trabajo.estado, 'evaluacion': trabajo.evaluacion_id})
+
+
+@staff_member_required
+@require_GET
+def exportar_resultados(request):
+    """Descarga en streaming la matriz de respuestas de un cuestionario (?cuestionario=&formato=csv|xlsx)"""
+    cuestionario_id = request.GET.get('cuestionario', '')
+    if not cuestionario_id.isdigit():
+        return JsonResponse({'success': False, 'message': 'Cuestionario no indicado'}, status=400)
+    # El streaming no puede cambiar el estado una vez enviada la cabecera
+    if not CuestionarioNOM035.objects.filter(pk=cuestionario_id).exists():
+        return JsonResponse({'success': False, 'message': 'Cuestionario no encontrado'}, status=404)
+
+    evaluaciones = Evaluacion.objects.filter(cuestionario_id=cuestionario_id)
+    estado = request.GET.get('estado')
+    if estado:
+        evaluaciones = evaluaciones.filter(estado=estado)
+    return respuesta_exportacion(evaluaciones, int(cuestionario_id), request.GET.get('formato', 'csv'))
+
+
 def logout_view(request):
     """Vista personalizada de logout que redirige al home"""
     logout(request)
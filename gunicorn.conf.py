@@ -1,13 +1,19 @@
 # Gunicorn configuration file
 import multiprocessing
+import os
+import subprocess
 
 # Server socket
 bind = "0.0.0.0:8000"
 backlog = 2048
 
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# Worker processes (WEB_CONCURRENCY also sizes the per-worker database pool)
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+# Uvicorn workers run psymetrics.asgi: an open SSE stream (consultas eventos) is a
+# coroutine, not a blocked worker. GUNICORN_WORKER_CLASS=sync/gthread serves the WSGI app
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn_worker.UvicornWorker')
+wsgi_app = 'psymetrics.wsgi:application' if worker_class in ('sync', 'gthread') else 'psymetrics.asgi:application'
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -16,6 +22,22 @@ keepalive = 2
 max_requests = 1000
 max_requests_jitter = 50
 
+# Deploy version: prefixes the page cache keys (psymetrics.cache_paginas)
+def _deploy_version():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return ''
+
+raw_env = [
+    f"VERSION_DESPLIEGUE={os.environ.get('VERSION_DESPLIEGUE') or _deploy_version() or 'dev'}",
+    f"WEB_CONCURRENCY={workers}",
+    f"GUNICORN_THREADS={threads}",
+]
+
 # Logging
 accesslog = "-"
 errorlog = "-"
@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'psymetrics.settings')
 
 application = get_asgi_application()
+
+# Desarrollo (Procfile): uvicorn no sirve los estáticos como runserver
+if settings.DEBUG:
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
+
+# En producción los estáticos con hash se sirven desde aquí, precomprimidos y con caché inmutable
+elif settings.SERVIR_ESTATICOS:
+    from psymetrics.estaticos import ServidorEstaticosASGI
+
+    application = ServidorEstaticosASGI(application)
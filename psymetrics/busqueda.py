@@ -0,0 +1,251 @@
+"""
+Búsqueda de texto completo sobre los campos de texto libre.
+
+``icontains`` se traduce a ``LIKE '%término%'``, que recorre la tabla completa. Cada
+modelo registrado con ``registrar(modelo, *campos)`` mantiene un índice de texto:
+
+- PostgreSQL: columna ``busqueda`` (SearchVectorField) con índice GIN sobre la
+  configuración ``spanish_unaccent`` (raíces en español, sin acentos), más un índice de
+  trigramas sobre ``UPPER(campo)`` para que las coincidencias parciales de ``icontains``
+  también usen índice.
+- SQLite (desarrollo y pruebas): una tabla virtual FTS5 ``<tabla>_fts`` cuyo rowid es
+  el id de la fila; las palabras se buscan por prefijo.
+
+El índice se actualiza al guardar o borrar cada instancia; lo que se escribe por fuera
+de los modelos (bulk_create, update) se corrige con ``manage.py reindexar_busqueda``.
+"""
+import re
+
+from django.contrib.admin.utils import get_fields_from_path
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, migrations
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.utils.text import smart_split, unescape_string_literal
+
+
+CONFIGURACION = 'spanish_unaccent'
+
+_CAMPOS = {}
+
+_CREAR_CONFIGURACION = f"""
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{CONFIGURACION}') THEN
+        CREATE TEXT SEARCH CONFIGURATION {CONFIGURACION} (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION {CONFIGURACION}
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END $$;
+"""
+
+
+def registrar(modelo, *campos):
+    """Mantiene el índice de ``campos`` al guardar y borrar instancias de ``modelo``"""
+    _CAMPOS[modelo] = campos
+    post_save.connect(_al_guardar, sender=modelo, dispatch_uid=f'busqueda_guardar_{modelo._meta.label_lower}')
+    post_delete.connect(_al_borrar, sender=modelo, dispatch_uid=f'busqueda_borrar_{modelo._meta.label_lower}')
+
+
+def campos_indexados(modelo):
+    return _CAMPOS.get(modelo, ())
+
+
+def tabla_fts(tabla):
+    return f'{tabla}_fts'
+
+
+def _al_guardar(sender, instance, raw=False, using='default', update_fields=None, **kwargs):
+    campos = _CAMPOS[sender]
+    if raw or (update_fields is not None and not set(update_fields) & set(campos)):
+        return
+    actualizar(instance, using)
+
+
+def _al_borrar(sender, instance, using='default', **kwargs):
+    conexion = connections[using]
+    if conexion.vendor == 'sqlite':
+        with conexion.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {tabla_fts(sender._meta.db_table)} WHERE rowid = %s', [instance.pk])
+
+
+def actualizar(instancia, using='default'):
+    """Recalcula el índice de texto de una instancia"""
+    modelo = type(instancia)
+    campos = _CAMPOS[modelo]
+    conexion = connections[using]
+    if conexion.vendor == 'postgresql':
+        modelo._base_manager.using(using).filter(pk=instancia.pk).update(
+            busqueda=SearchVector(*campos, config=CONFIGURACION),
+        )
+    elif conexion.vendor == 'sqlite':
+        tabla = tabla_fts(modelo._meta.db_table)
+        with conexion.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {tabla} WHERE rowid = %s', [instancia.pk])
+            cursor.execute(
+                f'INSERT INTO {tabla} (rowid, {", ".join(campos)}) VALUES (%s{", %s" * len(campos)})',
+                [instancia.pk, *[getattr(instancia, campo) or '' for campo in campos]],
+            )
+
+
+def _sql_reconstruir(vendor, tabla, campos):
+    if vendor == 'postgresql':
+        documento = " || ' ' || ".join(f"COALESCE({campo}, '')" for campo in campos)
+        return [f"UPDATE {tabla} SET busqueda = to_tsvector('{CONFIGURACION}', {documento})"]
+    if vendor == 'sqlite':
+        columnas = ', '.join(campos)
+        return [
+            f'DELETE FROM {tabla_fts(tabla)}',
+            f'INSERT INTO {tabla_fts(tabla)} (rowid, {columnas}) SELECT id, {columnas} FROM {tabla}',
+        ]
+    return []
+
+
+def reconstruir(modelo, using='default'):
+    """Reindexa todas las filas de ``modelo`` en una sola pasada"""
+    conexion = connections[using]
+    with conexion.cursor() as cursor:
+        for sql in _sql_reconstruir(conexion.vendor, modelo._meta.db_table, _CAMPOS[modelo]):
+            cursor.execute(sql)
+
+
+def indice_busqueda(app_label, modelo, *campos):
+    """
+    Operación de migración que crea el índice de texto de ``modelo`` según el motor y
+    lo llena con las filas existentes. La columna ``busqueda`` se agrega antes con AddField.
+    """
+    def crear(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        tabla = apps.get_model(app_label, modelo)._meta.db_table
+        if vendor == 'postgresql':
+            schema_editor.execute(_CREAR_CONFIGURACION)
+            schema_editor.execute(f'CREATE INDEX {tabla}_busqueda_gin ON {tabla} USING gin (busqueda)')
+            for campo in campos:
+                schema_editor.execute(
+                    f'CREATE INDEX {tabla}_{campo}_trgm ON {tabla} USING gin (UPPER({campo}) gin_trgm_ops)'
+                )
+        elif vendor == 'sqlite':
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {tabla_fts(tabla)} USING fts5({', '.join(campos)}, "
+                f"tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        for sql in _sql_reconstruir(vendor, tabla, campos):
+            schema_editor.execute(sql)
+
+    def eliminar(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        tabla = apps.get_model(app_label, modelo)._meta.db_table
+        if vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {tabla}_busqueda_gin')
+            for campo in campos:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {tabla}_{campo}_trgm')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE IF EXISTS {tabla_fts(tabla)}')
+
+    return migrations.RunPython(crear, eliminar)
+
+
+def _consulta_fts5(termino, campos):
+    """Expresión MATCH de FTS5: todas las palabras, cada una como prefijo"""
+    palabras = re.findall(r'\w+', termino)
+    if not palabras:
+        return None
+    expresion = ' '.join(f'"{palabra}"*' for palabra in palabras)
+    return f'{{{" ".join(campos)}}} : ({expresion})'
+
+
+def buscar(queryset, termino, campos=None):
+    """Filtra ``queryset`` a las filas cuyo texto coincide con ``termino``"""
+    modelo = queryset.model
+    campos = campos or _CAMPOS[modelo]
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        coincide = Q(busqueda=SearchQuery(termino, config=CONFIGURACION, search_type='websearch'))
+        for campo in campos:
+            coincide |= Q(**{f'{campo}__icontains': termino})
+        return queryset.filter(coincide)
+    if vendor == 'sqlite':
+        expresion = _consulta_fts5(termino, campos)
+        if expresion is not None:
+            tabla = tabla_fts(modelo._meta.db_table)
+            return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {tabla} WHERE {tabla} MATCH %s', [expresion]))
+    coincide = Q()
+    for campo in campos:
+        coincide |= Q(**{f'{campo}__icontains': termino})
+    return queryset.filter(coincide)
+
+
+def _busqueda_simple(campo):
+    if campo.startswith('^'):
+        return f'{campo[1:]}__istartswith'
+    if campo.startswith('='):
+        return f'{campo[1:]}__iexact'
+    if campo.startswith('@'):
+        return f'{campo[1:]}__search'
+    return f'{campo}__icontains'
+
+
+def _por_relaciones(modelo, ruta, valor):
+    """
+    Q equivalente a ``ruta=valor`` con un ``__in`` anidado por cada llave foránea, para que
+    cada tabla se filtre por el índice de la llave en lugar de un JOIN con toda la tabla.
+    """
+    cabeza, _, resto = ruta.partition('__')
+    try:
+        campo = modelo._meta.get_field(cabeza)
+    except FieldDoesNotExist:
+        campo = None
+    if not resto or campo is None or not (campo.many_to_one or campo.one_to_one) or not campo.concrete:
+        return Q(**{ruta: valor})
+    relacionado = campo.related_model
+    return Q(**{
+        f'{cabeza}__in': relacionado._default_manager.filter(_por_relaciones(relacionado, resto, valor)).values('pk')
+    })
+
+
+def _campo_indexado(modelo, ruta):
+    """(ruta de la relación, modelo, campo) si ``ruta`` termina en un campo con índice de texto"""
+    try:
+        campos = get_fields_from_path(modelo, ruta)
+    except (FieldDoesNotExist, AttributeError):
+        return None
+    destino = campos[-1]
+    if destino.name not in campos_indexados(destino.model):
+        return None
+    return ruta.rpartition('__')[0], destino.model, destino.name
+
+
+class BusquedaTextoAdminMixin:
+    """
+    Resuelve los ``search_fields`` que apuntan a campos con índice de texto con ese índice
+    en lugar de ``icontains``. Cada palabra se busca como la unión de los ids que coinciden
+    por campo, para que cada parte use su propio índice.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        campos = self.get_search_fields(request)
+        indexados = {campo: _campo_indexado(self.model, campo) for campo in campos}
+        if not search_term or not any(indexados.values()):
+            return super().get_search_results(request, queryset, search_term)
+
+        simples = [campo for campo, indexado in indexados.items() if indexado is None]
+        base = self.model._default_manager.using(queryset.db).order_by()
+        for palabra in smart_split(search_term):
+            if palabra.startswith(('"', "'")) and palabra[0] == palabra[-1]:
+                palabra = unescape_string_literal(palabra)
+            partes = []
+            if simples:
+                coincide = Q()
+                for campo in simples:
+                    coincide |= _por_relaciones(self.model, _busqueda_simple(campo), palabra)
+                partes.append(base.filter(coincide).values('pk'))
+            for indexado in filter(None, indexados.values()):
+                relacion, modelo, campo = indexado
+                ids = buscar(modelo._default_manager.using(queryset.db).order_by(), palabra, [campo]).values('pk')
+                partes.append(base.filter(**{f'{relacion}__in': ids}).values('pk') if relacion else ids)
+            queryset = queryset.filter(pk__in=partes[0].union(*partes[1:]) if len(partes) > 1 else partes[0])
+        return queryset, False
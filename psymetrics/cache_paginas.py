@@ -0,0 +1,75 @@
+"""
+Caché de páginas completas para visitantes anónimos.
+
+Las páginas públicas (inicio, servicios, nosotros, contacto) son iguales para todos los
+anónimos, así que se renderizan una vez y se sirven desde la caché ``paginas``, cuyo
+KEY_PREFIX incluye la versión del despliegue: al publicar una versión nueva las páginas
+anteriores dejan de usarse sin tener que borrarlas. La clave varía por idioma activo y
+por ruta (se ignora la query string, p. ej. parámetros utm de campañas).
+
+El token CSRF no puede compartirse entre visitantes: al guardar la página se reemplaza
+por una marca y en cada respuesta se inserta el token del visitante, con lo que
+CsrfViewMiddleware emite su cookie como en una página renderizada.
+"""
+import re
+from functools import wraps
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+
+
+ALIAS = 'paginas'
+
+TIEMPO_CACHE = 60 * 10
+
+MARCA_CSRF = b'__token_csrf__'
+
+_TOKEN_CSRF = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _clave(request):
+    return f'pagina:{translation.get_language()}:{request.path}'
+
+
+def _sin_token(contenido):
+    return _TOKEN_CSRF.sub(rb'\g<1>' + MARCA_CSRF + rb'\g<2>', contenido)
+
+
+def _con_token(contenido, request):
+    if MARCA_CSRF not in contenido:
+        return contenido
+    return contenido.replace(MARCA_CSRF, get_token(request).encode())
+
+
+def _cacheable(request):
+    # Sin cookie de sesión ``is_authenticated`` se resuelve sin consultar la base de datos
+    return request.method in ('GET', 'HEAD') and not request.user.is_authenticated
+
+
+def cache_anonimo(tiempo=TIEMPO_CACHE):
+    """Sirve la vista desde la caché de páginas cuando el visitante es anónimo"""
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not _cacheable(request):
+                return vista(request, *args, **kwargs)
+
+            cache = caches[ALIAS]
+            clave = _clave(request)
+            guardada = cache.get(clave)
+            if guardada is not None:
+                contenido, tipo = guardada
+                respuesta = HttpResponse(_con_token(contenido, request), content_type=tipo)
+            else:
+                respuesta = vista(request, *args, **kwargs)
+                if hasattr(respuesta, 'render'):
+                    respuesta.render()
+                if respuesta.status_code == 200 and not respuesta.cookies and not respuesta.streaming:
+                    cache.set(clave, (_sin_token(respuesta.content), respuesta['Content-Type']), tiempo)
+            patch_vary_headers(respuesta, ['Cookie'])
+            return respuesta
+        return envoltura
+    return decorador
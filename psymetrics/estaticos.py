@@ -0,0 +1,197 @@
+"""
+Archivos estáticos con hash de contenido, precomprimidos y servidos con caché inmutable.
+
+``AlmacenEstaticos`` es el storage de ``collectstatic`` en producción: agrega el hash del
+contenido al nombre de cada archivo (ManifestStaticFilesStorage) y escribe junto a cada
+archivo de texto sus variantes ``.gz`` y ``.br`` (esta última si está instalado el
+paquete ``brotli``).
+
+``ServidorEstaticos`` envuelve la aplicación WSGI (``ServidorEstaticosASGI`` la ASGI) y
+atiende STATIC_URL desde STATIC_ROOT sin pasar por Django: elige la variante comprimida
+según Accept-Encoding y marca los nombres con hash como ``immutable``, de modo que el
+navegador no vuelve a pedirlos mientras no cambie su contenido.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+EXTENSIONES_COMPRIMIBLES = {'.css', '.js', '.mjs', '.map', '.svg', '.html', '.txt', '.json', '.xml', '.ico'}
+
+# No vale la pena comprimir archivos pequeños
+TAMANO_MINIMO = 256
+
+# Nombre con hash de ManifestStaticFilesStorage: nombre.0123456789ab.ext
+NOMBRE_CON_HASH = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+TAMANO_BLOQUE = 64 * 1024
+
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_SIN_HASH = 'public, max-age=60'
+
+
+def comprimir(ruta):
+    """Escribe ``ruta.gz`` y ``ruta.br`` si reducen el tamaño; devuelve las extensiones escritas"""
+    ruta = Path(ruta)
+    if ruta.suffix.lower() not in EXTENSIONES_COMPRIMIBLES:
+        return []
+    contenido = ruta.read_bytes()
+    if len(contenido) < TAMANO_MINIMO:
+        return []
+
+    variantes = {'.gz': gzip.compress(contenido, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variantes['.br'] = brotli.compress(contenido)
+
+    escritas = []
+    for extension, comprimido in variantes.items():
+        if len(comprimido) < len(contenido) * 0.95:
+            ruta.with_name(ruta.name + extension).write_bytes(comprimido)
+            escritas.append(extension)
+    return escritas
+
+
+class AlmacenEstaticos(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage que además precomprime los archivos con hash"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if not dry_run:
+            for nombre in set(self.hashed_files.values()):
+                comprimir(self.path(nombre))
+
+
+class _Archivo:
+    __slots__ = ('ruta', 'tamano', 'modificado', 'etag', 'tipo', 'variantes')
+
+    def __init__(self, ruta):
+        estado = ruta.stat()
+        self.ruta = ruta
+        self.tamano = estado.st_size
+        self.modificado = formatdate(estado.st_mtime, usegmt=True)
+        self.etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+        tipo, _ = mimetypes.guess_type(ruta.name)
+        self.tipo = tipo or 'application/octet-stream'
+        if self.tipo.startswith('text/') or self.tipo in ('application/javascript', 'image/svg+xml'):
+            self.tipo += '; charset=utf-8'
+        self.variantes = {
+            codificacion: ruta.with_name(ruta.name + extension)
+            for codificacion, extension in (('br', '.br'), ('gzip', '.gz'))
+            if ruta.with_name(ruta.name + extension).is_file()
+        }
+
+
+class ServidorEstaticos:
+    """Envoltura WSGI que sirve STATIC_ROOT; lo demás pasa a la aplicación"""
+
+    def __init__(self, aplicacion, raiz=None, prefijo=None):
+        self.aplicacion = aplicacion
+        self.raiz = Path(raiz or settings.STATIC_ROOT)
+        self.prefijo = prefijo or '/' + settings.STATIC_URL.strip('/') + '/'
+        self.archivos = self._indexar()
+
+    def _indexar(self):
+        """Lee STATIC_ROOT una sola vez al arrancar (collectstatic corre antes del despliegue)"""
+        archivos = {}
+        if not self.raiz.is_dir():
+            return archivos
+        for directorio, _, nombres in os.walk(self.raiz):
+            for nombre in nombres:
+                if nombre.endswith(('.gz', '.br')):
+                    continue
+                ruta = Path(directorio, nombre)
+                archivos[ruta.relative_to(self.raiz).as_posix()] = _Archivo(ruta)
+        return archivos
+
+    def responder(self, ruta, metodo, etag_cliente, aceptar_codificacion):
+        """
+        (estado, encabezados, archivo a enviar o None) para una ruta de STATIC_URL, o None si
+        la solicitud no es de un estático y debe atenderla la aplicación
+        """
+        archivo = None
+        if ruta.startswith(self.prefijo) and metodo in ('GET', 'HEAD'):
+            archivo = self.archivos.get(ruta[len(self.prefijo):])
+        if archivo is None:
+            return None
+
+        encabezados = [
+            ('Cache-Control', CACHE_INMUTABLE if NOMBRE_CON_HASH.search(archivo.ruta.name) else CACHE_SIN_HASH),
+            ('ETag', archivo.etag),
+            ('Last-Modified', archivo.modificado),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if etag_cliente == archivo.etag:
+            return '304 Not Modified', encabezados, None
+
+        ruta_envio, tamano = archivo.ruta, archivo.tamano
+        aceptadas = {parte.split(';')[0].strip() for parte in aceptar_codificacion.lower().split(',')}
+        for codificacion, variante in archivo.variantes.items():
+            if codificacion in aceptadas:
+                ruta_envio, tamano = variante, variante.stat().st_size
+                encabezados.append(('Content-Encoding', codificacion))
+                break
+        encabezados += [('Content-Type', archivo.tipo), ('Content-Length', str(tamano))]
+        return '200 OK', encabezados, None if metodo == 'HEAD' else ruta_envio
+
+    def __call__(self, environ, start_response):
+        respuesta = self.responder(
+            environ.get('PATH_INFO', ''), environ['REQUEST_METHOD'],
+            environ.get('HTTP_IF_NONE_MATCH'), environ.get('HTTP_ACCEPT_ENCODING', ''),
+        )
+        if respuesta is None:
+            return self.aplicacion(environ, start_response)
+
+        estado, encabezados, ruta_envio = respuesta
+        start_response(estado, encabezados)
+        if ruta_envio is None:
+            return []
+        envolver = environ.get('wsgi.file_wrapper')
+        if envolver:
+            return envolver(open(ruta_envio, 'rb'), TAMANO_BLOQUE)
+        return _leer(ruta_envio)
+
+
+class ServidorEstaticosASGI(ServidorEstaticos):
+    """La misma envoltura para la aplicación ASGI (psymetrics.asgi)"""
+
+    async def __call__(self, scope, receive, send):
+        respuesta = None
+        if scope['type'] == 'http':
+            encabezados = {
+                nombre.decode('latin-1').lower(): valor.decode('latin-1') for nombre, valor in scope['headers']
+            }
+            respuesta = self.responder(
+                scope['path'], scope['method'],
+                encabezados.get('if-none-match'), encabezados.get('accept-encoding', ''),
+            )
+        if respuesta is None:
+            await self.aplicacion(scope, receive, send)
+            return
+
+        estado, encabezados, ruta_envio = respuesta
+        await send({
+            'type': 'http.response.start',
+            'status': int(estado.split()[0]),
+            'headers': [(nombre.lower().encode('latin-1'), valor.encode('latin-1')) for nombre, valor in encabezados],
+        })
+        if ruta_envio is not None:
+            # Los estáticos son pequeños y suelen estar en la caché de páginas del sistema operativo
+            for bloque in _leer(ruta_envio):
+                await send({'type': 'http.response.body', 'body': bloque, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+def _leer(ruta):
+    with open(ruta, 'rb') as contenido:
+        while bloque := contenido.read(TAMANO_BLOQUE):
+            yield bloque
@@ -0,0 +1,136 @@
+"""
+Lecturas pesadas en la réplica de solo lectura.
+
+``EnrutadorReplica`` manda a la base ``replica`` las lecturas hechas dentro de
+``usar_replica()`` (gestor de contexto o decorador): reportes, exportaciones, cifras
+agregadas y listados del admin. Las escrituras y el resto de las lecturas van a
+``default``. Sin alias ``replica`` en DATABASES, o si es un espejo de ``default``
+(TEST['MIRROR'] en settings.py: la misma base en desarrollo y en las pruebas),
+``usar_replica()`` no tiene efecto.
+
+Para que cada usuario lea lo que acaba de escribir, ``ReplicaMiddleware`` marca con la
+cookie ``leer_principal`` (por REPLICA_RETRASO segundos) al navegador cuya solicitud
+escribió en la base de datos; mientras la tenga, y en el resto de la misma solicitud,
+sus lecturas siguen en ``default``.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+ALIAS = 'replica'
+
+COOKIE = 'leer_principal'
+
+# Las sesiones se escriben en casi cualquier solicitud y no las lee nadie más
+APPS_IGNORADAS = {'sessions'}
+
+_en_replica = ContextVar('en_replica', default=False)
+
+# Estado de la solicitud en curso: {'principal': bool, 'escribio': bool}
+_solicitud = ContextVar('solicitud_replica', default=None)
+
+
+def replica_configurada():
+    # Un espejo comparte la base de la prueba, pero por otra conexión no vería su transacción
+    return ALIAS in connections.settings and not connections.settings[ALIAS]['TEST']['MIRROR']
+
+
+def _leer_principal():
+    estado = _solicitud.get()
+    return estado is not None and (estado['principal'] or estado['escribio'])
+
+
+def alias_lectura():
+    """Alias del que se leería en el contexto actual"""
+    if _en_replica.get() and replica_configurada() and not _leer_principal():
+        return ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def usar_replica():
+    """Las lecturas dentro del bloque (o de la función decorada) van a la réplica"""
+    token = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+def iterar_en_replica(iterable):
+    """
+    Recorre ``iterable`` leyendo de la réplica, p. ej. el generador de un
+    StreamingHttpResponse, que se consume después de que la vista y el middleware
+    terminaron. La decisión de leer de ``default`` se toma al crearlo.
+    """
+    replica = not _leer_principal()
+
+    def recorrer():
+        iterador = iter(iterable)
+        while True:
+            token = _en_replica.set(replica)
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                return
+            finally:
+                _en_replica.reset(token)
+            yield elemento
+
+    return recorrer()
+
+
+class EnrutadorReplica:
+    def db_for_read(self, model, **hints):
+        if alias_lectura() == ALIAS:
+            return ALIAS
+        # None: las relaciones de una instancia leída de la réplica se siguen leyendo de ahí
+        return None
+
+    def db_for_write(self, model, **hints):
+        estado = _solicitud.get()
+        if estado is not None and model._meta.app_label not in APPS_IGNORADAS:
+            estado['escribio'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Ambos alias contienen los mismos datos
+        return True
+
+
+class ReplicaMiddleware:
+    """Lee de ``default`` durante REPLICA_RETRASO segundos después de que el navegador escribió"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        estado = {'principal': COOKIE in request.COOKIES, 'escribio': False}
+        token = _solicitud.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _solicitud.reset(token)
+        if estado['escribio']:
+            response.set_cookie(
+                COOKIE, '1', max_age=settings.REPLICA_RETRASO, httponly=True, samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
+
+
+class ReplicaAdminMixin:
+    """Los listados del admin (GET) se leen de la réplica"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with usar_replica():
+            response = super().changelist_view(request, extra_context)
+            # El queryset del listado se evalúa al renderizar la plantilla
+            if hasattr(response, 'render'):
+                response.render()
+        return response
@@ -0,0 +1,118 @@
+"""
+Sesiones en caché con escritura diferida y usuario autenticado en caché.
+
+Con el backend de sesiones de base de datos cada solicitud autenticada lee
+``django_session`` y ``auth_user``. Aquí ambas lecturas salen de la caché ``default``:
+
+- ``SessionStore`` (``SESSION_ENGINE = 'psymetrics.sesiones'``) guarda la sesión en la
+  caché y escribe en la base de datos como máximo cada ``SESION_ESCRITURA_DIFERIDA``
+  segundos; con 0 escribe siempre (igual que ``cached_db``). Si la caché se pierde, la
+  sesión se recupera de la base de datos sin los cambios de esa ventana. Un guardado
+  que no cambia los datos no escribe en ningún lado.
+- ``BackendUsuarioEnCache`` resuelve ``request.user`` desde la caché. La entrada se
+  borra al guardar o borrar el usuario (cambio de contraseña, is_active, is_staff...) y
+  al cambiar sus grupos o permisos; ver ``evaluaciones.signals``.
+"""
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.db import SessionStore as SesionBD
+from django.core.cache import caches
+
+
+logger = logging.getLogger('django.contrib.sessions')
+
+TIEMPO_USUARIO = 60 * 15
+
+
+def _cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+class SessionStore(cached_db.SessionStore):
+    """Sesión en caché; la entrada es ``(datos, momento de la última escritura en BD)``"""
+
+    cache_key_prefix = 'psymetrics.sesiones'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._escrita_bd = None
+        self._huella = None
+
+    def _serializar(self, datos):
+        return self.serializer().dumps(datos)
+
+    def load(self):
+        try:
+            entrada = self._cache.get(self.cache_key)
+        except Exception:
+            entrada = None
+
+        if entrada is None:
+            sesion = self._get_session_from_db()
+            if sesion is None:
+                return {}
+            datos = self.decode(sesion.session_data)
+            self._escrita_bd = time.time()
+            self._cache.set(
+                self.cache_key, (datos, self._escrita_bd), self.get_expiry_age(expiry=sesion.expire_date)
+            )
+        else:
+            datos, self._escrita_bd = entrada
+        self._huella = self._serializar(datos)
+        return datos
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        datos = self._get_session(no_load=must_create)
+        huella = self._serializar(datos)
+        if not must_create and huella == self._huella and not settings.SESSION_SAVE_EVERY_REQUEST:
+            return
+
+        ahora = time.time()
+        diferida = (
+            not must_create
+            and self._escrita_bd is not None
+            and ahora - self._escrita_bd < settings.SESION_ESCRITURA_DIFERIDA
+        )
+        if not diferida:
+            SesionBD.save(self, must_create)
+            self._escrita_bd = ahora
+        try:
+            self._cache.set(self.cache_key, (datos, self._escrita_bd), self.get_expiry_age())
+        except Exception:
+            logger.exception('Error al guardar la sesión en caché (%s)', self._cache)
+        self._huella = huella
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+
+def _clave_usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def olvidar_usuarios(ids):
+    """Borra de la caché los usuarios indicados"""
+    _cache().delete_many([_clave_usuario(usuario_id) for usuario_id in ids])
+
+
+class BackendUsuarioEnCache(ModelBackend):
+    """ModelBackend que guarda en caché el usuario de cada sesión"""
+
+    def get_user(self, user_id):
+        clave = _clave_usuario(user_id)
+        usuario = _cache().get(clave)
+        if usuario is None:
+            usuario = super().get_user(user_id)
+            if usuario is not None:
+                _cache().set(clave, usuario, TIEMPO_USUARIO)
+        return usuario
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'psymetrics.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,6 +69,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'consultas.context_processors.mensajes_no_leidos',
             ],
         },
     },
@@ -82,8 +85,20 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Réplica de solo lectura para reportes, exportaciones y listados del admin
+    # (psymetrics.replicas). En desarrollo es el mismo archivo; en las pruebas es un espejo
+    # de default y se lee de default (ReplicaTests le da una base aparte)
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_REPLICA_NAME', BASE_DIR / 'db.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['psymetrics.replicas.EnrutadorReplica']
+
+# Segundos que un navegador lee de 'default' después de escribir (retraso máximo de la réplica)
+REPLICA_RETRASO = 5
 
 
 # Password validation
@@ -123,6 +138,9 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# psymetrics.asgi y psymetrics.wsgi sirven STATIC_ROOT con ServidorEstaticos (solo después de collectstatic)
+SERVIR_ESTATICOS = False
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -148,3 +166,40 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 CSRF_TRUSTED_ORIGINS = [
     'https://monkfish-app-gjjf7.ondigitalocean.app',
 ]
+
+# Invitaciones y recordatorios (evaluaciones.correos); en desarrollo se escriben como
+# archivos en correos_enviados/. SITIO_URL es el dominio de los enlaces de acceso
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = BASE_DIR / 'correos_enviados'
+SITIO_URL = os.environ.get('SITIO_URL', 'http://localhost:8000')
+
+# Borradores de las evaluaciones en curso (evaluaciones.borradores): las respuestas se
+# escriben en la base de datos cada BORRADOR_MAX_RESPUESTAS respuestas o cuando la más
+# antigua sin escribir cumple BORRADOR_MAX_SEGUNDOS
+BORRADOR_MAX_RESPUESTAS = 20
+BORRADOR_MAX_SEGUNDOS = 60
+
+# Mensajes de consultas en tiempo real (consultas.canal)
+CONSULTAS_CANAL_BACKEND = 'consultas.canal.BackendMemoria'
+CONSULTAS_CANAL_OPCIONES = {}
+
+# Sesiones y usuario autenticado desde la caché 'default' (psymetrics.sesiones). La sesión
+# se escribe en la base de datos como máximo cada SESION_ESCRITURA_DIFERIDA segundos
+SESSION_ENGINE = 'psymetrics.sesiones'
+SESION_ESCRITURA_DIFERIDA = 0
+AUTHENTICATION_BACKENDS = ['psymetrics.sesiones.BackendUsuarioEnCache']
+
+# Caché. 'paginas' guarda las páginas públicas completas (psymetrics.cache_paginas) y los
+# fragmentos de base.html; su prefijo lleva la versión del despliegue para que cada
+# publicación empiece con páginas nuevas
+VERSION_DESPLIEGUE = os.environ.get('VERSION_DESPLIEGUE', 'dev')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'paginas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'paginas',
+        'KEY_PREFIX': f'paginas-{VERSION_DESPLIEGUE}',
+    },
+}
@@ -2,12 +2,21 @@
 Configuración de producción para PsyMetrics Global
 """
 import os
+
+from django.core.exceptions import ImproperlyConfigured
+
 from .settings import *
 
 # Configuración de seguridad
 DEBUG = False
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost').split(',')
 
+# Con workers ASGI (uvicorn, el predeterminado de gunicorn.conf.py) el código síncrono de
+# cada solicitud corre en un hilo propio que conservaría su propia conexión, así que por
+# omisión no se conservan; para reutilizarlas bajo ASGI usa el pool (DB_POOL=1)
+GUNICORN_WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn_worker.UvicornWorker')
+SERVIDOR_ASGI = GUNICORN_WORKER_CLASS not in ('sync', 'gthread')
+
 # Base de datos PostgreSQL para producción
 DATABASES = {
     'default': {
@@ -17,12 +26,58 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # Conexión persistente por worker WSGI; se verifica antes de reutilizarla en cada solicitud
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0' if SERVIDOR_ASGI else '600')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Pool de conexiones de psycopg 3 (DB_POOL=1, requiere psycopg[pool]). Cada worker de
+# gunicorn tiene su propio pool: DB_MAX_CONEXIONES se reparte entre los WEB_CONCURRENCY
+# workers para no pasar del max_connections de PostgreSQL (y alcanza al menos para cada hilo);
+# si eso no cabe en DB_MAX_CONEXIONES el arranque falla en lugar de agotar las conexiones
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() * 2 + 1))
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', '1'))
+DB_MAX_CONEXIONES = int(os.environ.get('DB_MAX_CONEXIONES', '90'))
+if os.environ.get('DB_POOL') == '1':
+    DB_POOL_MAX = max(2, GUNICORN_THREADS, DB_MAX_CONEXIONES // WEB_CONCURRENCY)
+    if WEB_CONCURRENCY * DB_POOL_MAX > DB_MAX_CONEXIONES:
+        raise ImproperlyConfigured(
+            f'{WEB_CONCURRENCY} workers × {DB_POOL_MAX} conexiones por pool superan DB_MAX_CONEXIONES='
+            f'{DB_MAX_CONEXIONES}; reduce WEB_CONCURRENCY o GUNICORN_THREADS, o sube DB_MAX_CONEXIONES'
+        )
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': 1,
+            'max_size': DB_POOL_MAX,
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'max_idle': 300,
+        },
+    }
+
+# Réplica de PostgreSQL para lecturas pesadas; sin DB_REPLICA_HOST todo se lee de default
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+    }
+REPLICA_RETRASO = int(os.environ.get('REPLICA_RETRASO', '5'))
+
 # Configuración de archivos estáticos
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+# Nombres con hash de contenido y variantes .gz/.br generadas por collectstatic
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'psymetrics.estaticos.AlmacenEstaticos',
+    },
+}
+SERVIR_ESTATICOS = True
 
 # Configuración de archivos de medios
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -79,9 +134,24 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
         'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/1'),
-    }
+    },
+    'paginas': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/1'),
+        'KEY_PREFIX': f'paginas-{VERSION_DESPLIEGUE}',
+    },
 }
 
+# Sesiones: si Redis se reinicia se pierden a lo más los cambios de sesión de este lapso
+SESION_ESCRITURA_DIFERIDA = int(os.environ.get('SESION_ESCRITURA_DIFERIDA', '60'))
+
+# Borradores de evaluaciones en Redis: lo más que se perdería si Redis se reinicia
+BORRADOR_MAX_RESPUESTAS = int(os.environ.get('BORRADOR_MAX_RESPUESTAS', '20'))
+BORRADOR_MAX_SEGUNDOS = int(os.environ.get('BORRADOR_MAX_SEGUNDOS', '60'))
+
+# Mensajes de consultas en tiempo real: avisos entre procesos con LISTEN/NOTIFY
+CONSULTAS_CANAL_BACKEND = 'consultas.canal.BackendPostgres'
+
 # Configuración de email
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
@@ -90,6 +160,7 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@psymetricsglobal.com')
+SITIO_URL = os.environ.get('SITIO_URL', 'https://monkfish-app-gjjf7.ondigitalocean.app')
 
 # Configuración de Tailwind para producción
 TAILWIND_CLI_PATH = os.path.join(BASE_DIR, 'node_modules', '.bin', 'tailwind')
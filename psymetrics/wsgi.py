@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'psymetrics.settings')
 
 application = get_wsgi_application()
+
+# En producción los estáticos con hash se sirven desde aquí, precomprimidos y con caché inmutable
+if settings.SERVIR_ESTATICOS:
+    from psymetrics.estaticos import ServidorEstaticos
+
+    application = ServidorEstaticos(application)